@@ -0,0 +1,342 @@
+"""API HTTP/JSON de la biblioteca, sobre los mismos repositorios y validaciones que la aplicación
+
+Uso: python api.py [--host 127.0.0.1] [--puerto 8080] [--db ruta]
+
+Rutas:
+    GET  /libros?q=texto             GET /libros/<id>        GET /libros/<id>/disponibilidad
+    GET  /usuarios                   GET /usuarios/<id>
+    GET  /categorias                 GET /categorias/<id>
+    GET  /prestamos?desde=&hasta=    GET /prestamos/<id>     GET /atrasados
+    POST /prestamos                  {"id_libro": 1, "id_usuario": 2, "fecha": "AAAA-MM-DD" (opcional)}
+    POST /prestamos/<id>/devolucion
+
+Las listas se paginan por clave: ?limite=N y ?despues=<siguiente de la respuesta anterior>.
+Los GET llevan ETag y contestan 304 si coincide If-None-Match. Las lecturas usan las conexiones
+de solo lectura del pool; los préstamos, la de escritura.
+"""
+import argparse
+import asyncio
+import base64
+import hashlib
+import json
+import re
+import sqlite3
+from dataclasses import asdict
+from datetime import datetime
+from http import HTTPStatus
+from urllib.parse import parse_qs, urlsplit
+
+import base_datos
+import migraciones
+import repositorios
+import validaciones
+
+LIMITE_POR_DEFECTO = 50
+LIMITE_MAXIMO = 200
+MAXIMO_CUERPO = 64 * 1024
+# Rango de INTEGER en SQLite; un id fuera de él no puede existir y ni siquiera se puede pasar como parámetro
+ENTERO_MINIMO = -2 ** 63
+ENTERO_MAXIMO = 2 ** 63 - 1
+
+
+class ErrorAPI(Exception):
+    def __init__(self, estado, mensaje):
+        super().__init__(mensaje)
+        self.estado = estado
+
+
+def codificar_clave(clave):
+    if clave is None:
+        return None
+    return base64.urlsafe_b64encode(json.dumps(clave).encode("utf-8")).decode("ascii")
+
+
+def decodificar_clave(texto, largo):
+    """La clave de la última fila de la página anterior: una lista de largo textos o enteros"""
+    if not texto:
+        return None
+    try:
+        clave = json.loads(base64.urlsafe_b64decode(texto.encode("ascii")))
+    except (ValueError, UnicodeError):
+        raise ValueError("El parámetro despues no es válido")
+    # bool es un int para Python, pero ninguna clave de orden lo usa
+    if (not isinstance(clave, list) or len(clave) != largo
+            or not all(isinstance(valor, str) or (type(valor) is int and ENTERO_MINIMO <= valor <= ENTERO_MAXIMO)
+                       for valor in clave)):
+        raise ValueError("El parámetro despues no es válido")
+    return clave
+
+
+def entero(texto, nombre):
+    try:
+        valor = int(texto)
+    except (TypeError, ValueError):
+        raise ValueError(f"{nombre} debe ser un número entero")
+    if not ENTERO_MINIMO <= valor <= ENTERO_MAXIMO:
+        raise ValueError(f"{nombre} está fuera de rango")
+    return valor
+
+
+class API:
+    """Resuelve cada pedido a (estado, datos); no sabe nada de HTTP"""
+    def __init__(self, pool):
+        self.pool = pool
+        self.repos = {
+            'categorias': repositorios.RepositorioCategorias(pool),
+            'usuarios': repositorios.RepositorioUsuarios(pool),
+            'libros': repositorios.RepositorioLibros(pool),
+            'prestamos': repositorios.RepositorioPrestamos(pool),
+        }
+        self.rutas = [
+            ("GET", r"/libros", self.listar_libros),
+            ("GET", r"/libros/(\d+)", self.registro('libros')),
+            ("GET", r"/libros/(\d+)/disponibilidad", self.disponibilidad),
+            ("GET", r"/usuarios", self.listar_usuarios),
+            ("GET", r"/usuarios/(\d+)", self.registro('usuarios')),
+            ("GET", r"/categorias", self.listar_categorias),
+            ("GET", r"/categorias/(\d+)", self.registro('categorias')),
+            ("GET", r"/prestamos", self.listar_prestamos),
+            ("GET", r"/prestamos/(\d+)", self.registro('prestamos')),
+            ("GET", r"/atrasados", self.listar_atrasados),
+            ("POST", r"/prestamos", self.crear_prestamo),
+            ("POST", r"/prestamos/(\d+)/devolucion", self.devolver_prestamo),
+        ]
+        self.rutas = [(metodo, re.compile(patron + "$"), funcion) for metodo, patron, funcion in self.rutas]
+
+    def despachar(self, metodo, destino, cuerpo=b""):
+        partes = urlsplit(destino)
+        parametros = {clave: valores[-1] for clave, valores in parse_qs(partes.query).items()}
+        ruta = partes.path.rstrip("/") or "/"
+        metodos_ruta = set()
+        try:
+            for metodo_ruta, patron, funcion in self.rutas:
+                coincidencia = patron.match(ruta)
+                if coincidencia is None:
+                    continue
+                metodos_ruta.add(metodo_ruta)
+                if metodo_ruta == metodo:
+                    return funcion(parametros, cuerpo, *coincidencia.groups())
+            if metodos_ruta:
+                raise ErrorAPI(HTTPStatus.METHOD_NOT_ALLOWED, "Método no permitido")
+            raise ErrorAPI(HTTPStatus.NOT_FOUND, "Ruta inexistente")
+        except ErrorAPI as e:
+            return e.estado, {"error": str(e)}
+        except repositorios.ConflictoEstado as e:
+            return HTTPStatus.CONFLICT, {"error": str(e)}
+        except ValueError as e:
+            return HTTPStatus.BAD_REQUEST, {"error": str(e)}
+        except sqlite3.IntegrityError as e:
+            return HTTPStatus.BAD_REQUEST, {"error": f"Datos inconsistentes: {e}"}
+        except sqlite3.Error as e:
+            return HTTPStatus.INTERNAL_SERVER_ERROR, {"error": f"Error en base de datos: {e}"}
+        except Exception as e:
+            # Cualquier otro error tiene que llegar al cliente como respuesta, no cortar la conexión
+            print(f"Error al atender {metodo} {destino}: {e!r}")
+            return HTTPStatus.INTERNAL_SERVER_ERROR, {"error": "Error interno"}
+
+    def limite(self, parametros):
+        limite = entero(parametros.get("limite", LIMITE_POR_DEFECTO), "limite")
+        if limite < 1 or limite > LIMITE_MAXIMO:
+            raise ValueError(f"limite debe estar entre 1 y {LIMITE_MAXIMO}")
+        return limite
+
+    def pagina(self, filas, limite, clave_orden):
+        """Arma la respuesta de una lista a partir de limite + 1 filas"""
+        siguiente = clave_orden(filas[limite - 1]) if len(filas) > limite else None
+        return HTTPStatus.OK, {"datos": [asdict(fila) for fila in filas[:limite]],
+                               "siguiente": codificar_clave(siguiente)}
+
+    def registro(self, entidad):
+        def obtener(parametros, cuerpo, registro_id):
+            registro = self.repos[entidad].por_id(entero(registro_id, "id"))
+            if registro is None:
+                raise ErrorAPI(HTTPStatus.NOT_FOUND, "Registro inexistente")
+            return HTTPStatus.OK, asdict(registro)
+        return obtener
+
+    def listar_libros(self, parametros, cuerpo):
+        limite = self.limite(parametros)
+        if parametros.get("q"):
+            # La búsqueda va por relevancia, en una sola página
+            return HTTPStatus.OK, {"datos": [asdict(libro) for libro in self.repos['libros'].buscar(parametros["q"], limite)],
+                                   "siguiente": None}
+        filas = self.repos['libros'].pagina(decodificar_clave(parametros.get("despues"), 2), limite)
+        return self.pagina(filas, limite, lambda libro: (libro.titulo, libro.id_libro))
+
+    def disponibilidad(self, parametros, cuerpo, id_libro):
+        id_libro = entero(id_libro, "id_libro")
+        existencias = self.repos['libros'].existencias(id_libro)
+        if existencias is None:
+            raise ErrorAPI(HTTPStatus.NOT_FOUND, "Registro inexistente")
+        disponibles, ejemplares = existencias
+        return HTTPStatus.OK, {"id_libro": id_libro, "disponible": disponibles > 0,
+                               "disponibles": disponibles, "ejemplares": ejemplares}
+
+    def listar_usuarios(self, parametros, cuerpo):
+        limite = self.limite(parametros)
+        filas = self.repos['usuarios'].pagina(decodificar_clave(parametros.get("despues"), 3), limite)
+        return self.pagina(filas, limite, lambda user: (user.apellido, user.nombre, user.id_usuario))
+
+    def listar_categorias(self, parametros, cuerpo):
+        return HTTPStatus.OK, {"datos": [asdict(cat) for cat in self.repos['categorias'].todas()], "siguiente": None}
+
+    def listar_prestamos(self, parametros, cuerpo):
+        limite = self.limite(parametros)
+        rango = None
+        if parametros.get("desde") or parametros.get("hasta"):
+            desde = validaciones.convertir_fecha(parametros["desde"]) if parametros.get("desde") else "0000-01-01"
+            hasta = validaciones.convertir_fecha(parametros["hasta"]) if parametros.get("hasta") else "9999-12-31"
+            rango = (desde, hasta)
+        filas = self.repos['prestamos'].pagina(decodificar_clave(parametros.get("despues"), 2), limite, rango)
+        return self.pagina(filas, limite, lambda prest: (prest.fecha_prestamo, prest.id_prestamo))
+
+    def listar_atrasados(self, parametros, cuerpo):
+        limite = self.limite(parametros)
+        hoy = datetime.now().strftime(validaciones.FORMATO_FECHA)
+        filas = self.repos['prestamos'].atrasados(hoy, decodificar_clave(parametros.get("despues"), 2), limite)
+        return self.pagina(filas, limite, lambda prest: (prest.fecha_vencimiento, prest.id_prestamo))
+
+    def crear_prestamo(self, parametros, cuerpo):
+        try:
+            datos = json.loads(cuerpo or b"{}")
+        except ValueError:
+            raise ValueError("El cuerpo debe ser JSON")
+        if not isinstance(datos, dict) or "id_libro" not in datos or "id_usuario" not in datos:
+            raise ValueError("Debe indicar id_libro e id_usuario")
+        id_libro = entero(datos["id_libro"], "id_libro")
+        id_usuario = entero(datos["id_usuario"], "id_usuario")
+        fecha = validaciones.convertir_fecha(datos.get("fecha") or datetime.now().strftime(validaciones.FORMATO_FECHA))
+        if self.repos['usuarios'].por_id(id_usuario) is None:
+            raise ErrorAPI(HTTPStatus.NOT_FOUND, "El usuario no existe")
+        if self.repos['libros'].disponible(id_libro) is None:
+            raise ErrorAPI(HTTPStatus.NOT_FOUND, "El libro no existe")
+        id_prestamo = self.repos['prestamos'].registrar(id_libro, id_usuario, fecha)
+        return HTTPStatus.CREATED, asdict(self.repos['prestamos'].por_id(id_prestamo))
+
+    def devolver_prestamo(self, parametros, cuerpo, id_prestamo):
+        id_prestamo = entero(id_prestamo, "id_prestamo")
+        self.repos['prestamos'].devolver(id_prestamo)
+        return HTTPStatus.OK, asdict(self.repos['prestamos'].por_id(id_prestamo))
+
+
+def etag(cuerpo):
+    return '"' + hashlib.blake2b(cuerpo, digest_size=12).hexdigest() + '"'
+
+
+def respuesta_http(estado, cuerpo=b"", encabezados=()):
+    lineas = [f"HTTP/1.1 {estado.value} {estado.phrase}",
+              "Content-Type: application/json; charset=utf-8",
+              f"Content-Length: {len(cuerpo)}"]
+    lineas.extend(f"{nombre}: {valor}" for nombre, valor in encabezados)
+    return ("\r\n".join(lineas) + "\r\n\r\n").encode("latin-1") + cuerpo
+
+
+class ServidorAPI:
+    """Servidor HTTP/1.1 mínimo con asyncio (conexiones persistentes); la API corre en hilos aparte"""
+    def __init__(self, pool, host="127.0.0.1", puerto=8080):
+        self.api = API(pool)
+        self.host = host
+        self.puerto = puerto
+        self.servidor = None
+
+    async def iniciar(self):
+        self.servidor = await asyncio.start_server(self.atender, self.host, self.puerto)
+        self.puerto = self.servidor.sockets[0].getsockname()[1]
+        return self.servidor
+
+    async def cerrar(self):
+        self.servidor.close()
+        await self.servidor.wait_closed()
+
+    async def rechazar(self, writer, estado, mensaje):
+        """Contesta el error y avisa que se cierra la conexión (el resto del pedido no se puede leer)"""
+        contenido = json.dumps({"error": mensaje}, ensure_ascii=False).encode("utf-8")
+        writer.write(respuesta_http(estado, contenido, [("Connection", "close")]))
+        try:
+            await writer.drain()
+        except ConnectionError:
+            pass
+
+    async def atender(self, reader, writer):
+        try:
+            while True:
+                try:
+                    encabezado = await reader.readuntil(b"\r\n\r\n")
+                except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+                    break
+                linea, *lineas = encabezado.decode("latin-1").rstrip("\r\n").split("\r\n")
+                try:
+                    metodo, destino, version = linea.split(" ", 2)
+                except ValueError:
+                    await self.rechazar(writer, HTTPStatus.BAD_REQUEST, "Pedido mal formado")
+                    break
+                encabezados = {}
+                for renglon in lineas:
+                    nombre, _, valor = renglon.partition(":")
+                    encabezados[nombre.strip().lower()] = valor.strip()
+                # Solo dígitos: int() también aceptaría "-5", "+5" o "1_0"
+                largo = encabezados.get("content-length") or "0"
+                if not re.fullmatch(r"\d+", largo):
+                    await self.rechazar(writer, HTTPStatus.BAD_REQUEST, "Content-Length no es válido")
+                    break
+                largo = int(largo)
+                if largo > MAXIMO_CUERPO:
+                    await self.rechazar(writer, HTTPStatus.REQUEST_ENTITY_TOO_LARGE, "Cuerpo demasiado grande")
+                    break
+                try:
+                    cuerpo = await reader.readexactly(largo) if largo else b""
+                except (asyncio.IncompleteReadError, ConnectionError):
+                    break
+
+                estado, datos = await asyncio.to_thread(self.api.despachar, metodo, destino, cuerpo)
+                contenido = json.dumps(datos, ensure_ascii=False).encode("utf-8")
+                extra = []
+                if metodo == "GET" and estado == HTTPStatus.OK:
+                    etiqueta = etag(contenido)
+                    extra.append(("ETag", etiqueta))
+                    if encabezados.get("if-none-match") == etiqueta:
+                        estado, contenido = HTTPStatus.NOT_MODIFIED, b""
+                cerrar = encabezados.get("connection", "").lower() == "close" or version == "HTTP/1.0"
+                if cerrar:
+                    extra.append(("Connection", "close"))
+                writer.write(respuesta_http(estado, contenido, extra))
+                await writer.drain()
+                if cerrar:
+                    break
+        except ConnectionError:
+            pass
+        except Exception as e:
+            # Un error inesperado no puede dejar al cliente sin respuesta
+            print(f"Error en la conexión: {e!r}")
+            await self.rechazar(writer, HTTPStatus.INTERNAL_SERVER_ERROR, "Error interno")
+        finally:
+            writer.close()
+
+
+async def servir(pool, host, puerto):
+    servidor = ServidorAPI(pool, host, puerto)
+    await servidor.iniciar()
+    print(f"API escuchando en http://{servidor.host}:{servidor.puerto}")
+    await servidor.servidor.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="API HTTP/JSON de la biblioteca")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--puerto", type=int, default=8080)
+    parser.add_argument("--db", help="ruta de la base (por defecto BIBLIOTECA_DB o Libreria.db)")
+    args = parser.parse_args()
+
+    pool = base_datos.PoolConexiones(args.db)
+    with pool.escritor() as conn:
+        migraciones.migrar(conn)
+    try:
+        asyncio.run(servir(pool, args.host, args.puerto))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        pool.cerrar()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""Informe diario de préstamos atrasados
+
+Uso: python atrasos.py [--fecha AAAA-MM-DD] [--db ruta]
+
+Cada consulta resuelve el conjunto de atrasados en una sola pasada sobre los índices parciales
+de préstamos abiertos (WHERE devuelto = 0): el historial de préstamos devueltos no se recorre.
+"""
+import argparse
+import time
+from datetime import datetime
+
+import base_datos
+import migraciones
+import validaciones
+
+RESUMEN_ATRASOS = """
+        SELECT COUNT(*), COUNT(DISTINCT id_usuario), MIN(fecha_vencimiento)
+        FROM prestamos
+        WHERE devuelto = 0 AND fecha_vencimiento < ?
+        """
+
+# Se agrupa primero sobre el índice y después se unen los usuarios, así cada préstamo se lee una sola vez
+ATRASOS_POR_USUARIO = """
+        SELECT u.id_usuario, u.nombre || ' ' || u.apellido, u.email, a.cantidad,
+               CAST(julianday(?) - julianday(a.vencimiento) AS INTEGER) AS dias
+        FROM (SELECT id_usuario, COUNT(*) AS cantidad, MIN(fecha_vencimiento) AS vencimiento
+              FROM prestamos
+              WHERE devuelto = 0 AND fecha_vencimiento < ?
+              GROUP BY id_usuario) a
+        JOIN usuarios u ON a.id_usuario = u.id_usuario
+        ORDER BY dias DESC, u.id_usuario
+        """
+
+
+class InformeAtrasos:
+    def __init__(self, fecha):
+        self.fecha = fecha
+        self.prestamos = 0
+        self.usuarios = 0
+        self.vencimiento_mas_antiguo = None
+        # (id_usuario, nombre, email, préstamos atrasados, días del atraso mayor)
+        self.por_usuario = []
+        self.segundos = 0.0
+
+    def resumen(self):
+        return (f"{self.fecha}: {self.prestamos} préstamos atrasados de {self.usuarios} usuarios "
+                f"(calculado en {self.segundos * 1000:.1f} ms)")
+
+
+def dias_atraso(fecha_vencimiento, fecha=None):
+    """Días transcurridos desde el vencimiento (0 o negativo si todavía no venció)"""
+    fecha = fecha or datetime.now().strftime(validaciones.FORMATO_FECHA)
+    formato = validaciones.FORMATO_FECHA
+    return (datetime.strptime(fecha, formato) - datetime.strptime(fecha_vencimiento, formato)).days
+
+
+def calcular_atrasos(pool, fecha=None):
+    """Arma el informe de atrasos a la fecha dada (por defecto hoy)"""
+    informe = InformeAtrasos(fecha or datetime.now().strftime(validaciones.FORMATO_FECHA))
+    inicio = time.perf_counter()
+    with pool.lector() as conn:
+        informe.prestamos, informe.usuarios, informe.vencimiento_mas_antiguo = conn.execute(
+            RESUMEN_ATRASOS, (informe.fecha,)).fetchone()
+        informe.por_usuario = conn.execute(ATRASOS_POR_USUARIO, (informe.fecha, informe.fecha)).fetchall()
+    informe.segundos = time.perf_counter() - inicio
+    return informe
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Informe de préstamos atrasados")
+    parser.add_argument("--fecha", help="fecha de corte AAAA-MM-DD (por defecto hoy)")
+    parser.add_argument("--db", help="ruta de la base (por defecto BIBLIOTECA_DB o Libreria.db)")
+    args = parser.parse_args()
+
+    pool = base_datos.PoolConexiones(args.db, lectores=1)
+    with pool.escritor() as conn:
+        migraciones.migrar(conn)
+    fecha = validaciones.convertir_fecha(args.fecha) if args.fecha else None
+    informe = calcular_atrasos(pool, fecha)
+    for id_usuario, nombre, email, cantidad, dias in informe.por_usuario:
+        print(f"{id_usuario}\t{nombre}\t{email}\t{cantidad} préstamos\t{dias} días")
+    print(informe.resumen())
+    pool.cerrar()
+
+
+if __name__ == "__main__":
+    main()
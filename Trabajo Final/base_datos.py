@@ -0,0 +1,180 @@
+"""Conexión a Libreria.db con un perfil de PRAGMAs elegido por configuración"""
+import os
+import queue
+from collections import deque
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+import instrumentacion
+
+DIRECTORIO = os.path.dirname(os.path.abspath(__file__))
+
+# Segundos que una conexión espera a que se libere un bloqueo antes de fallar
+ESPERA_BLOQUEO = 5
+
+PERFILES = {
+    # WAL con synchronous=NORMAL: cada commit escribe el WAL sin fsync, el fsync queda para el checkpoint
+    "rendimiento": {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "mmap_size": 256 * 1024 * 1024,
+        "cache_size": -64 * 1024,
+        "temp_store": "MEMORY",
+        "foreign_keys": "ON",
+    },
+    # WAL pero con fsync en cada commit, para equipos sin UPS
+    "seguro": {
+        "journal_mode": "WAL",
+        "synchronous": "FULL",
+        "cache_size": -16 * 1024,
+        "foreign_keys": "ON",
+    },
+    # Valores por defecto de SQLite (rollback journal), solo con integridad referencial
+    "basico": {
+        "foreign_keys": "ON",
+    },
+}
+
+PERFIL_POR_DEFECTO = "rendimiento"
+
+# Conexiones de solo lectura del pool (BIBLIOTECA_LECTORES)
+LECTORES_POR_DEFECTO = 4
+
+# Sentencias preparadas que guarda cada conexión (BIBLIOTECA_CACHE_SENTENCIAS); sqlite3 usa 128.
+# La aplicación usa unas 30 distintas (consultas.SENTENCIAS más las variantes de las paginadas y
+# los reportes); el margen cubre los EXPLAIN de la instrumentación y las que se agreguen
+CACHE_SENTENCIAS_POR_DEFECTO = 256
+
+# Rangos de id_cambio propios que recuerda cada pool; el bus los lee a los pocos milisegundos
+RANGOS_CAMBIOS_PROPIOS = 256
+
+
+def ruta_base_datos():
+    """Ruta de la base: BIBLIOTECA_DB o Libreria.db junto a este archivo, sin depender del directorio actual"""
+    return os.environ.get("BIBLIOTECA_DB") or os.path.join(DIRECTORIO, "Libreria.db")
+
+
+def pragmas_perfil(perfil=None):
+    """PRAGMAs del perfil (BIBLIOTECA_PERFIL), con overrides sueltos BIBLIOTECA_PRAGMA_<NOMBRE>=valor"""
+    perfil = perfil or os.environ.get("BIBLIOTECA_PERFIL", PERFIL_POR_DEFECTO)
+    if perfil not in PERFILES:
+        raise ValueError(f"Perfil de base de datos desconocido: {perfil} (opciones: {', '.join(PERFILES)})")
+    pragmas = dict(PERFILES[perfil])
+    for variable, valor in os.environ.items():
+        if variable.startswith("BIBLIOTECA_PRAGMA_"):
+            pragmas[variable[len("BIBLIOTECA_PRAGMA_"):].lower()] = valor
+    return pragmas
+
+
+def aplicar_perfil(conn, perfil=None):
+    conn.execute(f"PRAGMA busy_timeout = {ESPERA_BLOQUEO * 1000}")
+    for nombre, valor in pragmas_perfil(perfil).items():
+        # Los PRAGMA no aceptan parámetros, así que solo se permiten nombres y valores simples
+        if not nombre.replace("_", "").isalnum() or not str(valor).lstrip("-").isalnum():
+            raise ValueError(f"PRAGMA inválido: {nombre} = {valor}")
+        conn.execute(f"PRAGMA {nombre} = {valor}")
+
+
+def cache_sentencias():
+    return int(os.environ.get("BIBLIOTECA_CACHE_SENTENCIAS", CACHE_SENTENCIAS_POR_DEFECTO))
+
+
+def conectar(ruta=None, perfil=None, **kwargs):
+    """Abre la base con el perfil de PRAGMAs configurado"""
+    kwargs.setdefault("cached_statements", cache_sentencias())
+    conn = sqlite3.connect(ruta or ruta_base_datos(), timeout=ESPERA_BLOQUEO, **kwargs)
+    aplicar_perfil(conn, perfil)
+    return conn
+
+
+class PoolConexiones:
+    """Una conexión de escritura protegida por un lock y varias de solo lectura, seguras entre hilos"""
+    def __init__(self, ruta=None, perfil=None, lectores=None, cache=None):
+        self.ruta = ruta or ruta_base_datos()
+        self.perfil = perfil
+        self.cache = cache_sentencias() if cache is None else cache
+        if lectores is None:
+            lectores = int(os.environ.get("BIBLIOTECA_LECTORES", LECTORES_POR_DEFECTO))
+        self.instrumentacion = instrumentacion.Instrumentacion(
+            os.path.join(os.path.dirname(os.path.abspath(self.ruta)), "consultas_lentas.log")
+        )
+        self.escritura = conectar(self.ruta, perfil, check_same_thread=False, cached_statements=self.cache)
+        self.lock_escritura = threading.Lock()
+        # (desde, hasta]: id_cambio que anotaron los triggers en las transacciones de este pool
+        self.cambios_propios = deque(maxlen=RANGOS_CAMBIOS_PROPIOS)
+        self.lectores = queue.Queue()
+        for _ in range(max(1, lectores)):
+            self.lectores.put(self.abrir_lector())
+
+    def abrir_lector(self):
+        conn = conectar(self.ruta, self.perfil, check_same_thread=False, cached_statements=self.cache)
+        conn.execute("PRAGMA query_only = ON")
+        return conn
+
+    @contextmanager
+    def escritor(self):
+        """Conexión de escritura, de a un hilo por vez"""
+        with self.lock_escritura:
+            yield self.escritura
+
+    @contextmanager
+    def transaccion(self):
+        """Unidad de trabajo: BEGIN IMMEDIATE, un solo commit al salir y rollback si algo falla"""
+        with self.escritor() as conn:
+            cursor = conn.execute("BEGIN IMMEDIATE")
+            # Con el bloqueo de escritura tomado, todo lo que se anote en cambios hasta el commit es propio
+            desde = self.ultimo_cambio(conn)
+            try:
+                yield instrumentacion.CursorMedido(cursor, self.instrumentacion)
+            except BaseException:
+                conn.rollback()
+                raise
+            else:
+                hasta = self.ultimo_cambio(conn)
+                conn.commit()
+                if desde is not None and hasta > desde:
+                    self.cambios_propios.append((desde, hasta))
+
+    def ejecutar(self, query, params=()):
+        """Una sentencia de escritura con su commit; devuelve el cursor (rowcount, lastrowid)"""
+        with self.transaccion() as cursor:
+            cursor.execute(query, params)
+        return cursor
+
+    def ultimo_cambio(self, conn):
+        """Último id_cambio de la tabla cambios, o None si la base todavía no tiene la migración 8"""
+        try:
+            return conn.execute("SELECT COALESCE(MAX(id_cambio), 0) FROM cambios").fetchone()[0]
+        except sqlite3.OperationalError:
+            return None
+
+    def cambio_propio(self, id_cambio):
+        """True si el cambio lo escribió este pool (la sesión ya lo aplicó al escribirlo)"""
+        return any(desde < id_cambio <= hasta for desde, hasta in list(self.cambios_propios))
+
+    @contextmanager
+    def lector(self):
+        """Toma una conexión de lectura libre (espera si están todas en uso) y la devuelve al terminar"""
+        conn = self.lectores.get()
+        try:
+            yield conn
+        finally:
+            self.lectores.put(conn)
+
+    def consultar(self, query, params=(), fabrica=None):
+        """Todas las filas de la consulta; con fabrica (un row_factory) cada fila se arma con ella"""
+        with self.lector() as conn:
+            cursor = conn.cursor()
+            cursor.row_factory = fabrica
+
+            def ejecutar():
+                filas = cursor.execute(query, params).fetchall()
+                return filas, len(filas)
+            return self.instrumentacion.medir(conn, query, params, ejecutar)
+
+    def cerrar(self):
+        with self.lock_escritura:
+            self.escritura.close()
+        while not self.lectores.empty():
+            self.lectores.get_nowait().close()
@@ -0,0 +1,570 @@
+"""Benchmarks de las operaciones frecuentes de la aplicación sobre bases sintéticas
+
+Uso: python benchmark.py [--tamanos 10000 100000 1000000] [--directorio bench] [--repeticiones 20]
+                         [--salida resultados.json] [--regenerar]
+
+Para cada tamaño genera (o reutiliza) bench/libreria_<tamaño>.db con ese número de libros y de
+préstamos, abre BibliotecaApp sobre una página simulada y mide cada operación. El resultado es
+un JSON con la mediana, el mínimo y el máximo en milisegundos, para comparar entre versiones.
+Además corre una carga mixta de altas, bajas y consultas con distintos tamaños de caché de
+sentencias preparadas (cache_sentencias), para ver cuánto cuesta volver a preparar cada una.
+Por último respalda la base mientras otro hilo escribe sin parar (respaldo), con distintas
+cantidades de páginas por paso: velocidad de la copia y la mayor espera de un commit.
+También comprueba la caché de portadas contra un servidor de imágenes local (fallas_portadas) y
+que un libro importado se pueda prestar (fallas_importacion), y mide cuántas consultas de
+disponibilidad por segundo atiende la API con 1, 8 y 32 clientes simultáneos (api_disponibilidad).
+"""
+import argparse
+import asyncio
+import io
+import json
+import os
+import platform
+import random
+import re
+import shutil
+import sqlite3
+import statistics
+import sys
+import threading
+import time
+from datetime import date, datetime, timedelta
+
+import api
+import atrasos
+import base_datos
+import importacion
+import libreria
+import migraciones
+import portadas
+import repositorios
+import respaldos
+from consultas import REPORTES, SENTENCIAS
+
+CATEGORIAS = 20
+# Fracción de préstamos que siguen abiertos (con su libro no disponible)
+ABIERTOS = 0.05
+LOTE = 50000
+# Tamaños de caché de sentencias a comparar en la carga mixta (0 = preparar siempre)
+CACHES_SENTENCIAS = (0, 16, 128, base_datos.CACHE_SENTENCIAS_POR_DEFECTO)
+# Páginas por paso del respaldo a comparar (-1 = toda la base en un solo paso)
+PAGINAS_RESPALDO = (64, respaldos.PAGINAS_POR_PASO, -1)
+# Pausa del escritor de fondo entre commit y commit durante el respaldo
+PAUSA_ESCRITOR = 0.005
+# Clientes HTTP simultáneos contra la API y consultas de disponibilidad por cada cantidad
+CLIENTES_API = (1, 8, 32)
+PEDIDOS_API = 4000
+PALABRAS = ("sombra", "viaje", "río", "ciudad", "noche", "mar", "jardín", "memoria", "fuego", "reino",
+            "camino", "silencio", "tiempo", "luz", "invierno", "casa", "guerra", "sueño", "isla", "voz")
+NOMBRES = ("Ana", "Luis", "Marta", "Pablo", "Sofía", "Diego", "Lucía", "Tomás", "Julia", "Martín")
+APELLIDOS = ("García", "López", "Pérez", "Gómez", "Díaz", "Romero", "Sosa", "Álvarez", "Ruiz", "Torres")
+
+
+class PaginaSimulada:
+    """Reemplazo de ft.Page sin cliente: acepta los controles y cuenta las actualizaciones"""
+    def __init__(self):
+        self.overlay = []
+        self.controls = []
+        self.actualizaciones = 0
+
+    def add(self, *controles):
+        self.controls.extend(controles)
+
+    def update(self, *controles):
+        self.actualizaciones += 1
+
+    def open(self, control):
+        pass
+
+    def close(self, control):
+        pass
+
+    def run_task(self, funcion, *args):
+        return asyncio.run(funcion(*args))
+
+
+def generar_base(ruta, libros, prestamos, semilla=1):
+    """Crea una base con datos sintéticos; los datos se cargan con el esquema base y las demás
+    migraciones (FTS, estadísticas, vencimientos) se aplican después, como en una base real"""
+    azar = random.Random(semilla)
+    usuarios = max(100, libros // 10)
+    conn = sqlite3.connect(ruta)
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("PRAGMA synchronous = OFF")
+    for sentencia in migraciones.MIGRACIONES[0]:
+        conn.execute(sentencia)
+    conn.execute("PRAGMA user_version = 1")
+
+    conn.executemany("INSERT INTO categorias (nombre_categoria) VALUES (?)",
+                     [(f"Categoría {i}",) for i in range(1, CATEGORIAS + 1)])
+    conn.executemany(
+        "INSERT INTO usuarios (nombre, apellido, dni, email) VALUES (?, ?, ?, ?)",
+        ((azar.choice(NOMBRES), azar.choice(APELLIDOS), str(10000000 + i), f"usuario{i}@ejemplo.com")
+         for i in range(usuarios))
+    )
+    for inicio in range(0, libros, LOTE):
+        conn.executemany(
+            "INSERT INTO libros (titulo, autor, año, id_categoria, disponible, link_imagen) VALUES (?, ?, ?, ?, 1, '')",
+            ((" ".join(azar.sample(PALABRAS, 3)).capitalize() + f" {i}",
+              f"{azar.choice(NOMBRES)} {azar.choice(APELLIDOS)}",
+              azar.randint(1900, 2024), azar.randint(1, CATEGORIAS))
+             for i in range(inicio, min(inicio + LOTE, libros)))
+        )
+
+    # Los préstamos abiertos van a libros distintos, que quedan no disponibles
+    abiertos = min(int(prestamos * ABIERTOS), libros)
+    libros_prestados = azar.sample(range(1, libros + 1), abiertos)
+    hoy = date.today()
+    for inicio in range(0, prestamos, LOTE):
+        filas = []
+        for i in range(inicio, min(inicio + LOTE, prestamos)):
+            if i < abiertos:
+                id_libro, devuelto, dias = libros_prestados[i], 0, azar.randint(0, 60)
+            else:
+                id_libro, devuelto, dias = azar.randint(1, libros), 1, azar.randint(0, 5 * 365)
+            filas.append((id_libro, azar.randint(1, usuarios), (hoy - timedelta(days=dias)).isoformat(), devuelto))
+        conn.executemany(
+            "INSERT INTO prestamos (id_libro, id_usuario, fecha_prestamo, devuelto) VALUES (?, ?, ?, ?)", filas
+        )
+    conn.executemany("UPDATE libros SET disponible = 0 WHERE id_libro = ?", ((id_libro,) for id_libro in libros_prestados))
+    conn.commit()
+    migraciones.migrar(conn)
+    conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    conn.close()
+
+
+def medir(funcion, repeticiones):
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        funcion()
+        tiempos.append((time.perf_counter() - inicio) * 1000)
+    return {
+        "mediana_ms": round(statistics.median(tiempos), 3),
+        "min_ms": round(min(tiempos), 3),
+        "max_ms": round(max(tiempos), 3),
+        "repeticiones": repeticiones,
+    }
+
+
+def operaciones(app):
+    """Las operaciones a medir, como funciones sin argumentos"""
+    libre = app.obtener_datos("SELECT id_libro FROM libros WHERE disponible = 1 LIMIT 1")[0][0]
+    id_usuario = app.usuarios[0].id_usuario
+    id_categoria = app.categorias[0].id_categoria
+    # Un libro con historial: eliminar_libro solo hace los controles y no borra nada
+    con_historial = app.obtener_datos("SELECT id_libro FROM prestamos LIMIT 1")[0][0]
+    pagina_libros = list(app.libros)
+    # Una página del tamaño más grande: con la tabla virtual solo se crean las filas de la vista
+    pagina_grande = app.repos['libros'].pagina(None, libreria.TAMANOS_PAGINA[-1])
+
+    def prestar_y_devolver():
+        app.libro_dropdown.value = str(libre)
+        app.usuario_dropdown.value = str(id_usuario)
+        app.fecha_prestamo_field.value = datetime.now().strftime("%Y-%m-%d")
+        app.agregar_prestamo(None)
+        id_prestamo = app.obtener_datos(
+            "SELECT id_prestamo FROM prestamos WHERE id_libro = ? AND devuelto = 0", (libre,))[0][0]
+        app.devolver_libro(id_prestamo)
+
+    def libros_pagina_10():
+        app.paginadores['libros'].reiniciar()
+        for _ in range(10):
+            app.pagina_siguiente('libros')
+
+    return {
+        "cargar_libros": app.cargar_libros,
+        "cargar_libros_pagina_10": libros_pagina_10,
+        "buscar_libros": lambda: app.buscar_en_tabla_libros("sombra viaje"),
+        "cargar_usuarios": app.cargar_usuarios,
+        "cargar_prestamos": app.cargar_prestamos,
+        "cargar_atrasados": app.cargar_atrasados,
+        "agregar_y_devolver_prestamo": prestar_y_devolver,
+        "eliminar_categoria_control": lambda: app.eliminar_categoria(id_categoria),
+        "eliminar_libro_control": lambda: app.eliminar_libro(con_historial),
+        "renderizar_filas_libros": lambda: [app.crear_fila_libro(libro) for libro in pagina_libros],
+        "reconstruir_tabla_libros": lambda: app.tablas['libros'].reconstruir(pagina_libros),
+        "reconstruir_tabla_libros_pagina_grande": lambda: app.tablas['libros'].reconstruir(pagina_grande),
+        "consultar_reportes": app.consultar_reportes,
+        "informe_atrasos": lambda: atrasos.calcular_atrasos(app.pool),
+    }
+
+
+def contar_actualizaciones(app):
+    """page.update() enviados por acción: sin agrupar (uno por cada actualizar(), como antes) y
+    agrupados en un lote por manejador de evento"""
+    libre = app.obtener_datos("SELECT id_libro FROM libros WHERE disponible = 1 LIMIT 1")[0][0]
+    id_usuario = app.usuarios[0].id_usuario
+
+    def agregar_prestamo():
+        app.libro_dropdown.value = str(libre)
+        app.usuario_dropdown.value = str(id_usuario)
+        app.fecha_prestamo_field.value = datetime.now().strftime("%Y-%m-%d")
+        app.agregar_prestamo(None)
+
+    def devolver_libro():
+        app.devolver_libro(app.obtener_datos(
+            "SELECT id_prestamo FROM prestamos WHERE id_libro = ? AND devuelto = 0", (libre,))[0][0])
+
+    def agregar_y_eliminar_categoria():
+        app.categoria_nombre_field.value = "Categoría de prueba"
+        app.agregar_categoria(None)
+        app.eliminar_categoria(app.referencias.buscar('categorias', "categoría de prueba"))
+
+    acciones = {
+        "agregar_prestamo": agregar_prestamo,
+        "devolver_libro": devolver_libro,
+        "agregar_y_eliminar_categoria": agregar_y_eliminar_categoria,
+        "pagina_siguiente_libros": lambda: app.pagina_siguiente('libros'),
+        "buscar_libros": lambda: app.buscar_en_tabla_libros("sombra"),
+    }
+    resultado = {nombre: {} for nombre in acciones}
+    for modo, agrupar in (("sin_agrupar", False), ("agrupadas", True)):
+        app.agrupar = agrupar
+        for nombre, funcion in acciones.items():
+            antes = app.actualizaciones_enviadas
+            funcion()
+            resultado[nombre][modo] = app.actualizaciones_enviadas - antes
+    app.agrupar = True
+    return resultado
+
+
+def carga_mixta(pool):
+    """Una vuelta de trabajo de mostrador: listados, controles, búsquedas, un préstamo y el ABM de una categoría"""
+    repos = {
+        'categorias': repositorios.RepositorioCategorias(pool),
+        'usuarios': repositorios.RepositorioUsuarios(pool),
+        'libros': repositorios.RepositorioLibros(pool),
+        'prestamos': repositorios.RepositorioPrestamos(pool),
+    }
+    libre = pool.consultar("SELECT id_libro FROM libros WHERE disponible = 1 LIMIT 1")[0][0]
+    usuario = repos['usuarios'].pagina(None, 1)[0]
+    hoy = date.today().isoformat()
+
+    def vuelta():
+        libros = repos['libros'].pagina(None, 50)
+        repos['libros'].pagina((libros[-1].titulo, libros[-1].id_libro), 50)
+        repos['usuarios'].pagina(None, 50)
+        prestamos = repos['prestamos'].pagina(None, 50)
+        repos['prestamos'].pagina(None, 50, (hoy, hoy))
+        repos['prestamos'].atrasados(hoy, None, 50)
+        repos['libros'].buscar("sombra", 20)
+        for entidad, registro in (('libros', libros[0]), ('usuarios', usuario), ('prestamos', prestamos[0])):
+            repos[entidad].por_id(registro.id)
+        pool.consultar(SENTENCIAS["usuario_dni_repetido"], (usuario.dni, usuario.id_usuario))
+        pool.consultar(SENTENCIAS["libro_prestamos"], (libros[0].id_libro,))
+        pool.consultar(SENTENCIAS["usuario_prestamos"], (usuario.id_usuario,))
+        for query in REPORTES.values():
+            pool.consultar(query, (10,))
+        pool.consultar(SENTENCIAS["totales_reportes"])
+        repos['prestamos'].devolver(repos['prestamos'].registrar(libre, usuario.id_usuario, hoy))
+        id_categoria = pool.ejecutar(SENTENCIAS["categoria_insertar"], ("Categoría de prueba", 14)).lastrowid
+        pool.ejecutar(SENTENCIAS["categoria_actualizar"], ("Categoría de prueba", 7, id_categoria))
+        pool.consultar(SENTENCIAS["categoria_libros"], (id_categoria,))
+        pool.ejecutar(SENTENCIAS["categoria_eliminar"], (id_categoria,))
+
+    return vuelta
+
+
+def comparar_cache_sentencias(ruta, repeticiones):
+    """La carga mixta con cada tamaño de caché, en un pool nuevo por tamaño"""
+    resultado = {}
+    for cache in CACHES_SENTENCIAS:
+        pool = base_datos.PoolConexiones(ruta, lectores=1, cache=cache)
+        vuelta = carga_mixta(pool)
+        vuelta()
+        resultado[str(cache)] = medir(vuelta, repeticiones)
+        resultado[str(cache)]["sentencias_distintas"] = len(pool.instrumentacion.sentencias)
+        pool.cerrar()
+    return resultado
+
+
+def verificar_stats(ruta):
+    """Cambia categoría y autor de un libro nunca prestado y de uno prestado, y compara las tablas
+    stats_* con el recuento desde cero; todo dentro de una transacción que se deshace al final"""
+    conn = base_datos.conectar(ruta)
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        categorias = [fila[0] for fila in conn.execute("SELECT id_categoria FROM categorias ORDER BY id_categoria LIMIT 2")]
+        libros = [conn.execute("SELECT id_libro FROM libros WHERE id_libro NOT IN (SELECT id_libro FROM stats_libros) LIMIT 1").fetchone(),
+                  conn.execute("SELECT id_libro FROM stats_libros WHERE prestamos > 0 LIMIT 1").fetchone()]
+        for fila in filter(None, libros):
+            for id_categoria, autor in ((categorias[-1], "Autor de prueba"), (categorias[0], "Otro autor de prueba")):
+                conn.execute("UPDATE libros SET id_categoria = ?, autor = ? WHERE id_libro = ?", (id_categoria, autor, fila[0]))
+        return {tabla: len(diferencias) for tabla, diferencias in migraciones.diferencias_stats(conn).items()}
+    finally:
+        conn.rollback()
+        conn.close()
+
+
+def verificar_importacion(ruta, directorio):
+    """Importa, sobre una copia de la base, un libro con la columna vieja disponible en 0 y comprueba
+    que sus ejemplares se pueden prestar; devuelve la lista de comprobaciones que fallaron"""
+    copia = os.path.join(directorio, "importacion.db")
+    csv_libros = os.path.join(directorio, "importacion.csv")
+    for archivo in (copia, copia + "-wal", copia + "-shm"):
+        if os.path.exists(archivo):
+            os.remove(archivo)
+    with sqlite3.connect(ruta) as origen, sqlite3.connect(copia) as destino:
+        origen.backup(destino)
+        id_categoria = origen.execute("SELECT MIN(id_categoria) FROM categorias").fetchone()[0]
+    with open(csv_libros, "w", encoding="utf-8", newline="") as archivo:
+        archivo.write("titulo,autor,año,id_categoria,ejemplares,disponible\n")
+        archivo.write(f"Libro importado de prueba,Autor de prueba,1999,{id_categoria},2,0\n")
+    pool = base_datos.PoolConexiones(copia, lectores=1)
+    fallas = []
+    try:
+        resultado = importacion.importar(pool, "libros", csv_libros)
+        if resultado.insertados != 1:
+            return [f"importacion: {resultado.rechazados}"]
+        id_libro = pool.consultar("SELECT MAX(id_libro) FROM libros")[0][0]
+        if pool.consultar("SELECT ejemplares, disponibles FROM libros WHERE id_libro = ?", (id_libro,))[0] != (2, 2):
+            fallas.append("ejemplares_libres")
+        prestamos = repositorios.RepositorioPrestamos(pool)
+        id_usuario = pool.consultar("SELECT MIN(id_usuario) FROM usuarios")[0][0]
+        try:
+            for _ in range(2):
+                prestamos.registrar(id_libro, id_usuario, date.today().isoformat())
+        except repositorios.ConflictoEstado:
+            fallas.append("prestar")
+        try:
+            prestamos.registrar(id_libro, id_usuario, date.today().isoformat())
+            fallas.append("tercer_prestamo")
+        except repositorios.ConflictoEstado:
+            pass
+    finally:
+        pool.cerrar()
+        os.remove(csv_libros)
+        for archivo in (copia, copia + "-wal", copia + "-shm"):
+            if os.path.exists(archivo):
+                os.remove(archivo)
+    return fallas
+
+
+def imagen_prueba(color, lado=600):
+    """Una imagen JPEG de lado x lado; sin Pillow, bytes cualesquiera (la caché guarda el original)"""
+    if portadas.Image is None:
+        return bytes([color]) * lado * lado
+    salida = io.BytesIO()
+    portadas.Image.new("RGB", (lado, lado), (color, 255 - color, 90)).save(salida, "JPEG")
+    return salida.getvalue()
+
+
+def verificar_portadas(directorio):
+    """Descarga desde ServidorImagenesPrueba, miniaturas y desalojo LRU de la caché de portadas;
+    devuelve la lista de comprobaciones que fallaron (debe quedar vacía)"""
+    shutil.rmtree(directorio, ignore_errors=True)
+    servidor = portadas.ServidorImagenesPrueba({f"{nombre}.jpg": imagen_prueba(color)
+                                                for nombre, color in (("a", 30), ("b", 120), ("c", 210))})
+    cache = portadas.CachePortadas(directorio, limite_bytes=1024 * 1024 * 1024, trabajadores=1)
+    url_a, url_b, url_c = (servidor.url(nombre) for nombre in ("a.jpg", "b.jpg", "c.jpg"))
+    fallas = []
+    try:
+        def archivos(url):
+            return sorted(nombre for nombre in os.listdir(directorio) if nombre.startswith(portadas.clave_url(url)))
+
+        for url in (url_a, url_b):
+            cache.obtener(url)
+        cache.esperar()
+        if len(archivos(url_a)) != len(portadas.TAMANOS) or len(archivos(url_b)) != len(portadas.TAMANOS):
+            fallas.append("descarga")
+        if portadas.Image is not None:
+            for url in (url_a, url_b):
+                for tamano, lado in portadas.TAMANOS.items():
+                    with portadas.Image.open(os.path.join(directorio, cache.nombre_archivo(url, tamano))) as imagen:
+                        if max(imagen.size) != lado:
+                            fallas.append(f"miniatura_{tamano}")
+        pedidos = servidor.pedidos
+        if not cache.obtener(url_a) or not cache.obtener(url_b, "grande") or servidor.pedidos != pedidos:
+            fallas.append("servida_desde_cache")
+        # Entran justo a y b; a se usó recién, así que al llegar c se desaloja b
+        cache.limite_bytes = cache.total_bytes
+        cache.obtener(url_a)
+        cache.obtener(url_c)
+        cache.esperar()
+        if archivos(url_b) or not archivos(url_a) or not archivos(url_c) or cache.total_bytes > cache.limite_bytes:
+            fallas.append("desalojo_lru")
+        for url in ("file:///etc/passwd", "ftp://127.0.0.1/a.jpg", "/etc/passwd"):
+            if cache.obtener(url) is not None or cache.obtener(url, "grande") is not None:
+                fallas.append(f"rechazo {url}")
+        cache.esperar()
+        if len(os.listdir(directorio)) != 2 * len(portadas.TAMANOS):
+            fallas.append("rechazo_sin_archivos")
+    finally:
+        servidor.cerrar()
+    return fallas
+
+
+def escritor_de_fondo(ruta, detenido):
+    """Hace commits chicos en una tabla aparte hasta que se pida parar; devuelve la duración de cada uno (ms)"""
+    conn = base_datos.conectar(ruta)
+    conn.execute("CREATE TABLE IF NOT EXISTS bench_escrituras (id INTEGER PRIMARY KEY, valor TEXT)")
+    conn.commit()
+    tiempos = []
+    while not detenido.is_set():
+        inicio = time.perf_counter()
+        conn.execute("INSERT INTO bench_escrituras (valor) VALUES (?)", (datetime.now().isoformat(),))
+        conn.commit()
+        tiempos.append((time.perf_counter() - inicio) * 1000)
+        time.sleep(PAUSA_ESCRITOR)
+    conn.execute("DELETE FROM bench_escrituras")
+    conn.commit()
+    conn.close()
+    return tiempos
+
+
+def con_escritor(ruta, funcion):
+    """Corre funcion() con el escritor de fondo andando; devuelve (resultado, duraciones de los commits)"""
+    detenido = threading.Event()
+    tiempos = []
+    hilo = threading.Thread(target=lambda: tiempos.extend(escritor_de_fondo(ruta, detenido)))
+    hilo.start()
+    time.sleep(0.2)
+    try:
+        resultado = funcion()
+    finally:
+        detenido.set()
+        hilo.join()
+    return resultado, tiempos
+
+
+def medir_respaldo(ruta, directorio):
+    """Velocidad del respaldo y espera máxima de un escritor, comparado con el escritor solo"""
+    _, base = con_escritor(ruta, lambda: time.sleep(1))
+    resultado = {"escritor_solo": {"commits": len(base), "maximo_commit_ms": round(max(base), 3),
+                                   "mediana_commit_ms": round(statistics.median(base), 3)}}
+    for paginas in PAGINAS_RESPALDO:
+        respaldo, tiempos = con_escritor(ruta, lambda: respaldos.respaldar(ruta, directorio, paginas))
+        os.remove(respaldo.ruta)
+        resultado[str(paginas)] = {
+            "mb": round(respaldo.bytes / (1024 * 1024), 1),
+            "segundos": round(respaldo.segundos, 3),
+            "mb_por_segundo": round(respaldo.mb_por_segundo, 1),
+            "pasos": respaldo.pasos,
+            "reinicios": respaldo.reinicios,
+            "commits": len(tiempos),
+            "maximo_commit_ms": round(max(tiempos), 3),
+            "mediana_commit_ms": round(statistics.median(tiempos), 3),
+        }
+    return resultado
+
+
+async def cliente_api(puerto, ids, latencias, errores):
+    """Un cliente con conexión persistente que pide la disponibilidad de cada id, de a un pedido por vez"""
+    reader, writer = await asyncio.open_connection("127.0.0.1", puerto)
+    try:
+        for id_libro in ids:
+            inicio = time.perf_counter()
+            writer.write(f"GET /libros/{id_libro}/disponibilidad HTTP/1.1\r\nHost: benchmark\r\n\r\n".encode("ascii"))
+            encabezado = await reader.readuntil(b"\r\n\r\n")
+            await reader.readexactly(int(re.search(rb"Content-Length: (\d+)", encabezado).group(1)))
+            latencias.append((time.perf_counter() - inicio) * 1000)
+            if not encabezado.startswith(b"HTTP/1.1 200 "):
+                errores.append(encabezado.split(b"\r\n", 1)[0].decode("latin-1"))
+    finally:
+        writer.close()
+
+
+async def carga_api(pool, ids, clientes):
+    servidor = api.ServidorAPI(pool, puerto=0)
+    await servidor.iniciar()
+    latencias, errores = [], []
+    try:
+        inicio = time.perf_counter()
+        await asyncio.gather(*(cliente_api(servidor.puerto, ids[i::clientes], latencias, errores)
+                               for i in range(clientes)))
+        segundos = time.perf_counter() - inicio
+    finally:
+        await servidor.cerrar()
+    latencias.sort()
+    return {
+        "pedidos_por_segundo": round(len(latencias) / segundos),
+        "mediana_ms": round(statistics.median(latencias), 3),
+        "p99_ms": round(latencias[int(len(latencias) * 0.99)], 3),
+        "errores": len(errores),
+    }
+
+
+def medir_api(ruta):
+    """Consultas GET /libros/<id>/disponibilidad por segundo con distintos clientes simultáneos,
+    servidor y clientes en el mismo proceso"""
+    pool = base_datos.PoolConexiones(ruta)
+    try:
+        maximo = pool.consultar("SELECT MAX(id_libro) FROM libros")[0][0]
+        azar = random.Random(1)
+        ids = [azar.randint(1, maximo) for _ in range(PEDIDOS_API)]
+        return {str(clientes): asyncio.run(carga_api(pool, ids, clientes)) for clientes in CLIENTES_API}
+    finally:
+        pool.cerrar()
+
+
+def correr(tamano, directorio, repeticiones, regenerar=False):
+    ruta = os.path.join(directorio, f"libreria_{tamano}.db")
+    resultado = {"libros": tamano, "prestamos": tamano}
+    if regenerar or not os.path.exists(ruta):
+        for sufijo in ("", "-wal", "-shm"):
+            if os.path.exists(ruta + sufijo):
+                os.remove(ruta + sufijo)
+        inicio = time.perf_counter()
+        generar_base(ruta, tamano, tamano)
+        resultado["generacion_s"] = round(time.perf_counter() - inicio, 2)
+
+    inicio = time.perf_counter()
+    app = libreria.BibliotecaApp(PaginaSimulada(), ruta_db=ruta)
+    resultado["inicio_app_ms"] = round((time.perf_counter() - inicio) * 1000, 3)
+    resultado["primera_pantalla_ms"] = round(app.tiempo_primera_pantalla_ms, 3)
+    # Las operaciones usan datos de todas las pestañas
+    inicio = time.perf_counter()
+    app.page.run_task(app.cargar_todo_async)
+    resultado["carga_todas_pestanas_ms"] = round((time.perf_counter() - inicio) * 1000, 3)
+    # Las operaciones que escriben avisan al bus; se detiene para que no interfiera con las mediciones
+    app.bus.desuscribir(app.aplicar_cambios)
+    resultado["actualizaciones_por_accion"] = contar_actualizaciones(app)
+    resultado["operaciones"] = {nombre: medir(funcion, repeticiones) for nombre, funcion in operaciones(app).items()}
+    app.pool.cerrar()
+    # Claves de stats_* que no coinciden con el recuento después de editar libros (debe quedar vacío)
+    resultado["diferencias_stats"] = verificar_stats(ruta)
+    resultado["cache_sentencias"] = comparar_cache_sentencias(ruta, repeticiones)
+    # Comprobaciones de la importación de libros que no pasaron (debe quedar vacío)
+    resultado["fallas_importacion"] = verificar_importacion(ruta, directorio)
+    # Comprobaciones de la caché de portadas que no pasaron (debe quedar vacío)
+    resultado["fallas_portadas"] = verificar_portadas(os.path.join(directorio, "portadas"))
+    resultado["api_disponibilidad"] = medir_api(ruta)
+    resultado["respaldo"] = medir_respaldo(ruta, os.path.join(directorio, "respaldos"))
+    return resultado
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks de la aplicación sobre bases sintéticas")
+    parser.add_argument("--tamanos", type=int, nargs="+", default=[10000, 100000, 1000000],
+                        help="cantidad de libros (y de préstamos) de cada base")
+    parser.add_argument("--directorio", default="bench", help="dónde se guardan las bases generadas")
+    parser.add_argument("--repeticiones", type=int, default=20)
+    parser.add_argument("--salida", help="archivo JSON de resultados (por defecto se imprime)")
+    parser.add_argument("--regenerar", action="store_true", help="vuelve a generar las bases existentes")
+    args = parser.parse_args()
+
+    os.makedirs(args.directorio, exist_ok=True)
+    # Los respaldos programados de la aplicación se apagan: el respaldo se mide aparte, en medir_respaldo
+    os.environ["BIBLIOTECA_RESPALDO_HORAS"] = "0"
+    informe = {
+        "fecha": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "plataforma": platform.platform(),
+        "resultados": [],
+    }
+    for tamano in args.tamanos:
+        print(f"Midiendo {tamano} libros...", file=sys.stderr)
+        informe["resultados"].append(correr(tamano, args.directorio, args.repeticiones, args.regenerar))
+
+    texto = json.dumps(informe, indent=2, ensure_ascii=False)
+    if args.salida:
+        with open(args.salida, "w", encoding="utf-8") as archivo:
+            archivo.write(texto)
+    else:
+        print(texto)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+"""Consultas SQL compartidas por la aplicación y la exportación
+
+Las sentencias de alta, edición, baja y control van en SENTENCIAS con un nombre: el texto de
+cada una es siempre el mismo, así que cada conexión la prepara una vez y después la toma de su
+caché de sentencias (ver base_datos.CACHE_SENTENCIAS_POR_DEFECTO).
+"""
+import re
+
+CONSULTA_LIBROS = """
+        SELECT l.id_libro, l.titulo, l.autor, l.año, l.id_categoria, c.nombre_categoria,
+               l.disponible, l.link_imagen, l.ejemplares, l.disponibles
+        FROM libros l
+        LEFT JOIN categorias c ON l.id_categoria = c.id_categoria
+        """
+
+# Largo de los prefijos que libros_fts tiene indexados (prefix='2 3')
+PREFIJO_INDEXADO = 3
+
+# Parámetros: consulta FTS, límite. Se ordenan todas las coincidencias por bm25; con ORDER BY rank
+# y LIMIT dentro de la subconsulta, FTS5 conserva solo las mejores en lugar de ordenar todo
+BUSQUEDA_LIBROS = """
+        SELECT l.id_libro, l.titulo, l.autor, l.año, l.id_categoria, c.nombre_categoria,
+               l.disponible, l.link_imagen, l.ejemplares, l.disponibles
+        FROM (SELECT rowid, rank FROM libros_fts WHERE libros_fts MATCH ? ORDER BY rank LIMIT ?) f
+        JOIN libros l ON l.id_libro = f.rowid
+        LEFT JOIN categorias c ON l.id_categoria = c.id_categoria
+        ORDER BY f.rank
+        """
+# Con prefijos cortos casi todo el catálogo coincide: se devuelven en el orden del índice, sin
+# calcular bm25 (la pantalla lo aclara en el campo de búsqueda)
+BUSQUEDA_LIBROS_CORTA = """
+        SELECT l.id_libro, l.titulo, l.autor, l.año, l.id_categoria, c.nombre_categoria,
+               l.disponible, l.link_imagen, l.ejemplares, l.disponibles
+        FROM (SELECT rowid FROM libros_fts WHERE libros_fts MATCH ? ORDER BY rowid LIMIT ?) f
+        JOIN libros l ON l.id_libro = f.rowid
+        LEFT JOIN categorias c ON l.id_categoria = c.id_categoria
+        ORDER BY f.rowid
+        """
+
+# Títulos con algún ejemplar libre, para el selector de préstamos; la condición disponibles > 0
+# tiene que estar escrita tal cual para que SQLite use el índice parcial idx_libros_prestables
+CONSULTA_PRESTABLES = CONSULTA_LIBROS + " WHERE l.disponibles > 0 ORDER BY l.titulo, l.id_libro LIMIT ?"
+# Las búsquedas filtran por disponibles dentro de la subconsulta, antes del LIMIT: si no, los
+# primeros resultados podrían estar todos prestados y el selector quedaría vacío
+BUSQUEDA_PRESTABLES = """
+        SELECT l.id_libro, l.titulo, l.autor, l.año, l.id_categoria, c.nombre_categoria,
+               l.disponible, l.link_imagen, l.ejemplares, l.disponibles
+        FROM (SELECT libros_fts.rowid, libros_fts.rank
+              FROM libros_fts JOIN libros d ON d.id_libro = libros_fts.rowid
+              WHERE libros_fts MATCH ? AND d.disponibles > 0
+              ORDER BY libros_fts.rank LIMIT ?) f
+        JOIN libros l ON l.id_libro = f.rowid
+        LEFT JOIN categorias c ON l.id_categoria = c.id_categoria
+        ORDER BY f.rank
+        """
+BUSQUEDA_PRESTABLES_CORTA = """
+        SELECT l.id_libro, l.titulo, l.autor, l.año, l.id_categoria, c.nombre_categoria,
+               l.disponible, l.link_imagen, l.ejemplares, l.disponibles
+        FROM (SELECT libros_fts.rowid
+              FROM libros_fts JOIN libros d ON d.id_libro = libros_fts.rowid
+              WHERE libros_fts MATCH ? AND d.disponibles > 0
+              ORDER BY libros_fts.rowid LIMIT ?) f
+        JOIN libros l ON l.id_libro = f.rowid
+        LEFT JOIN categorias c ON l.id_categoria = c.id_categoria
+        ORDER BY f.rowid
+        """
+
+CONSULTA_USUARIOS = "SELECT id_usuario, nombre, apellido, dni, email FROM usuarios"
+
+CONSULTA_PRESTAMOS = """
+        SELECT p.id_prestamo, p.id_libro, l.titulo, l.autor, p.id_usuario,
+               u.nombre || ' ' || u.apellido as usuario, p.fecha_prestamo, p.devuelto,
+               p.fecha_vencimiento
+        FROM prestamos p
+        JOIN libros l ON p.id_libro = l.id_libro
+        JOIN usuarios u ON p.id_usuario = u.id_usuario
+        """
+
+# Reportes de circulación, leídos de las tablas stats_* que mantienen los triggers
+REPORTES = {
+    "categorias": """
+        SELECT c.nombre_categoria, s.prestamos
+        FROM stats_categorias s
+        JOIN categorias c ON s.id_categoria = c.id_categoria
+        WHERE s.prestamos > 0
+        ORDER BY s.prestamos DESC
+        LIMIT ?
+        """,
+    "meses": "SELECT mes, prestamos FROM stats_meses WHERE prestamos > 0 ORDER BY mes DESC LIMIT ?",
+    "libros": """
+        SELECT l.titulo || ' - ' || l.autor, s.prestamos
+        FROM stats_libros s
+        JOIN libros l ON s.id_libro = l.id_libro
+        WHERE s.prestamos > 0
+        ORDER BY s.prestamos DESC
+        LIMIT ?
+        """,
+    "autores": "SELECT autor, prestamos FROM stats_autores WHERE prestamos > 0 ORDER BY prestamos DESC LIMIT ?",
+    "usuarios": """
+        SELECT u.nombre || ' ' || u.apellido, s.prestamos
+        FROM stats_usuarios s
+        JOIN usuarios u ON s.id_usuario = u.id_usuario
+        WHERE s.prestamos > 0
+        ORDER BY s.prestamos DESC
+        LIMIT ?
+        """,
+}
+
+CONSULTA_CATEGORIAS = "SELECT id_categoria, nombre_categoria, dias_prestamo FROM categorias"
+
+# Préstamos abiertos vencidos antes de la fecha dada; la condición devuelto = 0 tiene que
+# estar escrita tal cual para que SQLite use el índice parcial idx_prestamos_vencimiento
+CONSULTA_ATRASADOS = CONSULTA_PRESTAMOS + " WHERE p.devuelto = 0 AND p.fecha_vencimiento < ?"
+
+SENTENCIAS = {
+    "categoria_insertar": "INSERT INTO categorias (nombre_categoria, dias_prestamo) VALUES (?, ?)",
+    "categoria_actualizar": "UPDATE categorias SET nombre_categoria = ?, dias_prestamo = ? WHERE id_categoria = ?",
+    "categoria_eliminar": "DELETE FROM categorias WHERE id_categoria = ?",
+    "categoria_libros": "SELECT COUNT(*) FROM libros WHERE id_categoria = ?",
+    "usuario_insertar": "INSERT INTO usuarios (nombre, apellido, dni, email) VALUES (?, ?, ?, ?)",
+    "usuario_actualizar": "UPDATE usuarios SET nombre = ?, apellido = ?, dni = ?, email = ? WHERE id_usuario = ?",
+    "usuario_eliminar": "DELETE FROM usuarios WHERE id_usuario = ?",
+    "usuario_prestamos": "SELECT COUNT(*), COALESCE(SUM(devuelto = 0), 0) FROM prestamos WHERE id_usuario = ?",
+    # Con id_usuario 0 (un alta) no excluye a nadie: una sola sentencia para alta y edición
+    "usuario_dni_repetido": "SELECT COUNT(*) FROM usuarios WHERE dni = ? AND id_usuario != ?",
+    # Un alta tiene todos sus ejemplares disponibles
+    "libro_insertar": """
+        INSERT INTO libros (titulo, autor, año, id_categoria, link_imagen, ejemplares, disponibles, disponible)
+        VALUES (:titulo, :autor, :año, :id_categoria, :link_imagen, :ejemplares, :ejemplares, 1)
+        """,
+    # Cambiar la cantidad de ejemplares mueve disponibles en la misma medida; no puede quedar
+    # por debajo de los que están prestados (ejemplares - disponibles)
+    "libro_actualizar": """
+        UPDATE libros SET titulo = :titulo, autor = :autor, año = :año, id_categoria = :id_categoria,
+               link_imagen = :link_imagen, ejemplares = :ejemplares,
+               disponibles = disponibles + :ejemplares - ejemplares,
+               disponible = disponibles + :ejemplares - ejemplares > 0
+        WHERE id_libro = :id_libro AND ejemplares - disponibles <= :ejemplares
+        """,
+    "libro_eliminar": "DELETE FROM libros WHERE id_libro = ?",
+    "libro_prestamos": "SELECT COUNT(*), COALESCE(SUM(devuelto = 0), 0) FROM prestamos WHERE id_libro = ?",
+    "libro_existencias": "SELECT disponibles, ejemplares FROM libros WHERE id_libro = ?",
+    # La condición sobre disponibles evita prestar más ejemplares de los que hay desde dos puestos
+    "libro_prestar": """
+        UPDATE libros SET disponibles = disponibles - 1, disponible = disponibles > 1
+        WHERE id_libro = ? AND disponibles > 0
+        """,
+    "libro_liberar": """
+        UPDATE libros SET disponibles = disponibles + 1, disponible = 1
+        WHERE id_libro = ? AND disponibles < ejemplares
+        """,
+    "prestamo_insertar": "INSERT INTO prestamos (id_libro, id_usuario, fecha_prestamo, devuelto) VALUES (?, ?, ?, 0)",
+    "prestamo_abierto": "SELECT id_libro FROM prestamos WHERE id_prestamo = ? AND devuelto = 0",
+    "prestamo_estado": "SELECT id_libro, devuelto FROM prestamos WHERE id_prestamo = ?",
+    "prestamo_devolver": "UPDATE prestamos SET devuelto = 1 WHERE id_prestamo = ?",
+    "prestamo_eliminar": "DELETE FROM prestamos WHERE id_prestamo = ?",
+    "totales_reportes": """
+        SELECT (SELECT COALESCE(SUM(prestamos), 0) FROM stats_meses),
+               (SELECT COUNT(*) FROM prestamos WHERE devuelto = 0)
+        """,
+}
+
+
+def palabras_busqueda(texto):
+    # Las palabras de una sola letra coinciden con casi todo el catálogo y no filtran nada
+    return [palabra for palabra in re.findall(r'\w+', texto) if len(palabra) > 1]
+
+
+def consulta_fts(texto):
+    """Convierte lo que escribe el usuario en una consulta FTS5 de prefijos (todas las palabras)"""
+    return " ".join(f'"{palabra}"*' for palabra in palabras_busqueda(texto))
+
+
+def busqueda_corta(texto):
+    """True si todas las palabras son prefijos cortos, que se listan en el orden del índice y no por relevancia"""
+    return all(len(palabra) <= PREFIJO_INDEXADO for palabra in palabras_busqueda(texto))
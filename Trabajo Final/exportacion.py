@@ -0,0 +1,110 @@
+"""Exportación de libros, usuarios y préstamos a CSV o JSON Lines
+
+Uso: python exportacion.py {libros,usuarios,prestamos} archivo.csv|.jsonl [--db ruta] [--lote N]
+
+Las filas se leen con fetchmany y se escriben a medida que llegan, así que la memoria
+usada no depende del tamaño de la tabla.
+"""
+import argparse
+import csv
+import json
+import os
+
+import base_datos
+from consultas import CONSULTA_LIBROS, CONSULTA_PRESTAMOS, CONSULTA_USUARIOS
+
+TAMANO_LOTE = 2000
+
+# Se exporta en orden de id (rowid), que no requiere ordenar
+CONSULTAS = {
+    "libros": (CONSULTA_LIBROS + " ORDER BY l.id_libro", "SELECT COUNT(*) FROM libros"),
+    "usuarios": (CONSULTA_USUARIOS + " ORDER BY id_usuario", "SELECT COUNT(*) FROM usuarios"),
+    "prestamos": (CONSULTA_PRESTAMOS + " ORDER BY p.id_prestamo", "SELECT COUNT(*) FROM prestamos"),
+}
+
+FORMATOS = {".csv": "csv", ".jsonl": "jsonl"}
+
+
+def contar(pool, entidad):
+    return pool.consultar(CONSULTAS[entidad][1])[0][0]
+
+
+def leer_filas(conn, entidad, tamano_lote=TAMANO_LOTE):
+    """Genera primero los nombres de columna y después las filas, de a un lote por vez"""
+    cursor = conn.execute(CONSULTAS[entidad][0])
+    yield [columna[0] for columna in cursor.description]
+    while lote := cursor.fetchmany(tamano_lote):
+        yield from lote
+
+
+def con_progreso(filas, progreso, cada=TAMANO_LOTE):
+    """Deja pasar las filas y avisa cuántas van cada tantas"""
+    cantidad = 0
+    for fila in filas:
+        yield fila
+        cantidad += 1
+        if progreso and cantidad % cada == 0:
+            progreso(cantidad)
+    if progreso:
+        progreso(cantidad)
+
+
+def escribir_csv(archivo, columnas, filas):
+    escritor = csv.writer(archivo)
+    escritor.writerow(columnas)
+    escritor.writerows(filas)
+
+
+def escribir_jsonl(archivo, columnas, filas):
+    for fila in filas:
+        archivo.write(json.dumps(dict(zip(columnas, fila)), ensure_ascii=False))
+        archivo.write("\n")
+
+
+def formato_de(ruta):
+    extension = os.path.splitext(ruta)[1].lower()
+    if extension not in FORMATOS:
+        raise ValueError(f"Formato no soportado: {extension} (se acepta .csv o .jsonl)")
+    return FORMATOS[extension]
+
+
+def exportar(pool, entidad, ruta, tamano_lote=TAMANO_LOTE, progreso=None):
+    """Escribe la entidad completa en ruta (el formato sale de la extensión) y devuelve la cantidad de filas"""
+    formato = formato_de(ruta)
+    exportadas = 0
+
+    def contar_exportadas(cantidad):
+        nonlocal exportadas
+        exportadas = cantidad
+        if progreso:
+            progreso(cantidad)
+
+    with pool.lector() as conn, open(ruta, "w", encoding="utf-8", newline="") as archivo:
+        filas = leer_filas(conn, entidad, tamano_lote)
+        columnas = next(filas)
+        filas = con_progreso(filas, contar_exportadas, tamano_lote)
+        if formato == "csv":
+            escribir_csv(archivo, columnas, filas)
+        else:
+            escribir_jsonl(archivo, columnas, filas)
+    return exportadas
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Exporta libros, usuarios o préstamos a CSV/JSON Lines")
+    parser.add_argument("entidad", choices=sorted(CONSULTAS))
+    parser.add_argument("archivo")
+    parser.add_argument("--db", help="ruta de la base (por defecto BIBLIOTECA_DB o Libreria.db)")
+    parser.add_argument("--lote", type=int, default=TAMANO_LOTE, help="filas por fetchmany")
+    args = parser.parse_args()
+
+    pool = base_datos.PoolConexiones(args.db, lectores=1)
+    total = contar(pool, args.entidad)
+    cantidad = exportar(pool, args.entidad, args.archivo, args.lote,
+                        progreso=lambda n: print(f"\r{n}/{total} filas", end="", flush=True))
+    print(f"\n{cantidad} filas exportadas a {args.archivo}")
+    pool.cerrar()
+
+
+if __name__ == "__main__":
+    main()
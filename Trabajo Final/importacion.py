@@ -0,0 +1,198 @@
+"""Importación masiva de libros, usuarios y categorías desde CSV o JSON
+
+Uso: python importacion.py {libros,usuarios,categorias} archivo [--db ruta] [--lote N]
+
+Los CSV deben tener encabezado con los nombres de columna de la tabla. Los .jsonl se leen
+línea por línea; los .json (una lista de objetos) se cargan enteros, así que para archivos
+grandes conviene JSON Lines.
+"""
+import argparse
+import csv
+import json
+import os
+import time
+from itertools import islice
+
+import base_datos
+import migraciones
+import validaciones
+from consultas import SENTENCIAS
+
+TAMANO_LOTE = 5000
+
+# Sentencia del catálogo de consultas.py con la que se inserta cada entidad
+INSERTS = {
+    "categorias": SENTENCIAS["categoria_insertar"],
+    "usuarios": SENTENCIAS["usuario_insertar"],
+    "libros": SENTENCIAS["libro_insertar"],
+}
+
+
+class ResultadoImportacion:
+    def __init__(self):
+        self.insertados = 0
+        self.rechazados = []
+        self.segundos = 0.0
+
+    @property
+    def filas_por_segundo(self):
+        return self.insertados / self.segundos if self.segundos else 0.0
+
+    def resumen(self):
+        return (f"{self.insertados} filas importadas, {len(self.rechazados)} rechazadas "
+                f"en {self.segundos:.1f} s ({self.filas_por_segundo:.0f} filas/s)")
+
+
+def leer_registros(ruta):
+    """Genera (número de fila, dict) sin cargar el archivo completo, salvo los .json"""
+    extension = os.path.splitext(ruta)[1].lower()
+    with open(ruta, encoding="utf-8-sig", newline="") as archivo:
+        if extension == ".csv":
+            # La fila 1 es el encabezado
+            for numero, registro in enumerate(csv.DictReader(archivo), start=2):
+                yield numero, registro
+        elif extension == ".jsonl":
+            for numero, linea in enumerate(archivo, start=1):
+                if linea.strip():
+                    yield numero, json.loads(linea)
+        elif extension == ".json":
+            for numero, registro in enumerate(json.load(archivo), start=1):
+                yield numero, registro
+        else:
+            raise ValueError(f"Formato no soportado: {extension} (se acepta .csv, .json o .jsonl)")
+
+
+def en_lotes(iterable, tamano):
+    iterador = iter(iterable)
+    while lote := list(islice(iterador, tamano)):
+        yield lote
+
+
+def texto(registro, campo):
+    valor = registro.get(campo)
+    return str(valor).strip() if valor is not None else ""
+
+
+class Validador:
+    """Aplica las reglas de los formularios a cada registro, con los datos existentes precargados una sola vez"""
+    def __init__(self, pool, entidad):
+        self.entidad = entidad
+        if entidad == "categorias":
+            self.nombres = {fila[0].lower() for fila in pool.consultar("SELECT nombre_categoria FROM categorias")}
+        elif entidad == "usuarios":
+            self.dnis = {fila[0] for fila in pool.consultar("SELECT dni FROM usuarios")}
+        elif entidad == "libros":
+            filas = pool.consultar("SELECT id_categoria, nombre_categoria FROM categorias")
+            self.categorias_por_nombre = {nombre.lower(): id_categoria for id_categoria, nombre in filas}
+            self.ids_categoria = {id_categoria for id_categoria, _ in filas}
+        else:
+            raise ValueError(f"Entidad desconocida: {entidad}")
+
+    def __call__(self, registro):
+        """Devuelve los parámetros del INSERT o lanza ValueError con el motivo del rechazo"""
+        return getattr(self, f"validar_{self.entidad}")(registro)
+
+    def validar_categorias(self, registro):
+        nombre = texto(registro, "nombre_categoria") or texto(registro, "nombre")
+        if not nombre:
+            raise ValueError("El nombre de la categoría no puede estar vacío")
+        if nombre.lower() in self.nombres:
+            raise ValueError(f"La categoría {nombre} ya existe")
+        dias = validaciones.convertir_dias_prestamo(texto(registro, "dias_prestamo"))
+        self.nombres.add(nombre.lower())
+        return (nombre, dias)
+
+    def validar_usuarios(self, registro):
+        nombre, apellido, dni, email = (texto(registro, campo) for campo in ("nombre", "apellido", "dni", "email"))
+        if not all([nombre, apellido, dni, email]):
+            raise ValueError("Todos los campos son obligatorios")
+        if not validaciones.validar_email(email):
+            raise ValueError("El formato del email no es válido")
+        if dni in self.dnis:
+            raise ValueError("Ya existe un usuario con ese DNI")
+        self.dnis.add(dni)
+        return (nombre, apellido, dni, email)
+
+    def validar_libros(self, registro):
+        titulo, autor, año = texto(registro, "titulo"), texto(registro, "autor"), texto(registro, "año")
+        campos_vacios = [campo for campo, valor in (("Título", titulo), ("Autor", autor), ("Año", año)) if not valor]
+        id_categoria = self.resolver_categoria(registro)
+        if id_categoria is None:
+            campos_vacios.append("Categoría")
+        if campos_vacios:
+            raise ValueError(f"Los siguientes campos son obligatorios: {', '.join(campos_vacios)}")
+        año_int = validaciones.convertir_año(año)
+        ejemplares = validaciones.convertir_ejemplares(texto(registro, "ejemplares"))
+        # Todos los ejemplares entran libres: la columna disponible de archivos viejos se ignora,
+        # porque un ejemplar prestado sin su préstamo no se podría devolver nunca
+        return {"titulo": titulo, "autor": autor, "año": año_int, "id_categoria": id_categoria,
+                "link_imagen": texto(registro, "link_imagen"), "ejemplares": ejemplares}
+
+    def resolver_categoria(self, registro):
+        """Acepta la categoría por nombre (columna categoria) o por id (columna id_categoria)"""
+        nombre = texto(registro, "categoria") or texto(registro, "nombre_categoria")
+        id_categoria = texto(registro, "id_categoria")
+        if nombre:
+            if nombre.lower() not in self.categorias_por_nombre:
+                raise ValueError(f"La categoría {nombre} no existe")
+            return self.categorias_por_nombre[nombre.lower()]
+        if id_categoria:
+            if not id_categoria.isdigit() or int(id_categoria) not in self.ids_categoria:
+                raise ValueError(f"La categoría {id_categoria} no existe")
+            return int(id_categoria)
+        return None
+
+
+def importar(pool, entidad, ruta, tamano_lote=TAMANO_LOTE, progreso=None):
+    """Valida e inserta el archivo por lotes, un executemany y un commit por lote"""
+    resultado = ResultadoImportacion()
+    validar = Validador(pool, entidad)
+    inicio = time.perf_counter()
+    for lote in en_lotes(leer_registros(ruta), tamano_lote):
+        validos = []
+        for numero, registro in lote:
+            try:
+                validos.append(validar(registro))
+            except (ValueError, AttributeError) as e:
+                resultado.rechazados.append((numero, str(e)))
+        if validos:
+            with pool.escritor() as conn:
+                conn.execute("BEGIN IMMEDIATE")
+                try:
+                    conn.executemany(INSERTS[entidad], validos)
+                    conn.commit()
+                except BaseException:
+                    conn.rollback()
+                    raise
+            resultado.insertados += len(validos)
+        resultado.segundos = time.perf_counter() - inicio
+        if progreso:
+            progreso(resultado)
+    resultado.segundos = time.perf_counter() - inicio
+    return resultado
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Importa libros, usuarios o categorías desde CSV/JSON")
+    parser.add_argument("entidad", choices=sorted(INSERTS))
+    parser.add_argument("archivo")
+    parser.add_argument("--db", help="ruta de la base (por defecto BIBLIOTECA_DB o Libreria.db)")
+    parser.add_argument("--lote", type=int, default=TAMANO_LOTE, help="filas por transacción")
+    args = parser.parse_args()
+
+    pool = base_datos.PoolConexiones(args.db, lectores=1)
+    with pool.escritor() as conn:
+        migraciones.migrar(conn)
+    resultado = importar(pool, args.entidad, args.archivo, args.lote,
+                         progreso=lambda r: print(f"\r{r.insertados} filas...", end="", flush=True))
+    print()
+    for numero, motivo in resultado.rechazados[:20]:
+        print(f"Fila {numero}: {motivo}")
+    if len(resultado.rechazados) > 20:
+        print(f"... y {len(resultado.rechazados) - 20} rechazos más")
+    print(resultado.resumen())
+    pool.cerrar()
+
+
+if __name__ == "__main__":
+    main()
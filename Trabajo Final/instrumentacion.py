@@ -0,0 +1,115 @@
+"""Medición de las sentencias SQL que pasan por el pool de conexiones
+
+Por cada sentencia (el texto normalizado, sin los parámetros) se acumulan ejecuciones, tiempo
+total y máximo, filas y un histograma de tiempos. Las que superan BIBLIOTECA_LENTAS_MS (100 ms
+por defecto) se anotan con su EXPLAIN QUERY PLAN en el log de consultas lentas
+(BIBLIOTECA_LOG_LENTAS, por defecto consultas_lentas.log junto a la base).
+"""
+import os
+import threading
+import time
+from bisect import bisect_right
+from datetime import datetime
+
+UMBRAL_LENTAS_MS = 100
+# Límites superiores (ms) de cada balde del histograma; el último balde es "más de 1000 ms"
+BALDES_MS = (0.1, 0.5, 1, 5, 10, 50, 100, 500, 1000)
+ETIQUETAS_BALDES = [f"<{limite}" for limite in BALDES_MS] + [f">={BALDES_MS[-1]}"]
+# Sentencias a las que no tiene sentido pedirles el plan
+SIN_PLAN = ("BEGIN", "COMMIT", "ROLLBACK", "PRAGMA", "ANALYZE", "EXPLAIN")
+
+
+def normalizar(sql):
+    return " ".join(sql.split())
+
+
+class EstadisticaSentencia:
+    __slots__ = ("sql", "ejecuciones", "total_ms", "maximo_ms", "filas", "histograma")
+
+    def __init__(self, sql):
+        self.sql = sql
+        self.ejecuciones = 0
+        self.total_ms = 0.0
+        self.maximo_ms = 0.0
+        self.filas = 0
+        self.histograma = [0] * (len(BALDES_MS) + 1)
+
+    @property
+    def promedio_ms(self):
+        return self.total_ms / self.ejecuciones if self.ejecuciones else 0.0
+
+
+class Instrumentacion:
+    def __init__(self, ruta_log=None, umbral_ms=None):
+        if umbral_ms is None:
+            umbral_ms = float(os.environ.get("BIBLIOTECA_LENTAS_MS", UMBRAL_LENTAS_MS))
+        self.umbral_ms = umbral_ms
+        self.ruta_log = os.environ.get("BIBLIOTECA_LOG_LENTAS") or ruta_log
+        self.lock = threading.Lock()
+        self.sentencias = {}
+        self.lentas = 0
+
+    def registrar(self, conn, sql, params, ms, filas):
+        clave = normalizar(sql)
+        with self.lock:
+            estadistica = self.sentencias.get(clave)
+            if estadistica is None:
+                estadistica = self.sentencias[clave] = EstadisticaSentencia(clave)
+            estadistica.ejecuciones += 1
+            estadistica.total_ms += ms
+            estadistica.maximo_ms = max(estadistica.maximo_ms, ms)
+            estadistica.filas += max(filas, 0)
+            estadistica.histograma[bisect_right(BALDES_MS, ms)] += 1
+        if ms >= self.umbral_ms:
+            self.anotar_lenta(conn, clave, params, ms, filas)
+
+    def anotar_lenta(self, conn, sql, params, ms, filas):
+        plan = []
+        if not sql.upper().startswith(SIN_PLAN):
+            try:
+                plan = [fila[-1] for fila in conn.execute("EXPLAIN QUERY PLAN " + sql, params)]
+            except Exception as e:
+                plan = [f"(sin plan: {e})"]
+        with self.lock:
+            self.lentas += 1
+            if not self.ruta_log:
+                return
+            with open(self.ruta_log, "a", encoding="utf-8") as log:
+                log.write(f"{datetime.now().isoformat(timespec='seconds')} {ms:.1f} ms, {filas} filas: {sql}\n")
+                log.write(f"    parámetros: {params if isinstance(params, dict) else tuple(params)!r}\n")
+                for paso in plan:
+                    log.write(f"    plan: {paso}\n")
+
+    def medir(self, conn, sql, params, ejecutar):
+        """Corre ejecutar() y registra su duración; ejecutar devuelve (resultado, filas)"""
+        inicio = time.perf_counter()
+        resultado, filas = ejecutar()
+        self.registrar(conn, sql, params, (time.perf_counter() - inicio) * 1000, filas)
+        return resultado
+
+    def top(self, cantidad=20):
+        """Las sentencias con más tiempo total acumulado"""
+        with self.lock:
+            return sorted(self.sentencias.values(), key=lambda e: e.total_ms, reverse=True)[:cantidad]
+
+    def reiniciar(self):
+        with self.lock:
+            self.sentencias.clear()
+            self.lentas = 0
+
+
+class CursorMedido:
+    """Envuelve un cursor para medir cada execute dentro de una transacción"""
+    def __init__(self, cursor, instrumentacion):
+        self.cursor = cursor
+        self.instrumentacion = instrumentacion
+
+    def execute(self, sql, params=()):
+        def ejecutar():
+            self.cursor.execute(sql, params)
+            return self.cursor, self.cursor.rowcount
+        self.instrumentacion.medir(self.cursor.connection, sql, params, ejecutar)
+        return self
+
+    def __getattr__(self, nombre):
+        return getattr(self.cursor, nombre)
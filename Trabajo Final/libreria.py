@@ -1,10 +1,281 @@
 import flet as ft
+import asyncio
+import functools
+import os
 import sqlite3
+import threading
+import time
+from contextlib import contextmanager
 from datetime import datetime
-import re
+import atrasos
+import base_datos
+import exportacion
+import importacion
+import migraciones
+import portadas
+import referencias
+import repositorios
+import respaldos
+import sincronizacion
+import validaciones
+from consultas import PREFIJO_INDEXADO, REPORTES, SENTENCIAS, consulta_fts
+from instrumentacion import ETIQUETAS_BALDES
+
+TAMANOS_PAGINA = [25, 50, 100, 200, 500, 1000]
+
+# Tablas virtuales: filas de alto fijo y, además de las que entran en la vista, un margen
+# de filas arriba y abajo ya dibujadas para que el desplazamiento no muestre huecos
+FILAS_MARGEN = 10
+FILAS_VISIBLES_INICIALES = 15
+
+LIMITE_OPCIONES_LIBROS = 20
+
+# Segundos sin teclear antes de buscar: una palabra escrita de corrido hace una sola consulta
+ESPERA_BUSQUEDA = 0.25
+# Las búsquedas de prefijos cortos no se ordenan por relevancia (consultas.BUSQUEDA_LIBROS_CORTA)
+AYUDA_BUSQUEDA = f"Por relevancia desde {PREFIJO_INDEXADO + 1} letras; con menos, en orden de alta"
+
+LIMITE_REPORTES = 10
+
+# Título de cada tabla de la pestaña Reportes y nombre de la columna agrupada
+TITULOS_REPORTES = {
+    "categorias": ("Préstamos por categoría", "Categoría"),
+    "meses": ("Préstamos por mes", "Mes"),
+    "libros": ("Títulos más prestados", "Libro"),
+    "autores": ("Autores más prestados", "Autor"),
+    "usuarios": ("Usuarios más activos", "Usuario"),
+}
+
+# Datos que necesita cada pestaña (en el orden de las pestañas); se cargan al elegirla por primera vez
+DATOS_PESTANAS = [
+    ('libros', 'categorias'),
+    ('usuarios',),
+    ('categorias',),
+    ('prestamos', 'opciones_usuarios', 'opciones_libros'),
+    ('atrasados',),
+    ('reportes',),
+    ('diagnostico',),
+]
+
+# Con BIBLIOTECA_DEBUG se imprime cuánto tarda la primera pantalla
+DEBUG = bool(os.environ.get("BIBLIOTECA_DEBUG"))
+
+LIMITE_DIAGNOSTICO = 20
+LARGO_SQL_DIAGNOSTICO = 80
+
+
+def accion(metodo):
+    """Manejador de un evento: las actualizaciones que pida la página se envían juntas al terminar"""
+    @functools.wraps(metodo)
+    def envoltura(self, *args, **kwargs):
+        with self.agrupar_actualizaciones():
+            return metodo(self, *args, **kwargs)
+    return envoltura
+
+
+class Paginador:
+    """Estado de la paginación por clave (keyset) de una tabla"""
+    def __init__(self, tamano):
+        self.tamano = tamano
+        self.anteriores = []
+        self.clave_actual = None
+        self.clave_siguiente = None
+
+    @property
+    def numero(self):
+        return len(self.anteriores) + 1
+
+    def reiniciar(self):
+        self.anteriores = []
+        self.clave_actual = None
+        self.clave_siguiente = None
+
+    def recortar(self, filas, clave):
+        """Recibe hasta tamano + 1 filas, guarda la clave de la página siguiente y devuelve las visibles"""
+        hay_mas = len(filas) > self.tamano
+        filas = filas[:self.tamano]
+        self.clave_siguiente = clave(filas[-1]) if hay_mas else None
+        return filas
+
+    def avanzar(self):
+        if self.clave_siguiente is not None:
+            self.anteriores.append(self.clave_actual)
+            self.clave_actual = self.clave_siguiente
+
+    def retroceder(self):
+        if self.anteriores:
+            self.clave_actual = self.anteriores.pop()
+
+
+class TablaIncremental:
+    """Filas de un DataTable indexadas por clave primaria (registro.id), para parchear solo las que cambian"""
+    def __init__(self, tabla, crear_fila, clave_orden=None, descendente=False, paginador=None):
+        self.tabla = tabla
+        self.crear_fila = crear_fila
+        self.clave_orden = clave_orden
+        self.descendente = descendente
+        self.paginador = paginador
+        self.registros = []
+        self.filas = {}
+
+    def reconstruir(self, registros):
+        self.registros = registros
+        self.filas = {registro.id: self.crear_fila(registro) for registro in registros}
+        self.tabla.rows = [self.filas[registro.id] for registro in registros]
+
+    def _antes(self, a, b):
+        return a > b if self.descendente else a < b
+
+    def _en_pagina(self, clave):
+        """Indica si la clave cae dentro del rango de la página visible"""
+        if self.paginador is None:
+            return True
+        if self.paginador.clave_actual is not None and not self._antes(self.paginador.clave_actual, clave):
+            return False
+        if self.paginador.clave_siguiente is not None and self.registros:
+            return not self._antes(self.clave_orden(self.registros[-1]), clave)
+        return True
+
+    def contiene(self, registro_id):
+        return registro_id in self.filas
+
+    def _quitar_fila(self, registro_id):
+        self.tabla.rows.remove(self.filas.pop(registro_id))
+
+    def _insertar_fila(self, posicion, registro):
+        fila = self.crear_fila(registro)
+        self.filas[registro.id] = fila
+        self.tabla.rows.insert(posicion, fila)
+
+    def eliminar(self, registro_id):
+        if not self.contiene(registro_id):
+            return False
+        self._quitar_fila(registro_id)
+        self.registros[:] = [r for r in self.registros if r.id != registro_id]
+        return True
+
+    def actualizar(self, registro):
+        """Reemplaza, inserta o quita la fila del registro según su posición en el orden de la tabla"""
+        cambio = self.eliminar(registro.id)
+        if self.clave_orden is None:
+            posicion = len(self.registros)
+        else:
+            clave = self.clave_orden(registro)
+            if not self._en_pagina(clave):
+                return cambio
+            posicion = 0
+            while posicion < len(self.registros) and not self._antes(clave, self.clave_orden(self.registros[posicion])):
+                posicion += 1
+        self.registros.insert(posicion, registro)
+        self._insertar_fila(posicion, registro)
+        if self.paginador is not None and len(self.registros) > self.paginador.tamano:
+            sobrante = self.registros.pop()
+            self._quitar_fila(sobrante.id)
+            self.paginador.clave_siguiente = self.clave_orden(self.registros[-1])
+        return True
+
+
+class TablaVirtual(TablaIncremental):
+    """TablaIncremental dibujada en un ListView: solo existen los controles de las filas que entran
+    en la vista más FILAS_MARGEN arriba y abajo; el resto de la página es un espacio del mismo alto.
+    Las filas salen de crear_fila (un DataRow) y sus celdas se acomodan en columnas de ancho fijo."""
+    def __init__(self, columnas, crear_fila, alto_fila, **kwargs):
+        super().__init__(None, crear_fila, **kwargs)
+        self.anchos = [ancho for _, ancho in columnas]
+        self.alto_fila = alto_fila
+        self.visibles = FILAS_VISIBLES_INICIALES
+        self.desplazamiento = 0
+        self.inicio = self.fin = 0
+        self.lista = ft.ListView(expand=True, on_scroll=self.desplazar, on_scroll_interval=50)
+        encabezado = ft.Row(
+            [ft.Container(ft.Text(titulo, weight=ft.FontWeight.BOLD), width=ancho) for titulo, ancho in columnas],
+            spacing=0
+        )
+        self.control = ft.Column(
+            [ft.Container(encabezado, padding=ft.padding.symmetric(vertical=8)), ft.Divider(height=1), self.lista],
+            width=sum(self.anchos), spacing=0
+        )
+
+    def reconstruir(self, registros):
+        self.registros = registros
+        self.filas = {}
+        self.desplazamiento = 0
+        if self.lista.page:
+            self.lista.scroll_to(offset=0)
+        self.dibujar()
+
+    def contiene(self, registro_id):
+        return any(registro.id == registro_id for registro in self.registros)
+
+    def _quitar_fila(self, registro_id):
+        self.filas.pop(registro_id, None)
+
+    def _insertar_fila(self, posicion, registro):
+        pass
+
+    def eliminar(self, registro_id):
+        cambio = super().eliminar(registro_id)
+        if cambio:
+            self.dibujar()
+        return cambio
+
+    def actualizar(self, registro):
+        cambio = super().actualizar(registro)
+        if cambio:
+            self.dibujar()
+        return cambio
+
+    def ventana(self):
+        primera = int(self.desplazamiento // self.alto_fila)
+        return max(0, primera - FILAS_MARGEN), min(len(self.registros), primera + self.visibles + FILAS_MARGEN)
+
+    def crear_fila_virtual(self, registro):
+        fila = self.crear_fila(registro)
+        return ft.Container(
+            ft.Row([ft.Container(celda.content, width=ancho) for celda, ancho in zip(fila.cells, self.anchos)],
+                   spacing=0),
+            height=self.alto_fila,
+            border=ft.border.only(bottom=ft.border.BorderSide(1, ft.Colors.GREY_300))
+        )
+
+    def dibujar(self):
+        """Arma la ventana actual; las filas que salen de ella se descartan con sus controles"""
+        self.inicio, self.fin = self.ventana()
+        visibles = self.registros[self.inicio:self.fin]
+        filas = {}
+        for registro in visibles:
+            filas[registro.id] = self.filas.get(registro.id) or self.crear_fila_virtual(registro)
+        self.filas = filas
+        self.lista.controls = (
+            [ft.Container(height=self.inicio * self.alto_fila)]
+            + [filas[registro.id] for registro in visibles]
+            + [ft.Container(height=(len(self.registros) - self.fin) * self.alto_fila)]
+        )
+
+    def desplazar(self, e):
+        self.desplazamiento = e.pixels
+        if e.viewport_dimension:
+            self.visibles = int(e.viewport_dimension // self.alto_fila) + 1
+        primera = int(e.pixels // self.alto_fila)
+        # Se vuelve a dibujar recién cuando queda menos de medio margen dibujado de algún lado
+        arriba = self.inicio > 0 and primera - self.inicio < FILAS_MARGEN // 2
+        abajo = self.fin < len(self.registros) and self.fin - (primera + self.visibles) < FILAS_MARGEN // 2
+        if (arriba or abajo) and self.lista.page:
+            self.dibujar()
+            self.lista.update()
+
 
 class BibliotecaApp:
-    def __init__(self, page: ft.Page):
+    def __init__(self, page: ft.Page, tamano_pagina=50, ruta_db=None, perfil_db=None):
+        self.inicio = time.perf_counter()
+        self.tiempo_primera_pantalla_ms = None
+        # Con agrupar en False cada actualizar() se envía enseguida (para comparar en el benchmark)
+        self.agrupar = True
+        self.lotes = threading.local()
+        # Búsqueda pendiente de cada campo (threading.Timer), hasta que se deje de escribir
+        self.demoras = {}
+        self.actualizaciones_pedidas = 0
+        self.actualizaciones_enviadas = 0
         self.page = page
         self.page.title = "Sistema de Gestión de Biblioteca"
         self.page.window_width = 1200
@@ -15,113 +286,242 @@ class BibliotecaApp:
         self.usuarios = []
         self.libros = []
         self.prestamos = []
+        self.atrasados = []
+        
+        self.paginadores = {
+            'libros': Paginador(tamano_pagina),
+            'usuarios': Paginador(tamano_pagina),
+            'prestamos': Paginador(tamano_pagina),
+            'atrasados': Paginador(tamano_pagina),
+        }
+        self.controles_paginacion = {}
+        self.tablas = {}
+        # Datos ya pedidos (nombres de DATOS_PESTANAS); lo demás se carga al abrir su pestaña
+        self.cargadas = set()
+        self.busqueda_libros = ""
+        # (desde, hasta) en AAAA-MM-DD, o None para ver todos los préstamos
+        self.rango_prestamos = None
         
         self.editando_libro = None
         self.editando_usuario = None
         self.editando_categoria = None
         self.editando_prestamo = None
         
+        # Una sola caché (hilos de descarga y límite en disco) para todas las sesiones del proceso
+        self.portadas = portadas.obtener_cache()
+        self.portadas.suscribir(self.portada_lista)
+        
+        self.ruta_db = ruta_db or base_datos.ruta_base_datos()
+        self.perfil_db = perfil_db
         self.setup_database()
         self.setup_ui()
         
+        # Los cambios hechos en otras sesiones (u otros procesos) llegan por el bus
+        self.bus = sincronizacion.obtener_bus(self.ruta_db)
+        self.bus.suscribir(self.aplicar_cambios)
+        # Respaldos en caliente cada BIBLIOTECA_RESPALDO_HORAS, en un hilo compartido por las sesiones
+        self.respaldos = respaldos.obtener_programador(self.ruta_db)
+        # on_close llega recién cuando la sesión expira; un cliente web que se desconecta deja de
+        # recibir avisos enseguida y, si vuelve, recarga lo que pudo haber cambiado mientras tanto
+        self.page.on_disconnect = self.desconectar
+        self.page.on_connect = self.reconectar
+        self.page.on_close = self.cerrar_sesion
+        
     def setup_database(self):
-        self.conn = sqlite3.connect('Libreria.db', check_same_thread=False)
-        self.cursor = self.conn.cursor()
+        self.pool = base_datos.PoolConexiones(self.ruta_db, self.perfil_db)
+        with self.pool.escritor() as conn:
+            migraciones.migrar(conn)
+        self.repos = {
+            'categorias': repositorios.RepositorioCategorias(self.pool),
+            'usuarios': repositorios.RepositorioUsuarios(self.pool),
+            'libros': repositorios.RepositorioLibros(self.pool),
+            'prestamos': repositorios.RepositorioPrestamos(self.pool),
+        }
+        self.referencias = referencias.Referencias(self.repos)
+        # Versión del mapa de referencias con la que se armó cada dropdown
+        self.versiones_opciones = {}
+    
+    def buscar_libros(self, texto, limite):
+        """Busca libros por prefijos de título o autor, ordenados por relevancia"""
+        return self.obtener_registros(self.repos['libros'].buscar, texto, limite)
         
     def ejecutar_query(self, query, params=None):
+        """Ejecuta una sentencia con commit; devuelve el cursor (para lastrowid) o None si falla"""
         try:
-            if params:
-                self.cursor.execute(query, params)
-            else:
-                self.cursor.execute(query)
-            self.conn.commit()
-            return True
+            return self.pool.ejecutar(query, params or ())
         except sqlite3.Error as e:
             self.mostrar_mensaje(f"Error en base de datos: {str(e)}", es_error=True)
-            return False
+            return None
     
     def obtener_datos(self, query, params=None):
         try:
-            if params:
-                self.cursor.execute(query, params)
-            else:
-                self.cursor.execute(query)
-            return self.cursor.fetchall()
+            return self.pool.consultar(query, params or ())
         except sqlite3.Error as e:
             self.mostrar_mensaje(f"Error al obtener datos: {str(e)}", es_error=True)
             return []
     
-    def mostrar_mensaje(self, mensaje, es_error=False):
-        snackbar = ft.SnackBar(
-            content=ft.Text(mensaje),
-            bgcolor=ft.Colors.RED_400 if es_error else ft.Colors.GREEN_400
-        )
-        self.page.snack_bar = snackbar
-        self.page.overlay.append(self.page.snack_bar)
-        self.page.snack_bar.open = True
+    def obtener_registros(self, consulta, *args):
+        """Llama a un método de repositorio; ante un error de base muestra el mensaje y devuelve []"""
+        try:
+            return consulta(*args)
+        except sqlite3.Error as e:
+            self.mostrar_mensaje(f"Error al obtener datos: {str(e)}", es_error=True)
+            return []
+    
+    def obtener_registro(self, entidad, registro_id):
+        """Un modelo por clave primaria, o None si no existe (o si falla la consulta)"""
+        try:
+            return self.repos[entidad].por_id(registro_id)
+        except sqlite3.Error as e:
+            self.mostrar_mensaje(f"Error al obtener datos: {str(e)}", es_error=True)
+            return None
+    
+    @contextmanager
+    def agrupar_actualizaciones(self):
+        """Mientras dure, actualizar() solo anota que hay cambios; al salir del lote más externo se
+        envía una sola actualización. Cada hilo (eventos de la página, bus, portadas) tiene su lote."""
+        lote = self.lotes
+        lote.profundidad = getattr(lote, 'profundidad', 0) + 1
+        try:
+            yield
+        finally:
+            lote.profundidad -= 1
+            if lote.profundidad == 0 and getattr(lote, 'pendiente', False):
+                lote.pendiente = False
+                self.enviar_actualizacion()
+    
+    def actualizar(self):
+        self.actualizaciones_pedidas += 1
+        if self.agrupar and getattr(self.lotes, 'profundidad', 0):
+            self.lotes.pendiente = True
+        else:
+            self.enviar_actualizacion()
+    
+    def enviar_actualizacion(self):
+        self.actualizaciones_enviadas += 1
         self.page.update()
     
+    def enviar_pendientes(self):
+        """Envía ya lo que el lote tiene anotado, para mostrar un aviso antes de un trabajo largo"""
+        if getattr(self.lotes, 'pendiente', False):
+            self.lotes.pendiente = False
+            self.enviar_actualizacion()
+    
+    def mostrar_mensaje(self, mensaje, es_error=False):
+        """Reutiliza la única SnackBar de la página, agregada al overlay en setup_ui"""
+        self.notificacion.content.value = mensaje
+        self.notificacion.bgcolor = ft.Colors.RED_400 if es_error else ft.Colors.GREEN_400
+        self.notificacion.open = True
+        self.actualizar()
+    
     def validar_email(self, email):
-        patron = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
-        return re.match(patron, email) is not None
+        return validaciones.validar_email(email)
     
     def validar_dni_unico(self, dni, id_usuario=None):
-        query = "SELECT COUNT(*) FROM usuarios WHERE dni = ?"
-        params = [dni]
-        
-        if id_usuario:
-            query += " AND id_usuario != ?"
-            params.append(id_usuario)
-            
-        result = self.obtener_datos(query, params)
-        return result[0][0] == 0
+        try:
+            existente = self.referencias.buscar('usuarios', dni)
+        except sqlite3.Error as e:
+            self.mostrar_mensaje(f"Error en base de datos: {str(e)}", es_error=True)
+            return False
+        return existente is None or existente == id_usuario
     
     
     def cargar_categorias(self):
         """Carga las categorías desde la base de datos"""
-        query = "SELECT id_categoria, nombre_categoria FROM categorias ORDER BY nombre_categoria"
-        self.categorias = self.obtener_datos(query)
+        self.mostrar_categorias(self.consultar_categorias())
+    
+    def consultar_categorias(self):
+        return self.obtener_registros(self.repos['categorias'].todas)
+    
+    def mostrar_categorias(self, categorias):
+        self.categorias = categorias
+        self.referencias.cargar('categorias', categorias)
         self.actualizar_tabla_categorias()
         self.actualizar_dropdown_categorias()
     
-    def actualizar_tabla_categorias(self):
-        """Actualiza la tabla de categorías"""
-        rows = []
-        for categoria in self.categorias:
-            rows.append(
-                ft.DataRow(
-                    cells=[
-                        ft.DataCell(ft.Text(str(categoria[0]))),
-                        ft.DataCell(ft.Text(categoria[1])),
-                        ft.DataCell(
-                            ft.Row([
-                                ft.IconButton(
-                                    icon=ft.Icons.EDIT,
-                                    tooltip="Editar",
-                                    on_click=lambda e, cat=categoria: self.editar_categoria(cat)
-                                ),
-                                ft.IconButton(
-                                    icon=ft.Icons.DELETE,
-                                    tooltip="Eliminar",
-                                    on_click=lambda e, cat=categoria: self.eliminar_categoria(cat[0])
-                                )
-                            ])
+    def crear_fila_categoria(self, categoria):
+        return ft.DataRow(
+            cells=[
+                ft.DataCell(ft.Text(str(categoria.id_categoria))),
+                ft.DataCell(ft.Text(categoria.nombre_categoria)),
+                ft.DataCell(ft.Text(str(categoria.dias_prestamo))),
+                ft.DataCell(
+                    ft.Row([
+                        ft.IconButton(
+                            icon=ft.Icons.EDIT,
+                            tooltip="Editar",
+                            on_click=lambda e, cat=categoria: self.editar_categoria(cat)
+                        ),
+                        ft.IconButton(
+                            icon=ft.Icons.DELETE,
+                            tooltip="Eliminar",
+                            on_click=lambda e, cat=categoria: self.eliminar_categoria(cat.id_categoria)
                         )
-                    ]
+                    ])
                 )
-            )
-        
-        self.tabla_categorias.rows = rows
-        self.page.update()
+            ]
+        )
+    
+    def actualizar_tabla_categorias(self):
+        """Actualiza la tabla de categorías"""
+        self.tablas['categorias'].reconstruir(self.categorias)
+        self.actualizar()
+    
+    def parchar_opcion(self, dropdown, clave, texto=None, agregar=True):
+        """Reemplaza, agrega o (sin texto) quita una sola opción de un dropdown"""
+        clave = str(clave)
+        opciones = [op for op in dropdown.options if op.key != clave]
+        if texto is not None:
+            for i, op in enumerate(dropdown.options):
+                if op.key == clave:
+                    opciones.insert(i, ft.dropdown.Option(key=clave, text=texto))
+                    break
+            else:
+                if agregar:
+                    opciones.append(ft.dropdown.Option(key=clave, text=texto))
+        dropdown.options = opciones
+    
+    def parchar_referencia(self, entidad, dropdown, clave, registro=None):
+        """Parchea el mapa de referencias y la opción del dropdown; si el dropdown estaba al día con el
+        mapa, lo sigue estando sin reconstruirlo"""
+        al_dia = self.versiones_opciones.get(entidad) == self.referencias.version(entidad)
+        self.referencias.actualizar(entidad, clave, registro)
+        self.parchar_opcion(dropdown, clave, registro and self.referencias.ENTIDADES[entidad][1](registro))
+        if al_dia:
+            self.versiones_opciones[entidad] = self.referencias.version(entidad)
+    
+    def opciones_referencia(self, entidad, dropdown):
+        """Reconstruye las opciones desde el mapa en memoria, solo si cambió desde la última vez"""
+        version = self.referencias.version(entidad)
+        if self.versiones_opciones.get(entidad) == version and self.referencias.mapas[entidad].vigente:
+            return False
+        textos = self.referencias.textos(entidad)
+        dropdown.options = [ft.dropdown.Option(key=str(clave), text=texto) for clave, texto in textos.items()]
+        self.versiones_opciones[entidad] = self.referencias.version(entidad)
+        return True
+    
+    def refrescar_categoria(self, id_categoria, actualizar_pagina=True):
+        """Parchea la fila y la opción de una categoría después de un alta, edición o baja"""
+        categoria = self.obtener_registro('categorias', id_categoria)
+        if categoria:
+            self.tablas['categorias'].actualizar(categoria)
+            self.parchar_referencia('categorias', self.categoria_dropdown, id_categoria, categoria)
+            # Los libros visibles muestran el nombre de la categoría
+            for libro in list(self.libros):
+                if libro.id_categoria == id_categoria:
+                    self.refrescar_libro(libro.id_libro, actualizar_pagina=False)
+        else:
+            self.tablas['categorias'].eliminar(id_categoria)
+            self.parchar_referencia('categorias', self.categoria_dropdown, id_categoria)
+        if actualizar_pagina:
+            self.actualizar()
     
     def actualizar_dropdown_categorias(self):
         """Actualiza el dropdown de categorías en el formulario de libros"""
-        if hasattr(self, 'categoria_dropdown'):
-            self.categoria_dropdown.options = [
-                ft.dropdown.Option(key=str(cat[0]), text=cat[1]) for cat in self.categorias
-            ]
-            self.page.update()
+        if hasattr(self, 'categoria_dropdown') and self.opciones_referencia('categorias', self.categoria_dropdown):
+            self.actualizar()
     
+    @accion
     def agregar_categoria(self, e):
         """Agrega una nueva categoría"""
         nombre = self.categoria_nombre_field.value.strip()
@@ -129,97 +529,138 @@ class BibliotecaApp:
         if not nombre:
             self.mostrar_mensaje("El nombre de la categoría no puede estar vacío", es_error=True)
             return
+        try:
+            dias = validaciones.convertir_dias_prestamo(self.categoria_dias_field.value)
+        except ValueError as e:
+            self.mostrar_mensaje(str(e), es_error=True)
+            return
+        existente = self.referencias.buscar('categorias', nombre.lower())
+        if existente is not None and not (self.editando_categoria and existente == self.editando_categoria.id_categoria):
+            self.mostrar_mensaje("Ya existe una categoría con ese nombre", es_error=True)
+            return
         
         if self.editando_categoria:
-            query = "UPDATE categorias SET nombre_categoria = ? WHERE id_categoria = ?"
-            params = (nombre, self.editando_categoria[0])
+            query = SENTENCIAS["categoria_actualizar"]
+            params = (nombre, dias, self.editando_categoria.id_categoria)
             mensaje = "Categoría actualizada exitosamente"
         else:
-            query = "INSERT INTO categorias (nombre_categoria) VALUES (?)"
-            params = (nombre,)
+            query = SENTENCIAS["categoria_insertar"]
+            params = (nombre, dias)
             mensaje = "Categoría agregada exitosamente"
         
-        if self.ejecutar_query(query, params):
+        cursor = self.ejecutar_query(query, params)
+        if cursor:
+            id_categoria = self.editando_categoria.id_categoria if self.editando_categoria else cursor.lastrowid
             self.mostrar_mensaje(mensaje)
             self.limpiar_formulario_categoria()
-            self.cargar_categorias()
+            self.refrescar_categoria(id_categoria)
     
+    @accion
     def editar_categoria(self, categoria):
         self.editando_categoria = categoria
-        self.categoria_nombre_field.value = categoria[1]
+        self.categoria_nombre_field.value = categoria.nombre_categoria
+        self.categoria_dias_field.value = str(categoria.dias_prestamo)
         self.categoria_btn.text = "Actualizar Categoría"
-        self.page.update()
+        self.actualizar()
     
+    @accion
     def eliminar_categoria(self, id_categoria):
 
-        query = "SELECT COUNT(*) FROM libros WHERE id_categoria = ?"
-        result = self.obtener_datos(query, (id_categoria,))
+        result = self.obtener_datos(SENTENCIAS["categoria_libros"], (id_categoria,))
         
         if result[0][0] > 0:
             self.mostrar_mensaje("No se puede eliminar la categoría porque tiene libros asociados", es_error=True)
             return
         
-        query = "DELETE FROM categorias WHERE id_categoria = ?"
-        if self.ejecutar_query(query, (id_categoria,)):
+        if self.ejecutar_query(SENTENCIAS["categoria_eliminar"], (id_categoria,)):
             self.mostrar_mensaje("Categoría eliminada exitosamente")
-            self.cargar_categorias()
+            self.refrescar_categoria(id_categoria)
     
+    @accion
     def limpiar_formulario_categoria(self):
         """Limpia el formulario de categorías"""
         self.categoria_nombre_field.value = ""
+        self.categoria_dias_field.value = str(validaciones.DIAS_PRESTAMO_POR_DEFECTO)
         self.categoria_btn.text = "Agregar Categoría"
         self.editando_categoria = None
-        self.page.update()
+        self.actualizar()
     
     
     def cargar_usuarios(self):
-        query = "SELECT id_usuario, nombre, apellido, dni, email FROM usuarios ORDER BY apellido, nombre"
-        self.usuarios = self.obtener_datos(query)
+        self.mostrar_usuarios(self.consultar_usuarios())
+    
+    def consultar_usuarios(self):
+        pag = self.paginadores['usuarios']
+        filas = self.obtener_registros(self.repos['usuarios'].pagina, pag.clave_actual, pag.tamano)
+        if not filas and pag.anteriores:
+            pag.retroceder()
+            return self.consultar_usuarios()
+        return pag.recortar(filas, self.tablas['usuarios'].clave_orden)
+    
+    def mostrar_usuarios(self, usuarios):
+        self.usuarios = usuarios
+        self.actualizar_controles_paginacion('usuarios')
         self.actualizar_tabla_usuarios()
-        self.actualizar_dropdown_usuarios()
     
-    def actualizar_tabla_usuarios(self):
-
-        rows = []
-        for usuario in self.usuarios:
-            rows.append(
-                ft.DataRow(
-                    cells=[
-                        ft.DataCell(ft.Text(str(usuario[0]))),
-                        ft.DataCell(ft.Text(usuario[1])),
-                        ft.DataCell(ft.Text(usuario[2])),
-                        ft.DataCell(ft.Text(usuario[3])),
-                        ft.DataCell(ft.Text(usuario[4])),
-                        ft.DataCell(
-                            ft.Row([
-                                ft.IconButton(
-                                    icon=ft.Icons.EDIT,
-                                    tooltip="Editar",
-                                    on_click=lambda e, user=usuario: self.editar_usuario(user)
-                                ),
-                                ft.IconButton(
-                                    icon=ft.Icons.DELETE,
-                                    tooltip="Eliminar",
-                                    on_click=lambda e, user=usuario: self.eliminar_usuario(user[0])
-                                )
-                            ])
+    def crear_fila_usuario(self, usuario):
+        return ft.DataRow(
+            cells=[
+                ft.DataCell(ft.Text(str(usuario.id_usuario))),
+                ft.DataCell(ft.Text(usuario.nombre)),
+                ft.DataCell(ft.Text(usuario.apellido)),
+                ft.DataCell(ft.Text(usuario.dni)),
+                ft.DataCell(ft.Text(usuario.email)),
+                ft.DataCell(
+                    ft.Row([
+                        ft.IconButton(
+                            icon=ft.Icons.EDIT,
+                            tooltip="Editar",
+                            on_click=lambda e, user=usuario: self.editar_usuario(user)
+                        ),
+                        ft.IconButton(
+                            icon=ft.Icons.DELETE,
+                            tooltip="Eliminar",
+                            on_click=lambda e, user=usuario: self.eliminar_usuario(user.id_usuario)
                         )
-                    ]
+                    ])
                 )
-            )
-        
-        self.tabla_usuarios.rows = rows
-        self.page.update()
+            ]
+        )
+    
+    def actualizar_tabla_usuarios(self):
+        self.tablas['usuarios'].reconstruir(self.usuarios)
+        self.actualizar()
+    
+    def refrescar_usuario(self, id_usuario, actualizar_pagina=True):
+        """Parchea la fila y la opción de un usuario después de un alta, edición o baja"""
+        user = self.obtener_registro('usuarios', id_usuario)
+        if user:
+            self.tablas['usuarios'].actualizar(user)
+            self.parchar_referencia('usuarios', self.usuario_dropdown, id_usuario, user)
+        else:
+            self.tablas['usuarios'].eliminar(id_usuario)
+            self.parchar_referencia('usuarios', self.usuario_dropdown, id_usuario)
+        # Los préstamos visibles muestran el nombre del usuario
+        for prestamo in list(self.prestamos):
+            if prestamo.id_usuario == id_usuario:
+                self.refrescar_prestamo(prestamo.id_prestamo, actualizar_pagina=False)
+        if actualizar_pagina:
+            self.actualizar()
     
     def actualizar_dropdown_usuarios(self):
 
         if hasattr(self, 'usuario_dropdown'):
-            self.usuario_dropdown.options = [
-                ft.dropdown.Option(key=str(user[0]), text=f"{user[1]} {user[2]} - {user[3]}") 
-                for user in self.usuarios
-            ]
-            self.page.update()
+            # La tabla solo tiene la página visible, el dropdown necesita a todos los usuarios:
+            # salen del mapa en memoria, que lee la tabla solo la primera vez o tras invalidarse
+            try:
+                if not self.opciones_referencia('usuarios', self.usuario_dropdown):
+                    return
+            except sqlite3.Error as e:
+                self.mostrar_mensaje(f"Error en base de datos: {str(e)}", es_error=True)
+                return
+            self.actualizar()
     
+    @accion
     def agregar_usuario(self, e):
         nombre = self.usuario_nombre_field.value.strip()
         apellido = self.usuario_apellido_field.value.strip()
@@ -234,46 +675,53 @@ class BibliotecaApp:
             self.mostrar_mensaje("El formato del email no es válido", es_error=True)
             return
         
-        if not self.validar_dni_unico(dni, self.editando_usuario[0] if self.editando_usuario else None):
+        if not self.validar_dni_unico(dni, self.editando_usuario.id_usuario if self.editando_usuario else None):
             self.mostrar_mensaje("Ya existe un usuario con ese DNI", es_error=True)
             return
         
         if self.editando_usuario:
-            query = "UPDATE usuarios SET nombre = ?, apellido = ?, dni = ?, email = ? WHERE id_usuario = ?"
-            params = (nombre, apellido, dni, email, self.editando_usuario[0])
+            query = SENTENCIAS["usuario_actualizar"]
+            params = (nombre, apellido, dni, email, self.editando_usuario.id_usuario)
             mensaje = "Usuario actualizado exitosamente"
         else:
-            query = "INSERT INTO usuarios (nombre, apellido, dni, email) VALUES (?, ?, ?, ?)"
+            query = SENTENCIAS["usuario_insertar"]
             params = (nombre, apellido, dni, email)
             mensaje = "Usuario agregado exitosamente"
         
-        if self.ejecutar_query(query, params):
+        cursor = self.ejecutar_query(query, params)
+        if cursor:
+            id_usuario = self.editando_usuario.id_usuario if self.editando_usuario else cursor.lastrowid
             self.mostrar_mensaje(mensaje)
             self.limpiar_formulario_usuario()
-            self.cargar_usuarios()
+            self.refrescar_usuario(id_usuario)
     
+    @accion
     def editar_usuario(self, usuario):
         self.editando_usuario = usuario
-        self.usuario_nombre_field.value = usuario[1]
-        self.usuario_apellido_field.value = usuario[2]
-        self.usuario_dni_field.value = usuario[3]
-        self.usuario_email_field.value = usuario[4]
+        self.usuario_nombre_field.value = usuario.nombre
+        self.usuario_apellido_field.value = usuario.apellido
+        self.usuario_dni_field.value = usuario.dni
+        self.usuario_email_field.value = usuario.email
         self.usuario_btn.text = "Actualizar Usuario"
-        self.page.update()
+        self.actualizar()
     
+    @accion
     def eliminar_usuario(self, id_usuario):
-        query = "SELECT COUNT(*) FROM prestamos WHERE id_usuario = ? AND devuelto = 0"
-        result = self.obtener_datos(query, (id_usuario,))
+        result = self.obtener_datos(SENTENCIAS["usuario_prestamos"], (id_usuario,))
         
-        if result[0][0] > 0:
+        if result[0][1] > 0:
             self.mostrar_mensaje("No se puede eliminar el usuario porque tiene préstamos pendientes", es_error=True)
             return
         
-        query = "DELETE FROM usuarios WHERE id_usuario = ?"
-        if self.ejecutar_query(query, (id_usuario,)):
+        if result[0][0] > 0:
+            self.mostrar_mensaje("No se puede eliminar el usuario porque tiene préstamos en el historial", es_error=True)
+            return
+        
+        if self.ejecutar_query(SENTENCIAS["usuario_eliminar"], (id_usuario,)):
             self.mostrar_mensaje("Usuario eliminado exitosamente")
-            self.cargar_usuarios()
+            self.refrescar_usuario(id_usuario)
     
+    @accion
     def limpiar_formulario_usuario(self):
         self.usuario_nombre_field.value = ""
         self.usuario_apellido_field.value = ""
@@ -281,114 +729,170 @@ class BibliotecaApp:
         self.usuario_email_field.value = ""
         self.usuario_btn.text = "Agregar Usuario"
         self.editando_usuario = None
-        self.page.update()
+        self.actualizar()
     
     
     def cargar_libros(self):
-        query = """
-        SELECT l.id_libro, l.titulo, l.autor, l.año, l.id_categoria, c.nombre_categoria, 
-               l.disponible, l.link_imagen
-        FROM libros l
-        LEFT JOIN categorias c ON l.id_categoria = c.id_categoria
-        ORDER BY l.titulo
-        """
-        self.libros = self.obtener_datos(query)
+        self.mostrar_libros(self.consultar_libros())
+    
+    def consultar_libros(self):
+        pag = self.paginadores['libros']
+        if self.busqueda_libros:
+            # Los resultados de búsqueda van por relevancia, en una sola página
+            pag.reiniciar()
+            return self.buscar_libros(self.busqueda_libros, pag.tamano)
+        filas = self.obtener_registros(self.repos['libros'].pagina, pag.clave_actual, pag.tamano)
+        if not filas and pag.anteriores:
+            pag.retroceder()
+            return self.consultar_libros()
+        return pag.recortar(filas, self.tablas['libros'].clave_orden)
+    
+    def mostrar_libros(self, libros):
+        self.libros = libros
+        self.actualizar_controles_paginacion('libros')
         self.actualizar_tabla_libros()
-        self.actualizar_dropdown_libros()
     
     def mostrar_imagen_modal(self, link_imagen):
         print(f"Mostrando imagen: {link_imagen}")
-        if not link_imagen:
+        if not portadas.url_permitida(link_imagen):
             self.mostrar_mensaje("No hay imagen disponible", es_error=True)
             print("No hay imagen disponible")
             return
-        def cerrar_dialogo(e):
-            self.dialog.open = False
-            self.page.update()
-        dlg = ft.AlertDialog(
-            modal=True,
-            content=ft.Container(
-                content=ft.Image(src=link_imagen, width=500, height=700, fit=ft.ImageFit.CONTAIN),
-                padding=20,
-                alignment=ft.alignment.center
-            ),
-            actions=[ft.TextButton("Cerrar", on_click=cerrar_dialogo)]
-        )
-        self.dialog = dlg
-        self.page.overlay.append(self.dialog)
-        self.dialog.open = True
-        self.page.update()
+        # Si la versión grande todavía no está en caché se muestra la original mientras se genera
+        self.imagen_dialogo.src = self.portadas.obtener(link_imagen, "grande") or link_imagen
+        self.dialogo_imagen.open = True
+        self.actualizar()
     
-    def actualizar_tabla_libros(self):
-        rows = []
-        for libro in self.libros:
-            disponible_text = "Sí" if libro[6] else "No"
-            # Imagen en miniatura (80x80), click para modal
-            def crear_click_imagen(link_imagen):
-                def mostrar_modal(e):
-                    self.mostrar_imagen_modal(link_imagen)
-                return mostrar_modal
-            img_widget = ft.Container(
-                content=ft.Image(
-                    src=libro[7] if libro[7] else "",
-                    width=80,
-                    height=80,
-                    fit=ft.ImageFit.CONTAIN,
-                    border_radius=ft.border_radius.all(8),
-                    tooltip="Ver imagen"
-                ),
-                on_click=crear_click_imagen(libro[7]),
-                ink=True,
-                bgcolor=ft.Colors.BROWN_100,
+    @accion
+    def cerrar_imagen_modal(self, e):
+        self.dialogo_imagen.open = False
+        self.actualizar()
+    
+    def crear_fila_libro(self, libro):
+        disponible_text = f"{libro.disponibles} de {libro.ejemplares}"
+        # Imagen en miniatura (80x80), click para modal
+        def crear_click_imagen(link_imagen):
+            def mostrar_modal(e):
+                self.mostrar_imagen_modal(link_imagen)
+            return mostrar_modal
+        # Miniatura desde la caché local; mientras se descarga se muestra un ícono
+        miniatura = self.portadas.obtener(libro.link_imagen)
+        if miniatura:
+            contenido_img = ft.Image(
+                src=miniatura,
+                width=80,
+                height=80,
+                fit=ft.ImageFit.CONTAIN,
                 border_radius=ft.border_radius.all(8),
-                padding=2
+                tooltip="Ver imagen"
+            )
+        else:
+            contenido_img = ft.Container(
+                content=ft.Icon(ft.Icons.MENU_BOOK, color=ft.Colors.BROWN_400, size=40),
+                width=80,
+                height=80,
+                alignment=ft.alignment.center,
+                tooltip="Ver imagen"
             )
-            rows.append(
-                ft.DataRow(
-                    cells=[
-                        ft.DataCell(ft.Text(str(libro[0]))),
-                        ft.DataCell(ft.Text(libro[1])),
-                        ft.DataCell(ft.Text(libro[2])),
-                        ft.DataCell(ft.Text(str(libro[3]))),
-                        ft.DataCell(ft.Text(libro[5] if libro[5] else "Sin categoría")),
-                        ft.DataCell(ft.Text(disponible_text)),
-                        ft.DataCell(img_widget),
-                        ft.DataCell(
-                            ft.Row([
-                                ft.IconButton(
-                                    icon=ft.Icons.EDIT,
-                                    tooltip="Editar",
-                                    on_click=lambda e, lib=libro: self.editar_libro(lib)
-                                ),
-                                ft.IconButton(
-                                    icon=ft.Icons.DELETE,
-                                    tooltip="Eliminar",
-                                    on_click=lambda e, lib=libro: self.eliminar_libro(lib[0])
-                                )
-                            ])
+        img_widget = ft.Container(
+            content=contenido_img,
+            on_click=crear_click_imagen(libro.link_imagen),
+            ink=True,
+            bgcolor=ft.Colors.BROWN_100,
+            border_radius=ft.border_radius.all(8),
+            padding=2
+        )
+        return ft.DataRow(
+            cells=[
+                ft.DataCell(ft.Text(str(libro.id_libro))),
+                ft.DataCell(ft.Text(libro.titulo)),
+                ft.DataCell(ft.Text(libro.autor)),
+                ft.DataCell(ft.Text(str(libro.año))),
+                ft.DataCell(ft.Text(libro.nombre_categoria if libro.nombre_categoria else "Sin categoría")),
+                ft.DataCell(ft.Text(disponible_text)),
+                ft.DataCell(img_widget),
+                ft.DataCell(
+                    ft.Row([
+                        ft.IconButton(
+                            icon=ft.Icons.EDIT,
+                            tooltip="Editar",
+                            on_click=lambda e, lib=libro: self.editar_libro(lib)
+                        ),
+                        ft.IconButton(
+                            icon=ft.Icons.DELETE,
+                            tooltip="Eliminar",
+                            on_click=lambda e, lib=libro: self.eliminar_libro(lib.id_libro)
                         )
-                    ]
+                    ])
                 )
-            )
-        self.tabla_libros.rows = rows
-        self.page.update()
+            ]
+        )
+    
+    @accion
+    def portada_lista(self, link_imagen):
+        """Llamado desde la caché cuando termina una descarga: cambia el ícono por la miniatura en las filas visibles"""
+        for libro in list(self.libros):
+            if libro.link_imagen == link_imagen:
+                self.tablas['libros'].actualizar(libro)
+        self.actualizar()
+    
+    def actualizar_tabla_libros(self):
+        self.tablas['libros'].reconstruir(self.libros)
+        self.actualizar()
     
-    def actualizar_dropdown_libros(self):
+    def refrescar_libro(self, id_libro, actualizar_pagina=True):
+        """Parchea la fila y la opción de un libro después de un alta, edición, baja o préstamo"""
+        libro = self.obtener_registro('libros', id_libro)
+        if libro:
+            if not self.busqueda_libros or self.tablas['libros'].contiene(id_libro):
+                self.tablas['libros'].actualizar(libro)
+            # Sin ejemplares libres el título sale del selector de préstamos
+            texto = self.texto_opcion_libro(libro) if libro.disponibles > 0 else None
+            self.parchar_opcion(self.libro_dropdown, id_libro, texto, agregar=False)
+        else:
+            self.tablas['libros'].eliminar(id_libro)
+            self.parchar_opcion(self.libro_dropdown, id_libro)
+        if actualizar_pagina:
+            self.actualizar()
+    
+    def texto_opcion_libro(self, libro):
+        return f"{libro.descripcion} ({libro.disponibles} de {libro.ejemplares} disponibles)"
+    
+    def actualizar_dropdown_libros(self, texto=""):
 
         if hasattr(self, 'libro_dropdown'):
-            libros_disponibles = [libro for libro in self.libros]  # Solo disponibles
+            # Solo se cargan las opciones que coinciden con la búsqueda, nunca el catálogo entero
+            # y de esas, solo los títulos con algún ejemplar libre (índice idx_libros_prestables)
+            libros_disponibles = self.obtener_registros(
+                self.repos['libros'].prestables, texto, LIMITE_OPCIONES_LIBROS
+            )
             self.libro_dropdown.options = [
-                ft.dropdown.Option(key=str(libro[0]), text=f"{libro[1]} - {libro[2]}") 
+                ft.dropdown.Option(key=str(libro.id_libro), text=self.texto_opcion_libro(libro))
                 for libro in libros_disponibles
             ]
-            self.page.update()
+            self.actualizar()
+    
+    def demorar(self, nombre, funcion, *args):
+        """Corre funcion(*args) cuando pasan ESPERA_BUSQUEDA segundos sin otra llamada con el mismo nombre"""
+        pendiente = self.demoras.get(nombre)
+        if pendiente:
+            pendiente.cancel()
+        self.demoras[nombre] = threading.Timer(ESPERA_BUSQUEDA, funcion, args)
+        self.demoras[nombre].daemon = True
+        self.demoras[nombre].start()
+    
+    @accion
+    def buscar_en_tabla_libros(self, texto):
+        self.busqueda_libros = texto.strip() if consulta_fts(texto) else ""
+        self.paginadores['libros'].reiniciar()
+        self.cargar_libros()
     
+    @accion
     def agregar_libro(self, e):
         titulo = self.libro_titulo_field.value.strip()
         autor = self.libro_autor_field.value.strip()
         año = self.libro_año_field.value.strip()
         categoria_id = self.categoria_dropdown.value
-        disponible = self.libro_disponible_checkbox.value
         link_imagen = self.libro_imagen_field.value.strip()
         
         # Validación de campos vacíos
@@ -406,188 +910,632 @@ class BibliotecaApp:
             self.mostrar_mensaje(f"Los siguientes campos son obligatorios: {', '.join(campos_vacios)}", es_error=True)
             return
         
-        # Validación del año
+        # Validación del año y de los ejemplares
         try:
-            año_int = int(año)
-            if año_int <= 0 or año_int > 10000:
-                self.mostrar_mensaje("El año debe ser un número entre 1 y 10000", es_error=True)
-                return
-        except ValueError:
-            self.mostrar_mensaje("El año debe ser un número válido", es_error=True)
+            año_int = validaciones.convertir_año(año)
+            ejemplares = validaciones.convertir_ejemplares(self.libro_ejemplares_field.value)
+        except ValueError as e:
+            self.mostrar_mensaje(str(e), es_error=True)
             return
         
+        params = {"titulo": titulo, "autor": autor, "año": año_int, "id_categoria": categoria_id,
+                  "link_imagen": link_imagen, "ejemplares": ejemplares}
         if self.editando_libro:
-            query = """UPDATE libros SET titulo = ?, autor = ?, año = ?, id_categoria = ?, 
-                      disponible = ?, link_imagen = ? WHERE id_libro = ?"""
-            params = (titulo, autor, año_int, categoria_id, disponible, link_imagen, self.editando_libro[0])
+            query = SENTENCIAS["libro_actualizar"]
+            params["id_libro"] = self.editando_libro.id_libro
             mensaje = "Libro actualizado exitosamente"
         else:
-            query = """INSERT INTO libros (titulo, autor, año, id_categoria, disponible, link_imagen) 
-                      VALUES (?, ?, ?, ?, ?, ?)"""
-            params = (titulo, autor, año_int, categoria_id, disponible, link_imagen)
+            query = SENTENCIAS["libro_insertar"]
             mensaje = "Libro agregado exitosamente"
         
-        if self.ejecutar_query(query, params):
+        cursor = self.ejecutar_query(query, params)
+        if cursor and self.editando_libro and cursor.rowcount == 0:
+            self.mostrar_mensaje("No puede haber menos ejemplares que los que están prestados", es_error=True)
+            return
+        if cursor:
+            id_libro = self.editando_libro.id_libro if self.editando_libro else cursor.lastrowid
             self.mostrar_mensaje(mensaje)
             self.limpiar_formulario_libro()
-            self.cargar_libros()
+            # Los préstamos visibles muestran el título y autor del libro
+            for prestamo in list(self.prestamos):
+                if prestamo.id_libro == id_libro:
+                    self.refrescar_prestamo(prestamo.id_prestamo, actualizar_pagina=False)
+            self.refrescar_libro(id_libro)
     
+    @accion
     def editar_libro(self, libro):
         self.editando_libro = libro
-        self.libro_titulo_field.value = libro[1]
-        self.libro_autor_field.value = libro[2]
-        self.libro_año_field.value = str(libro[3])
-        self.categoria_dropdown.value = str(libro[4]) if libro[4] else None
-        self.libro_disponible_checkbox.value = libro[6]
-        self.libro_imagen_field.value = libro[7] if libro[7] else ""
+        self.libro_titulo_field.value = libro.titulo
+        self.libro_autor_field.value = libro.autor
+        self.libro_año_field.value = str(libro.año)
+        self.categoria_dropdown.value = str(libro.id_categoria) if libro.id_categoria else None
+        self.libro_ejemplares_field.value = str(libro.ejemplares)
+        self.libro_imagen_field.value = libro.link_imagen if libro.link_imagen else ""
         self.libro_btn.text = "Actualizar Libro"
-        self.page.update()
+        self.actualizar()
     
+    @accion
     def eliminar_libro(self, id_libro):
 
-        query = "SELECT COUNT(*) FROM prestamos WHERE id_libro = ? AND devuelto = 0"
-        result = self.obtener_datos(query, (id_libro,))
+        result = self.obtener_datos(SENTENCIAS["libro_prestamos"], (id_libro,))
         
-        if result[0][0] > 0:
+        if result[0][1] > 0:
             self.mostrar_mensaje("No se puede eliminar el libro porque tiene préstamos pendientes", es_error=True)
             return
         
-        query = "DELETE FROM libros WHERE id_libro = ?"
-        if self.ejecutar_query(query, (id_libro,)):
+        if result[0][0] > 0:
+            self.mostrar_mensaje("No se puede eliminar el libro porque tiene préstamos en el historial", es_error=True)
+            return
+        
+        if self.ejecutar_query(SENTENCIAS["libro_eliminar"], (id_libro,)):
             self.mostrar_mensaje("Libro eliminado exitosamente")
-            self.cargar_libros()
+            self.refrescar_libro(id_libro)
     
+    @accion
     def limpiar_formulario_libro(self):
         self.libro_titulo_field.value = ""
         self.libro_autor_field.value = ""
         self.libro_año_field.value = ""
         self.categoria_dropdown.key = "Select"
         self.categoria_dropdown.value = ""
-        self.libro_disponible_checkbox.value = True
+        self.libro_ejemplares_field.value = "1"
         self.libro_imagen_field.value = ""
         self.libro_btn.text = "Agregar Libro"
         self.editando_libro = None
-        self.page.update()
+        self.actualizar()
     
     
     def cargar_prestamos(self):
-        query = """
-        SELECT p.id_prestamo, p.id_libro, l.titulo, l.autor, p.id_usuario, 
-               u.nombre || ' ' || u.apellido as usuario, p.fecha_prestamo, p.devuelto
-        FROM prestamos p
-        JOIN libros l ON p.id_libro = l.id_libro
-        JOIN usuarios u ON p.id_usuario = u.id_usuario
-        ORDER BY p.fecha_prestamo DESC
-        """
-        self.prestamos = self.obtener_datos(query)
+        self.mostrar_prestamos(self.consultar_prestamos())
+    
+    def consultar_prestamos(self):
+        pag = self.paginadores['prestamos']
+        filas = self.obtener_registros(self.repos['prestamos'].pagina, pag.clave_actual, pag.tamano, self.rango_prestamos)
+        if not filas and pag.anteriores:
+            pag.retroceder()
+            return self.consultar_prestamos()
+        return pag.recortar(filas, self.tablas['prestamos'].clave_orden)
+    
+    def mostrar_prestamos(self, prestamos):
+        self.prestamos = prestamos
+        self.actualizar_controles_paginacion('prestamos')
         self.actualizar_tabla_prestamos()
     
-    def actualizar_tabla_prestamos(self):
-        rows = []
-        for prestamo in self.prestamos:
-            estado_text = "Devuelto" if prestamo[7] else "Pendiente"
-            rows.append(
-                ft.DataRow(
-                    cells=[
-                        ft.DataCell(ft.Text(str(prestamo[0]))),
-                        ft.DataCell(ft.Text(f"{prestamo[2]} - {prestamo[3]}")),
-                        ft.DataCell(ft.Text(prestamo[5])),
-                        ft.DataCell(ft.Text(prestamo[6])),
-                        ft.DataCell(ft.Text(estado_text)),
-                        ft.DataCell(
-                            ft.Row([
-                                ft.IconButton(
-                                    icon=ft.Icons.ASSIGNMENT_RETURN,
-                                    tooltip="Devolver",
-                                    on_click=lambda e, prest=prestamo: self.devolver_libro(prest[0]),
-                                    disabled=prestamo[7]  
-                                ),
-                                ft.IconButton(
-                                    icon=ft.Icons.DELETE,
-                                    tooltip="Eliminar",
-                                    on_click=lambda e: self.eliminar_prestamo(prestamo[0])
-                                )
-                            ])
+    def crear_fila_prestamo(self, prestamo):
+        estado_text = "Devuelto" if prestamo.devuelto else "Pendiente"
+        return ft.DataRow(
+            cells=[
+                ft.DataCell(ft.Text(str(prestamo.id_prestamo))),
+                ft.DataCell(ft.Text(prestamo.libro)),
+                ft.DataCell(ft.Text(prestamo.usuario)),
+                ft.DataCell(ft.Text(prestamo.fecha_prestamo)),
+                ft.DataCell(self.crear_texto_vencimiento(prestamo)),
+                ft.DataCell(ft.Text(estado_text)),
+                ft.DataCell(
+                    ft.Row([
+                        ft.IconButton(
+                            icon=ft.Icons.ASSIGNMENT_RETURN,
+                            tooltip="Devolver",
+                            on_click=lambda e, prest=prestamo: self.devolver_libro(prest.id_prestamo),
+                            disabled=prestamo.devuelto
+                        ),
+                        ft.IconButton(
+                            icon=ft.Icons.DELETE,
+                            tooltip="Eliminar",
+                            on_click=lambda e, prest=prestamo: self.eliminar_prestamo(prest.id_prestamo)
                         )
-                    ]
+                    ])
                 )
-            )
-        
-        self.tabla_prestamos.rows = rows
-        self.page.update()
+            ]
+        )
     
+    def esta_atrasado(self, prestamo):
+        return not prestamo.devuelto and atrasos.dias_atraso(prestamo.fecha_vencimiento) > 0
+    
+    def crear_texto_vencimiento(self, prestamo):
+        """Fecha de vencimiento, en rojo si el préstamo sigue abierto y ya venció"""
+        if not prestamo.fecha_vencimiento:
+            return ft.Text("")
+        atrasado = self.esta_atrasado(prestamo)
+        return ft.Text(prestamo.fecha_vencimiento, color=ft.Colors.RED_700 if atrasado else None,
+                       weight=ft.FontWeight.BOLD if atrasado else None)
+    
+    def actualizar_tabla_prestamos(self):
+        self.tablas['prestamos'].reconstruir(self.prestamos)
+        self.actualizar()
+    
+    def refrescar_prestamo(self, id_prestamo, actualizar_pagina=True):
+        """Parchea la fila de un préstamo después de un alta, devolución o baja"""
+        prestamo = self.obtener_registro('prestamos', id_prestamo)
+        if prestamo and self.en_rango_prestamos(prestamo.fecha_prestamo):
+            self.tablas['prestamos'].actualizar(prestamo)
+        else:
+            self.tablas['prestamos'].eliminar(id_prestamo)
+        if prestamo and self.esta_atrasado(prestamo):
+            self.tablas['atrasados'].actualizar(prestamo)
+        else:
+            self.tablas['atrasados'].eliminar(id_prestamo)
+        if actualizar_pagina:
+            self.actualizar()
+    
+    @accion
     def agregar_prestamo(self, e):
 
         libro_id = self.libro_dropdown.value
         usuario_id = self.usuario_dropdown.value
-        fecha = self.fecha_prestamo_field.value.strip()
         if not libro_id or not usuario_id:
             self.mostrar_mensaje("Debe seleccionar un libro y un usuario", es_error=True)
             return
+        try:
+            fecha = validaciones.convertir_fecha(self.fecha_prestamo_field.value)
+        except ValueError as e:
+            self.mostrar_mensaje(str(e), es_error=True)
+            return
         
+        try:
+            id_prestamo = self.repos['prestamos'].registrar(libro_id, usuario_id, fecha)
+        except ValueError as e:
+            self.mostrar_mensaje(str(e), es_error=True)
+            return
+        except sqlite3.Error as e:
+            self.mostrar_mensaje(f"Error en base de datos: {str(e)}", es_error=True)
+            return
         
-
-        query = "INSERT INTO prestamos (id_libro, id_usuario, fecha_prestamo, devuelto) VALUES (?, ?, ?, 0)"
-        params = (libro_id, usuario_id, fecha)
-        
-
-        query_libro = "UPDATE libros SET disponible = 0 WHERE id_libro = ?"
-        
-        if self.ejecutar_query(query, params) and self.ejecutar_query(query_libro, (libro_id,)):
-            self.mostrar_mensaje("Préstamo registrado exitosamente")
-            self.limpiar_formulario_prestamo()
-            self.cargar_prestamos()
-            self.cargar_libros()  
+        self.mostrar_mensaje("Préstamo registrado exitosamente")
+        self.limpiar_formulario_prestamo()
+        self.refrescar_prestamo(id_prestamo, actualizar_pagina=False)
+        self.refrescar_libro(int(libro_id))
     
+    @accion
     def devolver_libro(self, id_prestamo):
-        query = "SELECT id_libro FROM prestamos WHERE id_prestamo = ?"
-        result = self.obtener_datos(query, (id_prestamo,))
-        
-        if not result:
-            self.mostrar_mensaje("Préstamo no encontrado", es_error=True)
+        try:
+            id_libro = self.repos['prestamos'].devolver(id_prestamo)
+        except ValueError as e:
+            self.mostrar_mensaje(str(e), es_error=True)
+            return
+        except sqlite3.Error as e:
+            self.mostrar_mensaje(f"Error en base de datos: {str(e)}", es_error=True)
             return
         
-        id_libro = result[0][0]
-
-        query_prestamo = "UPDATE prestamos SET devuelto = 1 WHERE id_prestamo = ?"
-
-        query_libro = "UPDATE libros SET disponible = 1 WHERE id_libro = ?"
-        
-        if self.ejecutar_query(query_prestamo, (id_prestamo,)) and self.ejecutar_query(query_libro, (id_libro,)):
-            self.mostrar_mensaje("Libro devuelto exitosamente")
-            self.cargar_prestamos()
-            self.cargar_libros() 
+        self.mostrar_mensaje("Libro devuelto exitosamente")
+        self.refrescar_prestamo(id_prestamo, actualizar_pagina=False)
+        self.refrescar_libro(id_libro)
     
+    @accion
     def eliminar_prestamo(self, id_prestamo):
-        query = "SELECT id_libro, devuelto FROM prestamos WHERE id_prestamo = ?"
-        result = self.obtener_datos(query, (id_prestamo,))
-        if not result:
-            self.mostrar_mensaje("Préstamo no encontrado", es_error=True)
+        try:
+            id_libro = self.repos['prestamos'].eliminar(id_prestamo)
+        except ValueError as e:
+            self.mostrar_mensaje(str(e), es_error=True)
+            return
+        except sqlite3.Error as e:
+            self.mostrar_mensaje(f"Error en base de datos: {str(e)}", es_error=True)
             return
         
-        id_libro, devuelto = result[0]
-        
-        if not devuelto:
-            query_libro = "UPDATE libros SET disponible = 1 WHERE id_libro = ?"
-            self.ejecutar_query(query_libro, (id_libro,))
-        
-
-        query = "DELETE FROM prestamos WHERE id_prestamo = ?"
-        if self.ejecutar_query(query, (id_prestamo,)):
-            self.mostrar_mensaje("Préstamo eliminado exitosamente")
-            
-            self.cargar_prestamos()
-            self.cargar_libros() 
+        self.mostrar_mensaje("Préstamo eliminado exitosamente")
+        self.refrescar_prestamo(id_prestamo, actualizar_pagina=False)
+        self.refrescar_libro(id_libro)
+    
+    @accion
+    def buscar_libro_prestamo(self, texto):
+        self.actualizar_dropdown_libros(texto)
     
+    @accion
     def limpiar_formulario_prestamo(self):
+        if self.libro_busqueda_prestamo_field.value:
+            self.libro_busqueda_prestamo_field.value = ""
+            self.actualizar_dropdown_libros()
         self.libro_dropdown.key = "Select"
         self.usuario_dropdown.key = "Select"
         self.libro_dropdown.value = ""
         self.usuario_dropdown.value = ""
-        self.fecha_prestamo_field.value = datetime.now().strftime("%Y-%m-%d")
-        self.page.update()
+        self.fecha_prestamo_field.value = datetime.now().strftime(validaciones.FORMATO_FECHA)
+        self.actualizar()
+    
+    def en_rango_prestamos(self, fecha):
+        return not self.rango_prestamos or self.rango_prestamos[0] <= fecha <= self.rango_prestamos[1]
+    
+    @accion
+    def filtrar_prestamos(self, e=None):
+        """Limita la tabla a los préstamos entre las fechas Desde y Hasta (cualquiera puede quedar vacía)"""
+        try:
+            desde = validaciones.convertir_fecha(self.filtro_desde_field.value) if self.filtro_desde_field.value.strip() else "0000-01-01"
+            hasta = validaciones.convertir_fecha(self.filtro_hasta_field.value) if self.filtro_hasta_field.value.strip() else "9999-12-31"
+        except ValueError as e:
+            self.mostrar_mensaje(str(e), es_error=True)
+            return
+        if desde > hasta:
+            self.mostrar_mensaje("La fecha Desde no puede ser posterior a Hasta", es_error=True)
+            return
+        self.rango_prestamos = None if (desde, hasta) == ("0000-01-01", "9999-12-31") else (desde, hasta)
+        self.paginadores['prestamos'].reiniciar()
+        self.cargar_prestamos()
+    
+    @accion
+    def quitar_filtro_prestamos(self, e=None):
+        self.filtro_desde_field.value = ""
+        self.filtro_hasta_field.value = ""
+        self.filtrar_prestamos()
+    
+    def cargar_atrasados(self):
+        self.mostrar_atrasados(self.consultar_atrasados())
+    
+    def consultar_atrasados(self):
+        """Préstamos abiertos vencidos, del más antiguo al más reciente, sobre idx_prestamos_vencimiento"""
+        pag = self.paginadores['atrasados']
+        hoy = datetime.now().strftime(validaciones.FORMATO_FECHA)
+        filas = self.obtener_registros(self.repos['prestamos'].atrasados, hoy, pag.clave_actual, pag.tamano)
+        if not filas and pag.anteriores:
+            pag.retroceder()
+            return self.consultar_atrasados()
+        return pag.recortar(filas, self.tablas['atrasados'].clave_orden)
+    
+    def mostrar_atrasados(self, atrasados):
+        self.atrasados = atrasados
+        self.actualizar_controles_paginacion('atrasados')
+        self.tablas['atrasados'].reconstruir(self.atrasados)
+        self.actualizar()
+    
+    def crear_fila_atrasado(self, prestamo):
+        return ft.DataRow(
+            cells=[
+                ft.DataCell(ft.Text(str(prestamo.id_prestamo))),
+                ft.DataCell(ft.Text(prestamo.libro)),
+                ft.DataCell(ft.Text(prestamo.usuario)),
+                ft.DataCell(ft.Text(prestamo.fecha_prestamo)),
+                ft.DataCell(ft.Text(prestamo.fecha_vencimiento)),
+                ft.DataCell(ft.Text(str(atrasos.dias_atraso(prestamo.fecha_vencimiento)), color=ft.Colors.RED_700)),
+                ft.DataCell(
+                    ft.IconButton(
+                        icon=ft.Icons.ASSIGNMENT_RETURN,
+                        tooltip="Devolver",
+                        on_click=lambda e, prest=prestamo: self.devolver_libro(prest.id_prestamo)
+                    )
+                )
+            ]
+        )
+    
+    def cargar_reportes(self):
+        self.mostrar_reportes(self.consultar_reportes())
+    
+    def consultar_reportes(self):
+        """Lee las tablas de estadísticas: unas pocas filas cada una, sin importar el tamaño del historial"""
+        reportes = {nombre: self.obtener_datos(query, (LIMITE_REPORTES,)) for nombre, query in REPORTES.items()}
+        reportes['totales'] = self.obtener_datos(SENTENCIAS["totales_reportes"])
+        return reportes
+    
+    def mostrar_reportes(self, reportes):
+        for nombre, tabla in self.tablas_reportes.items():
+            tabla.rows = [
+                ft.DataRow(cells=[ft.DataCell(ft.Text(str(fila[0]))), ft.DataCell(ft.Text(str(fila[1])))])
+                for fila in reportes[nombre]
+            ]
+        if reportes['totales']:
+            total, abiertos = reportes['totales'][0]
+            self.texto_totales_reportes.value = f"Préstamos registrados: {total}  |  Pendientes de devolución: {abiertos}"
+        self.actualizar()
+    
+    def cargar_diagnostico(self):
+        """Las sentencias con más tiempo acumulado desde que se abrió la aplicación (o el último reinicio)"""
+        instrumentacion = self.pool.instrumentacion
+        self.tabla_diagnostico.rows = [
+            ft.DataRow(cells=[
+                ft.DataCell(ft.Text(estadistica.sql[:LARGO_SQL_DIAGNOSTICO], tooltip=estadistica.sql)),
+                ft.DataCell(ft.Text(str(estadistica.ejecuciones))),
+                ft.DataCell(ft.Text(f"{estadistica.total_ms:.1f}")),
+                ft.DataCell(ft.Text(f"{estadistica.promedio_ms:.2f}")),
+                ft.DataCell(ft.Text(f"{estadistica.maximo_ms:.1f}")),
+                ft.DataCell(ft.Text(str(estadistica.filas))),
+                ft.DataCell(ft.Text(" ".join(
+                    f"{etiqueta}:{cantidad}"
+                    for etiqueta, cantidad in zip(ETIQUETAS_BALDES, estadistica.histograma) if cantidad
+                ))),
+            ])
+            for estadistica in instrumentacion.top(LIMITE_DIAGNOSTICO)
+        ]
+        self.texto_diagnostico.value = (
+            f"Consultas lentas (>= {instrumentacion.umbral_ms:g} ms): {instrumentacion.lentas}"
+            + (f"  |  Log: {instrumentacion.ruta_log}" if instrumentacion.ruta_log else "")
+        )
+        self.texto_respaldo.value = self.texto_ultimo_respaldo()
+        self.actualizar()
+    
+    def texto_ultimo_respaldo(self):
+        if self.respaldos.ultimo:
+            return f"Último respaldo: {self.respaldos.ultimo.resumen()}"
+        existentes = respaldos.listar(self.ruta_db, self.respaldos.directorio)
+        if existentes:
+            return f"Último respaldo: {os.path.basename(existentes[0])}"
+        return "Todavía no hay respaldos"
+    
+    @accion
+    def respaldar_ahora(self, e):
+        """Pide un respaldo al hilo de respaldos; la interfaz sigue respondiendo mientras copia"""
+        self.texto_respaldo.value = "Respaldando..."
+        self.boton_respaldo.disabled = True
+        self.actualizar()
+        self.respaldos.respaldar_ahora(self.respaldo_terminado)
+    
+    @accion
+    def respaldo_terminado(self, resultado, error):
+        self.boton_respaldo.disabled = False
+        self.texto_respaldo.value = self.texto_ultimo_respaldo()
+        if error:
+            self.mostrar_mensaje(f"No se pudo respaldar la base: {str(error)}", es_error=True)
+        else:
+            self.mostrar_mensaje(f"Respaldo guardado en {resultado.ruta}")
+    
+    @accion
+    def reiniciar_diagnostico(self, e):
+        self.pool.instrumentacion.reiniciar()
+        self.cargar_diagnostico()
+    
+    @accion
+    def aplicar_cambios(self, cambios):
+        """Recibe del bus {entidad: {id: id_cambio}} y parchea solo esas filas; con None recarga la tabla entera.
+        Los cambios que escribió esta misma sesión ya se aplicaron al escribirlos y se saltean."""
+        refrescar = {
+            'categorias': self.refrescar_categoria,
+            'usuarios': self.refrescar_usuario,
+            'libros': self.refrescar_libro,
+            'prestamos': self.refrescar_prestamo,
+        }
+        recargar_reportes = False
+        for entidad, ids in cambios.items():
+            if ids is None:
+                recargar_reportes |= entidad == 'prestamos'
+                # Lo que todavía no se cargó se leerá al día cuando se abra su pestaña
+                if entidad in self.referencias.ENTIDADES:
+                    self.referencias.invalidar(entidad)
+                if entidad in self.cargadas:
+                    self.cargar_tabla(entidad)
+                if entidad == 'usuarios' and 'opciones_usuarios' in self.cargadas:
+                    self.actualizar_dropdown_usuarios()
+                elif entidad == 'libros' and 'opciones_libros' in self.cargadas:
+                    self.actualizar_dropdown_libros(self.libro_busqueda_prestamo_field.value or "")
+                elif entidad == 'prestamos' and 'atrasados' in self.cargadas:
+                    self.cargar_atrasados()
+                continue
+            for registro_id, id_cambio in ids.items():
+                if not self.pool.cambio_propio(id_cambio):
+                    refrescar[entidad](registro_id, actualizar_pagina=False)
+                    recargar_reportes |= entidad == 'prestamos'
+        if recargar_reportes and 'reportes' in self.cargadas:
+            self.cargar_reportes()
+        self.actualizar()
+    
+    def desconectar(self, e=None):
+        self.bus.desuscribir(self.aplicar_cambios)
+        self.portadas.desuscribir(self.portada_lista)
+    
+    def reconectar(self, e=None):
+        # Se desuscribe primero para no quedar anotada dos veces si no hubo desconexión previa
+        self.desconectar()
+        self.bus.suscribir(self.aplicar_cambios)
+        self.portadas.suscribir(self.portada_lista)
+        self.aplicar_cambios(dict.fromkeys(sincronizacion.ENTIDADES))
+    
+    def cerrar_sesion(self, e=None):
+        self.desconectar()
+        for pendiente in self.demoras.values():
+            pendiente.cancel()
+        self.pool.cerrar()
+    
+    @accion
+    def cargar_tabla(self, nombre):
+        self.cargadas.add(nombre)
+        {'categorias': self.cargar_categorias,
+         'libros': self.cargar_libros,
+         'usuarios': self.cargar_usuarios,
+         'prestamos': self.cargar_prestamos,
+         'atrasados': self.cargar_atrasados,
+         'reportes': self.cargar_reportes,
+         'diagnostico': self.cargar_diagnostico}[nombre]()
+    
+    async def cargar_tabla_async(self, nombre):
+        """Consulta en un hilo del pool y, cuando están los datos, actualiza la tabla en la página"""
+        self.cargadas.add(nombre)
+        sin_tabla = {
+            'opciones_usuarios': self.actualizar_dropdown_usuarios,
+            'opciones_libros': self.actualizar_dropdown_libros,
+            'diagnostico': self.cargar_diagnostico,
+        }
+        if nombre in sin_tabla:
+            await asyncio.to_thread(sin_tabla[nombre])
+            return
+        consultar, mostrar = {
+            'categorias': (self.consultar_categorias, self.mostrar_categorias),
+            'libros': (self.consultar_libros, self.mostrar_libros),
+            'usuarios': (self.consultar_usuarios, self.mostrar_usuarios),
+            'prestamos': (self.consultar_prestamos, self.mostrar_prestamos),
+            'atrasados': (self.consultar_atrasados, self.mostrar_atrasados),
+            'reportes': (self.consultar_reportes, self.mostrar_reportes),
+        }[nombre]
+        filas = await asyncio.to_thread(consultar)
+        with self.agrupar_actualizaciones():
+            mostrar(filas)
+    
+    async def cargar_pestana_async(self, indice):
+        """Carga, en paralelo y fuera del event loop, los datos de la pestaña que todavía no se pidieron"""
+        pendientes = [nombre for nombre in DATOS_PESTANAS[indice] if nombre not in self.cargadas]
+        self.cargadas.update(pendientes)
+        await asyncio.gather(*(self.cargar_tabla_async(nombre) for nombre in pendientes))
+    
+    def cambiar_pestana(self, e):
+        self.page.run_task(self.cargar_pestana_async, self.tabs.selected_index)
+    
+    async def iniciar_async(self):
+        """Primera pantalla: solo los datos de la pestaña visible"""
+        await self.cargar_pestana_async(self.tabs.selected_index)
+        self.tiempo_primera_pantalla_ms = (time.perf_counter() - self.inicio) * 1000
+        if DEBUG:
+            print(f"Primera pantalla en {self.tiempo_primera_pantalla_ms:.0f} ms")
+    
+    async def cargar_todo_async(self):
+        """Carga los datos de todas las pestañas, como si se hubieran abierto una por una"""
+        await asyncio.gather(*(self.cargar_pestana_async(indice) for indice in range(len(DATOS_PESTANAS))))
+    
+    @accion
+    def pagina_siguiente(self, nombre):
+        self.paginadores[nombre].avanzar()
+        self.cargar_tabla(nombre)
+    
+    @accion
+    def pagina_anterior(self, nombre):
+        self.paginadores[nombre].retroceder()
+        self.cargar_tabla(nombre)
+    
+    @accion
+    def cambiar_tamano_pagina(self, nombre, tamano):
+        pag = self.paginadores[nombre]
+        pag.tamano = int(tamano)
+        pag.reiniciar()
+        self.cargar_tabla(nombre)
+    
+    def crear_controles_paginacion(self, nombre):
+        """Crea los botones anterior/siguiente y el selector de tamaño de página de una tabla"""
+        pag = self.paginadores[nombre]
+        btn_anterior = ft.IconButton(
+            icon=ft.Icons.CHEVRON_LEFT,
+            tooltip="Página anterior",
+            on_click=lambda e: self.pagina_anterior(nombre),
+            disabled=True
+        )
+        btn_siguiente = ft.IconButton(
+            icon=ft.Icons.CHEVRON_RIGHT,
+            tooltip="Página siguiente",
+            on_click=lambda e: self.pagina_siguiente(nombre),
+            disabled=True
+        )
+        texto = ft.Text("Página 1")
+        tamano_dropdown = ft.Dropdown(
+            label="Filas por página",
+            width=150,
+            value=str(pag.tamano),
+            options=[ft.dropdown.Option(key=str(t), text=str(t)) for t in sorted(set(TAMANOS_PAGINA + [pag.tamano]))],
+            on_change=lambda e: self.cambiar_tamano_pagina(nombre, e.control.value)
+        )
+        self.controles_paginacion[nombre] = (btn_anterior, texto, btn_siguiente)
+        return ft.Row([btn_anterior, texto, btn_siguiente, tamano_dropdown], alignment=ft.MainAxisAlignment.CENTER)
+    
+    def actualizar_controles_paginacion(self, nombre):
+        if nombre not in self.controles_paginacion:
+            return
+        pag = self.paginadores[nombre]
+        btn_anterior, texto, btn_siguiente = self.controles_paginacion[nombre]
+        btn_anterior.disabled = not pag.anteriores
+        btn_siguiente.disabled = pag.clave_siguiente is None
+        texto.value = f"Página {pag.numero}"
+    
+    def elegir_archivo_importacion(self, entidad):
+        self.entidad_importacion = entidad
+        self.selector_importacion.pick_files(
+            dialog_title=f"Importar {entidad}",
+            allowed_extensions=["csv", "json", "jsonl"]
+        )
+    
+    @accion
+    def importar_archivo(self, e: ft.FilePickerResultEvent):
+        """Importa el archivo elegido por lotes y recarga la tabla de la entidad"""
+        if not e.files:
+            return
+        entidad = self.entidad_importacion
+        ruta = e.files[0].path
+        self.mostrar_mensaje(f"Importando {entidad} desde {e.files[0].name}...")
+        self.enviar_pendientes()
+        try:
+            resultado = importacion.importar(self.pool, entidad, ruta)
+        except (OSError, ValueError, sqlite3.Error) as error:
+            self.mostrar_mensaje(f"No se pudo importar el archivo: {str(error)}", es_error=True)
+            return
+        
+        mensaje = resultado.resumen()
+        if resultado.rechazados:
+            numero, motivo = resultado.rechazados[0]
+            mensaje += f". Primer rechazo, fila {numero}: {motivo}"
+        self.mostrar_mensaje(mensaje, es_error=bool(resultado.rechazados) and not resultado.insertados)
+        
+        if entidad in self.referencias.ENTIDADES:
+            self.referencias.invalidar(entidad)
+        self.cargar_tabla(entidad)
+        if entidad == 'usuarios':
+            self.actualizar_dropdown_usuarios()
+        elif entidad == 'libros':
+            self.actualizar_dropdown_libros()
+    
+    def crear_boton_importar(self, entidad):
+        return ft.ElevatedButton(text="Importar", icon=ft.Icons.UPLOAD_FILE,
+                                 on_click=lambda e: self.elegir_archivo_importacion(entidad),
+                                 style=ft.ButtonStyle(
+                                     color=ft.Colors.WHITE, 
+                                     bgcolor=ft.Colors.BROWN_200,
+                                     shape=ft.RoundedRectangleBorder(radius=ft.border_radius.all(8))
+                                 ))
+    
+    def elegir_archivo_exportacion(self, entidad):
+        self.entidad_exportacion = entidad
+        self.selector_exportacion.save_file(
+            dialog_title=f"Exportar {entidad}",
+            file_name=f"{entidad}.csv",
+            allowed_extensions=["csv", "jsonl"]
+        )
+    
+    def exportar_archivo(self, e: ft.FilePickerResultEvent):
+        """Exporta la entidad al archivo elegido mostrando el avance en un diálogo"""
+        if not e.path:
+            return
+        entidad = self.entidad_exportacion
+        total = exportacion.contar(self.pool, entidad)
+        
+        def progreso(cantidad):
+            self.barra_progreso.value = cantidad / total if total else 1
+            self.texto_progreso.value = f"{cantidad} de {total} filas"
+            self.page.update()  # el avance se ve en el momento, fuera de cualquier lote
+        
+        self.texto_progreso.value = f"0 de {total} filas"
+        self.barra_progreso.value = 0
+        self.dialogo_progreso.title = ft.Text(f"Exportando {entidad}")
+        self.page.open(self.dialogo_progreso)
+        try:
+            cantidad = exportacion.exportar(self.pool, entidad, e.path, progreso=progreso)
+        except (OSError, ValueError, sqlite3.Error) as error:
+            self.page.close(self.dialogo_progreso)
+            self.mostrar_mensaje(f"No se pudo exportar: {str(error)}", es_error=True)
+            return
+        self.page.close(self.dialogo_progreso)
+        self.mostrar_mensaje(f"{cantidad} filas exportadas a {e.path}")
+    
+    def crear_boton_exportar(self, entidad):
+        return ft.ElevatedButton(text="Exportar", icon=ft.Icons.DOWNLOAD,
+                                 on_click=lambda e: self.elegir_archivo_exportacion(entidad),
+                                 style=ft.ButtonStyle(
+                                     color=ft.Colors.WHITE, 
+                                     bgcolor=ft.Colors.BROWN_200,
+                                     shape=ft.RoundedRectangleBorder(radius=ft.border_radius.all(8))
+                                 ))
     
     def setup_ui(self):
+        self.entidad_importacion = None
+        self.selector_importacion = ft.FilePicker(on_result=self.importar_archivo)
+        self.entidad_exportacion = None
+        self.selector_exportacion = ft.FilePicker(on_result=self.exportar_archivo)
+        self.notificacion = ft.SnackBar(content=ft.Text(""))
+        # Un solo diálogo para las portadas; cada clic cambia la imagen y lo abre
+        self.imagen_dialogo = ft.Image(width=500, height=700, fit=ft.ImageFit.CONTAIN)
+        self.dialogo_imagen = ft.AlertDialog(
+            modal=True,
+            content=ft.Container(content=self.imagen_dialogo, padding=20, alignment=ft.alignment.center),
+            actions=[ft.TextButton("Cerrar", on_click=self.cerrar_imagen_modal)]
+        )
+        self.page.overlay.extend([self.selector_importacion, self.selector_exportacion, self.notificacion,
+                                  self.dialogo_imagen])
+        self.barra_progreso = ft.ProgressBar(width=400, value=0)
+        self.texto_progreso = ft.Text()
+        self.dialogo_progreso = ft.AlertDialog(
+            modal=True,
+            content=ft.Column([self.barra_progreso, self.texto_progreso], tight=True)
+        )
+        
         self.tabs = ft.Tabs(
             selected_index=0,
             animation_duration=300,
@@ -596,9 +1544,12 @@ class BibliotecaApp:
                 ft.Tab(text="Usuarios", content=self.crear_tab_usuarios()),
                 ft.Tab(text="Categorías", content=self.crear_tab_categorias()),
                 ft.Tab(text="Préstamos", content=self.crear_tab_prestamos()),
+                ft.Tab(text="Atrasados", content=self.crear_tab_atrasados()),
+                ft.Tab(text="Reportes", content=self.crear_tab_reportes()),
+                ft.Tab(text="Diagnóstico", content=self.crear_tab_diagnostico()),
             ],
-            tab_alignment=ft.TabAlignment.CENTER
-            
+            tab_alignment=ft.TabAlignment.CENTER,
+            on_change=self.cambiar_pestana
         )
         
         self.page.add(
@@ -611,10 +1562,7 @@ class BibliotecaApp:
         )
         self.page.bgcolor = ft.Colors.BROWN_100
    
-        self.cargar_categorias()
-        self.cargar_usuarios()
-        self.cargar_libros()
-        self.cargar_prestamos()
+        self.page.run_task(self.iniciar_async)
     
     def crear_tab_libros(self):
 
@@ -622,8 +1570,15 @@ class BibliotecaApp:
         self.libro_autor_field = ft.TextField(label="Autor", width=300)
         self.libro_año_field = ft.TextField(label="Año", width=150)
         self.categoria_dropdown = ft.Dropdown(label="Categoría", width=200)
-        self.libro_disponible_checkbox = ft.Checkbox(label="Disponible", value=True, width=150)
+        self.libro_ejemplares_field = ft.TextField(label="Ejemplares", value="1", width=150)
         self.libro_imagen_field = ft.TextField(label="Link de imagen", width=400)
+        self.libro_busqueda_field = ft.TextField(
+            label="Buscar por título o autor",
+            width=400,
+            prefix_icon=ft.Icons.SEARCH,
+            helper_text=AYUDA_BUSQUEDA,
+            on_change=lambda e: self.demorar('libros', self.buscar_en_tabla_libros, e.control.value)
+        )
 
         self.libro_btn = ft.ElevatedButton(text="Agregar Libro", on_click=self.agregar_libro,
                                            style=ft.ButtonStyle(
@@ -632,20 +1587,14 @@ class BibliotecaApp:
                                                   shape=ft.RoundedRectangleBorder(radius=ft.border_radius.all(8))
                                                ))
 
-        self.tabla_libros = ft.DataTable(
-            columns=[
-                ft.DataColumn(ft.Text("ID")),
-                ft.DataColumn(ft.Text("Título")),
-                ft.DataColumn(ft.Text("Autor")),
-                ft.DataColumn(ft.Text("Año")),
-                ft.DataColumn(ft.Text("Categoría")),
-                ft.DataColumn(ft.Text("Disponible")),
-                ft.DataColumn(ft.Text("Imagen")),
-                ft.DataColumn(ft.Text("Acciones")),
-            ],
-            rows=[],
-           horizontal_lines= ft.border.BorderSide(3,color=ft.Colors.GREY_300),
-           vertical_lines= ft.border.BorderSide(3,color=ft.Colors.GREY_300)
+        self.tablas['libros'] = TablaVirtual(
+            [("ID", 70), ("Título", 260), ("Autor", 180), ("Año", 70), ("Categoría", 150),
+             ("Disponibles", 100), ("Imagen", 100), ("Acciones", 110)],
+            self.crear_fila_libro,
+            # Miniatura de 80 px con su marco
+            alto_fila=96,
+            clave_orden=lambda libro: (libro.titulo, libro.id_libro),
+            paginador=self.paginadores['libros']
         )
         
         return ft.Column([
@@ -660,7 +1609,7 @@ class BibliotecaApp:
                         self.categoria_dropdown
                     ], alignment=ft.MainAxisAlignment.CENTER),
                     ft.Row([
-                        self.libro_disponible_checkbox,
+                        self.libro_ejemplares_field,
                         self.libro_imagen_field,
                         self.libro_btn,
                         ft.ElevatedButton(text="Limpiar", on_click=lambda e: self.limpiar_formulario_libro(),
@@ -668,18 +1617,17 @@ class BibliotecaApp:
                                                color=ft.Colors.WHITE, 
                                                bgcolor=ft.Colors.BROWN_200,
                                                   shape=ft.RoundedRectangleBorder(radius=ft.border_radius.all(8))
-                                               ))
+                                               )),
+                        self.crear_boton_importar('libros'),
+                        self.crear_boton_exportar('libros')
                     ], alignment=ft.MainAxisAlignment.CENTER),
                 ], horizontal_alignment=ft.CrossAxisAlignment.CENTER)
             ], alignment=ft.MainAxisAlignment.CENTER),
             ft.Divider(),
-            ft.Row([
-                ft.Column(
-                    [self.tabla_libros],
-                    scroll=True,
-                    expand=1
-                )
-            ], scroll=True, expand=1, vertical_alignment=ft.CrossAxisAlignment.START)
+            ft.Row([self.libro_busqueda_field], alignment=ft.MainAxisAlignment.CENTER),
+            self.crear_controles_paginacion('libros'),
+            ft.Row([self.tablas['libros'].control], scroll=ft.ScrollMode.AUTO, expand=1,
+                   vertical_alignment=ft.CrossAxisAlignment.STRETCH)
         ], horizontal_alignment=ft.CrossAxisAlignment.CENTER)
     
     def crear_tab_usuarios(self):
@@ -696,18 +1644,12 @@ class BibliotecaApp:
                                                   shape=ft.RoundedRectangleBorder(radius=ft.border_radius.all(8))
                                                ))
 
-        self.tabla_usuarios = ft.DataTable(
-            columns=[
-                ft.DataColumn(ft.Text("ID")),
-                ft.DataColumn(ft.Text("Nombre")),
-                ft.DataColumn(ft.Text("Apellido")),
-                ft.DataColumn(ft.Text("DNI")),
-                ft.DataColumn(ft.Text("Email")),
-                ft.DataColumn(ft.Text("Acciones")),
-            ],
-            rows=[],
-            horizontal_lines=ft.border.BorderSide(3, color=ft.Colors.GREY_300),
-            vertical_lines=ft.border.BorderSide(3, color=ft.Colors.GREY_300)
+        self.tablas['usuarios'] = TablaVirtual(
+            [("ID", 70), ("Nombre", 160), ("Apellido", 160), ("DNI", 120), ("Email", 260), ("Acciones", 110)],
+            self.crear_fila_usuario,
+            alto_fila=52,
+            clave_orden=lambda user: (user.apellido, user.nombre, user.id_usuario),
+            paginador=self.paginadores['usuarios']
         )
         
         return ft.Column([
@@ -724,23 +1666,23 @@ class BibliotecaApp:
                                                color=ft.Colors.WHITE, 
                                                bgcolor=ft.Colors.BROWN_200,
                                                   shape=ft.RoundedRectangleBorder(radius=ft.border_radius.all(8))
-                                               ))
+                                               )),
+                        self.crear_boton_importar('usuarios'),
+                        self.crear_boton_exportar('usuarios')
                     ], alignment=ft.MainAxisAlignment.CENTER)
                 ], horizontal_alignment=ft.CrossAxisAlignment.CENTER)
             ], alignment=ft.MainAxisAlignment.CENTER),
             ft.Divider(),
-            ft.Row([
-                ft.Column(
-                    [self.tabla_usuarios],
-                    scroll=True,
-                    expand=1
-                )
-            ], scroll=True, expand=1, vertical_alignment=ft.CrossAxisAlignment.START)
+            self.crear_controles_paginacion('usuarios'),
+            ft.Row([self.tablas['usuarios'].control], scroll=ft.ScrollMode.AUTO, expand=1,
+                   vertical_alignment=ft.CrossAxisAlignment.STRETCH)
         ], horizontal_alignment=ft.CrossAxisAlignment.CENTER)
     
     def crear_tab_categorias(self):
 
         self.categoria_nombre_field = ft.TextField(label="Nombre de la categoría", width=300)
+        self.categoria_dias_field = ft.TextField(label="Días de préstamo", width=150,
+                                                 value=str(validaciones.DIAS_PRESTAMO_POR_DEFECTO))
         
 
         self.categoria_btn = ft.ElevatedButton(text="Agregar Categoría", on_click=self.agregar_categoria,
@@ -755,19 +1697,24 @@ class BibliotecaApp:
             columns=[
                 ft.DataColumn(ft.Text("ID")),
                 ft.DataColumn(ft.Text("Nombre")),
+                ft.DataColumn(ft.Text("Días de préstamo")),
                 ft.DataColumn(ft.Text("Acciones")),
             ],
             rows=[],
             horizontal_lines=ft.border.BorderSide(3, color=ft.Colors.GREY_300),
             vertical_lines=ft.border.BorderSide(3, color=ft.Colors.GREY_300)
         )
+        self.tablas['categorias'] = TablaIncremental(
+            self.tabla_categorias, self.crear_fila_categoria,
+            clave_orden=lambda cat: (cat.nombre_categoria, cat.id_categoria)
+        )
         
         return ft.Column([
             ft.Text("Gestión de Categorías", size=24, weight=ft.FontWeight.BOLD, text_align=ft.TextAlign.CENTER),
             ft.Divider(),
             ft.Row([
                 ft.Column([
-                    self.categoria_nombre_field,
+                    ft.Row([self.categoria_nombre_field, self.categoria_dias_field], alignment=ft.MainAxisAlignment.CENTER),
                     ft.Row([
                         self.categoria_btn,
                         ft.ElevatedButton(text="Limpiar", on_click=lambda e: self.limpiar_formulario_categoria(),
@@ -775,7 +1722,8 @@ class BibliotecaApp:
                                                color=ft.Colors.WHITE, 
                                                bgcolor=ft.Colors.BROWN_200,
                                                   shape=ft.RoundedRectangleBorder(radius=ft.border_radius.all(8))
-                                               ))
+                                               )),
+                        self.crear_boton_importar('categorias')
                     ], alignment=ft.MainAxisAlignment.CENTER)
                 ], horizontal_alignment=ft.CrossAxisAlignment.CENTER)
             ], alignment=ft.MainAxisAlignment.CENTER),
@@ -788,21 +1736,41 @@ class BibliotecaApp:
                 )
             ], scroll=True, expand=1, vertical_alignment=ft.CrossAxisAlignment.START)
         ], horizontal_alignment=ft.CrossAxisAlignment.CENTER)
-    def handle_change(self, e, es_fecha=True):
-        fecha_str = e.data[:10] 
-        self.fecha_prestamo_field.value = datetime.strptime(fecha_str, "%Y-%m-%d").strftime("%d/%m/%Y")
-        self.page.update()
+    
+    @accion
+    def handle_change(self, e, campo=None):
+        campo = campo or self.fecha_prestamo_field
+        campo.value = validaciones.convertir_fecha(e.data[:10])
+        self.actualizar()
+    
+    def crear_campo_fecha(self, label):
+        """TextField AAAA-MM-DD con un botón que abre el selector de fecha"""
+        campo = ft.TextField(label=label, width=200, hint_text="AAAA-MM-DD", on_submit=self.filtrar_prestamos)
+        campo.suffix = ft.IconButton(
+            icon=ft.Icons.DATE_RANGE,
+            tooltip="Elegir fecha",
+            on_click=lambda e: self.page.open(
+                ft.DatePicker(on_change=lambda e: self.handle_change(e, campo))
+            )
+        )
+        return campo
 
 
     def crear_tab_prestamos(self):
+        self.libro_busqueda_prestamo_field = ft.TextField(
+            label="Buscar libro",
+            width=300,
+            prefix_icon=ft.Icons.SEARCH,
+            helper_text=AYUDA_BUSQUEDA,
+            on_change=lambda e: self.demorar('prestamos', self.buscar_libro_prestamo, e.control.value)
+        )
         self.libro_dropdown = ft.Dropdown(
             label="Seleccionar libro", 
-            width=300,
-            enable_filter=True,
-            editable=True
+            width=300
         )
         self.usuario_dropdown = ft.Dropdown(label="Seleccionar usuario", width=300)
-        self.fecha_prestamo_field = ft.TextField(label="Fecha del préstamo", width=200, read_only=True)
+        self.fecha_prestamo_field = ft.TextField(label="Fecha del préstamo", width=200, read_only=True,
+                                                 value=datetime.now().strftime(validaciones.FORMATO_FECHA))
         self.fecha = ft.ElevatedButton(
             "Elegir fecha",
             icon=ft.Icons.DATE_RANGE,
@@ -816,7 +1784,7 @@ class BibliotecaApp:
             
             on_click=lambda e: self.page.open(
                 ft.DatePicker(
-                    on_change=lambda e:self.handle_change(e,False),
+                    on_change=lambda e: self.handle_change(e),
                 )
             ),
         )
@@ -829,18 +1797,18 @@ class BibliotecaApp:
                                                ))
         
 
-        self.tabla_prestamos = ft.DataTable(
-            columns=[
-                ft.DataColumn(ft.Text("ID")),
-                ft.DataColumn(ft.Text("Libro")),
-                ft.DataColumn(ft.Text("Usuario")),
-                ft.DataColumn(ft.Text("Fecha Préstamo")),
-                ft.DataColumn(ft.Text("Estado")),
-                ft.DataColumn(ft.Text("Acciones")),
-            ],
-            rows=[],
-            horizontal_lines=ft.border.BorderSide(3, color=ft.Colors.GREY_300),
-            vertical_lines=ft.border.BorderSide(3, color=ft.Colors.GREY_300)
+        self.filtro_desde_field = self.crear_campo_fecha("Desde")
+        self.filtro_hasta_field = self.crear_campo_fecha("Hasta")
+        
+
+        self.tablas['prestamos'] = TablaVirtual(
+            [("ID", 70), ("Libro", 300), ("Usuario", 200), ("Fecha Préstamo", 130), ("Vencimiento", 130),
+             ("Estado", 100), ("Acciones", 110)],
+            self.crear_fila_prestamo,
+            alto_fila=52,
+            clave_orden=lambda prest: (prest.fecha_prestamo, prest.id_prestamo),
+            descendente=True,
+            paginador=self.paginadores['prestamos']
         )
         
         return ft.Column([
@@ -848,6 +1816,7 @@ class BibliotecaApp:
             ft.Divider(),
             ft.Row([
                 ft.Column([ 
+                    ft.Row([self.libro_busqueda_prestamo_field], alignment=ft.MainAxisAlignment.CENTER),
                     ft.Row([self.libro_dropdown, self.usuario_dropdown, self.fecha, self.fecha_prestamo_field], alignment=ft.MainAxisAlignment.CENTER),
                     ft.Row([
                         self.prestamo_btn,
@@ -856,24 +1825,163 @@ class BibliotecaApp:
                                                color=ft.Colors.WHITE, 
                                                bgcolor=ft.Colors.BROWN_200,
                                                   shape=ft.RoundedRectangleBorder(radius=ft.border_radius.all(8))
-                                               ))
+                                               )),
+                        self.crear_boton_exportar('prestamos')
                     ], alignment=ft.MainAxisAlignment.CENTER)
                 ], horizontal_alignment=ft.CrossAxisAlignment.CENTER)
             ], alignment=ft.MainAxisAlignment.CENTER),
             ft.Divider(),
+            ft.Row([
+                self.filtro_desde_field,
+                self.filtro_hasta_field,
+                ft.ElevatedButton(text="Filtrar", icon=ft.Icons.FILTER_ALT, on_click=self.filtrar_prestamos,
+                                  style=ft.ButtonStyle(
+                                       color=ft.Colors.WHITE, 
+                                       bgcolor=ft.Colors.BROWN_200,
+                                          shape=ft.RoundedRectangleBorder(radius=ft.border_radius.all(8))
+                                       )),
+                ft.TextButton(text="Quitar filtro", on_click=self.quitar_filtro_prestamos)
+            ], alignment=ft.MainAxisAlignment.CENTER),
+            self.crear_controles_paginacion('prestamos'),
+            ft.Row([self.tablas['prestamos'].control], scroll=ft.ScrollMode.AUTO, expand=1,
+                   vertical_alignment=ft.CrossAxisAlignment.STRETCH)
+        ], horizontal_alignment=ft.CrossAxisAlignment.CENTER)
+
+    
+    def crear_tab_atrasados(self):
+        self.tabla_atrasados = ft.DataTable(
+            columns=[
+                ft.DataColumn(ft.Text("ID")),
+                ft.DataColumn(ft.Text("Libro")),
+                ft.DataColumn(ft.Text("Usuario")),
+                ft.DataColumn(ft.Text("Fecha Préstamo")),
+                ft.DataColumn(ft.Text("Vencimiento")),
+                ft.DataColumn(ft.Text("Días de atraso"), numeric=True),
+                ft.DataColumn(ft.Text("Acciones")),
+            ],
+            rows=[],
+            horizontal_lines=ft.border.BorderSide(3, color=ft.Colors.GREY_300),
+            vertical_lines=ft.border.BorderSide(3, color=ft.Colors.GREY_300)
+        )
+        self.tablas['atrasados'] = TablaIncremental(
+            self.tabla_atrasados, self.crear_fila_atrasado,
+            clave_orden=lambda prest: (prest.fecha_vencimiento, prest.id_prestamo),
+            paginador=self.paginadores['atrasados']
+        )
+        
+        return ft.Column([
+            ft.Text("Préstamos Atrasados", size=24, weight=ft.FontWeight.BOLD, text_align=ft.TextAlign.CENTER),
+            ft.Divider(),
+            ft.Row([
+                ft.ElevatedButton(text="Actualizar", icon=ft.Icons.REFRESH,
+                                  on_click=lambda e: self.cargar_tabla('atrasados'),
+                                  style=ft.ButtonStyle(
+                                       color=ft.Colors.WHITE, 
+                                       bgcolor=ft.Colors.BROWN_200,
+                                          shape=ft.RoundedRectangleBorder(radius=ft.border_radius.all(8))
+                                       ))
+            ], alignment=ft.MainAxisAlignment.CENTER),
+            self.crear_controles_paginacion('atrasados'),
             ft.Row([
                 ft.Column(
-                    [self.tabla_prestamos],
+                    [self.tabla_atrasados],
                     scroll=True,
                     expand=1
                 )
             ], scroll=True, expand=1, vertical_alignment=ft.CrossAxisAlignment.START)
         ], horizontal_alignment=ft.CrossAxisAlignment.CENTER)
 
+    
+    def crear_tab_reportes(self):
+        self.texto_totales_reportes = ft.Text(size=16)
+        self.tablas_reportes = {}
+        tarjetas = []
+        for nombre, (titulo, columna) in TITULOS_REPORTES.items():
+            self.tablas_reportes[nombre] = ft.DataTable(
+                columns=[
+                    ft.DataColumn(ft.Text(columna)),
+                    ft.DataColumn(ft.Text("Préstamos"), numeric=True),
+                ],
+                rows=[],
+                horizontal_lines=ft.border.BorderSide(1, color=ft.Colors.GREY_300)
+            )
+            tarjetas.append(ft.Container(
+                content=ft.Column([
+                    ft.Text(titulo, size=18, weight=ft.FontWeight.BOLD),
+                    self.tablas_reportes[nombre]
+                ], horizontal_alignment=ft.CrossAxisAlignment.CENTER),
+                bgcolor=ft.Colors.WHITE,
+                border_radius=ft.border_radius.all(8),
+                padding=10
+            ))
+        
+        return ft.Column([
+            ft.Text("Reportes de Circulación", size=24, weight=ft.FontWeight.BOLD, text_align=ft.TextAlign.CENTER),
+            ft.Divider(),
+            ft.Row([
+                self.texto_totales_reportes,
+                ft.ElevatedButton(text="Actualizar", icon=ft.Icons.REFRESH,
+                                  on_click=lambda e: self.cargar_tabla('reportes'),
+                                  style=ft.ButtonStyle(
+                                       color=ft.Colors.WHITE, 
+                                       bgcolor=ft.Colors.BROWN_200,
+                                          shape=ft.RoundedRectangleBorder(radius=ft.border_radius.all(8))
+                                       ))
+            ], alignment=ft.MainAxisAlignment.CENTER),
+            ft.Row(tarjetas, wrap=True, alignment=ft.MainAxisAlignment.CENTER,
+                   vertical_alignment=ft.CrossAxisAlignment.START)
+        ], horizontal_alignment=ft.CrossAxisAlignment.CENTER, scroll=ft.ScrollMode.AUTO)
+
+    
+    def crear_tab_diagnostico(self):
+        self.texto_diagnostico = ft.Text(size=16)
+        self.texto_respaldo = ft.Text(size=14)
+        self.tabla_diagnostico = ft.DataTable(
+            columns=[
+                ft.DataColumn(ft.Text("Consulta")),
+                ft.DataColumn(ft.Text("Ejecuciones"), numeric=True),
+                ft.DataColumn(ft.Text("Total ms"), numeric=True),
+                ft.DataColumn(ft.Text("Promedio ms"), numeric=True),
+                ft.DataColumn(ft.Text("Máx ms"), numeric=True),
+                ft.DataColumn(ft.Text("Filas"), numeric=True),
+                ft.DataColumn(ft.Text("Histograma (ms)")),
+            ],
+            rows=[],
+            border=ft.border.all(1, ft.Colors.GREY_400),
+            border_radius=8,
+            horizontal_lines=ft.border.BorderSide(1, color=ft.Colors.GREY_300)
+        )
+        estilo = ft.ButtonStyle(
+            color=ft.Colors.WHITE,
+            bgcolor=ft.Colors.BROWN_200,
+            shape=ft.RoundedRectangleBorder(radius=ft.border_radius.all(8))
+        )
+        self.boton_respaldo = ft.ElevatedButton(text="Respaldar ahora", icon=ft.Icons.BACKUP,
+                                                on_click=self.respaldar_ahora, style=estilo)
+        
+        return ft.Column([
+            ft.Text("Diagnóstico de Consultas", size=24, weight=ft.FontWeight.BOLD, text_align=ft.TextAlign.CENTER),
+            ft.Divider(),
+            ft.Row([
+                self.texto_diagnostico,
+                ft.ElevatedButton(text="Actualizar", icon=ft.Icons.REFRESH,
+                                  on_click=lambda e: self.cargar_tabla('diagnostico'), style=estilo),
+                ft.ElevatedButton(text="Reiniciar", icon=ft.Icons.RESTART_ALT,
+                                  on_click=self.reiniciar_diagnostico, style=estilo),
+            ], alignment=ft.MainAxisAlignment.CENTER),
+            ft.Row([self.texto_respaldo, self.boton_respaldo], alignment=ft.MainAxisAlignment.CENTER),
+            ft.Container(
+                content=ft.Row([self.tabla_diagnostico], scroll=ft.ScrollMode.AUTO),
+                bgcolor=ft.Colors.WHITE,
+                border_radius=ft.border_radius.all(8),
+                padding=10
+            )
+        ], horizontal_alignment=ft.CrossAxisAlignment.CENTER, scroll=ft.ScrollMode.AUTO)
+
 
 def main(page: ft.Page):
     app = BibliotecaApp(page)
 
 
 if __name__ == "__main__":
-    ft.app(target=main)
\ No newline at end of file
+    ft.app(target=main, assets_dir=portadas.DIRECTORIO_ASSETS)
\ No newline at end of file
@@ -0,0 +1,342 @@
+"""Migraciones del esquema de Libreria.db, versionadas con PRAGMA user_version"""
+import sqlite3
+import sys
+
+import base_datos
+
+
+def triggers_cambios(tabla, clave):
+    """Triggers que anotan en cambios cada alta, modificación y baja de la tabla (migración 8)"""
+    return [
+        f"""CREATE TRIGGER IF NOT EXISTS cambios_{tabla}_{sufijo} AFTER {evento} ON {tabla} BEGIN
+            INSERT INTO cambios (entidad, id_registro) VALUES ('{tabla}', {fila}.{clave});
+        END"""
+        for sufijo, evento, fila in (("ai", "INSERT", "new"), ("au", "UPDATE", "new"), ("ad", "DELETE", "old"))
+    ]
+
+
+def triggers_stats_libros():
+    """Pasan los préstamos de un libro a su nueva categoría o autor; un libro que nunca se prestó
+    no tiene fila en stats_libros y no mueve nada (migración 10)"""
+    return [
+        f"""CREATE TRIGGER IF NOT EXISTS stats_libros_{columna}_au AFTER UPDATE OF {campo} ON libros
+           WHEN old.{campo} IS NOT new.{campo}
+            AND EXISTS (SELECT 1 FROM stats_libros WHERE id_libro = new.id_libro) BEGIN
+            UPDATE {tabla} SET prestamos = prestamos - (SELECT prestamos FROM stats_libros WHERE id_libro = new.id_libro)
+                WHERE {campo} = old.{campo};
+            INSERT INTO {tabla} ({campo}, prestamos)
+                SELECT new.{campo}, prestamos FROM stats_libros WHERE id_libro = new.id_libro AND new.{campo} IS NOT NULL
+                ON CONFLICT ({campo}) DO UPDATE SET prestamos = prestamos + excluded.prestamos;
+        END"""
+        for columna, campo, tabla in (("categoria", "id_categoria", "stats_categorias"),
+                                      ("autor", "autor", "stats_autores"))
+    ]
+
+
+# Recuento desde cero de cada tabla stats_* (el mismo que hace la migración 7), para comparar
+# con lo que mantienen los triggers
+RECUENTOS_STATS = {
+    "stats_categorias": """SELECT l.id_categoria, COUNT(*) FROM prestamos p JOIN libros l ON p.id_libro = l.id_libro
+                           WHERE l.id_categoria IS NOT NULL GROUP BY l.id_categoria""",
+    "stats_meses": "SELECT substr(fecha_prestamo, 1, 7), COUNT(*) FROM prestamos GROUP BY substr(fecha_prestamo, 1, 7)",
+    "stats_libros": "SELECT id_libro, COUNT(*) FROM prestamos WHERE id_libro IS NOT NULL GROUP BY id_libro",
+    "stats_autores": "SELECT l.autor, COUNT(*) FROM prestamos p JOIN libros l ON p.id_libro = l.id_libro GROUP BY l.autor",
+    "stats_usuarios": "SELECT id_usuario, COUNT(*) FROM prestamos WHERE id_usuario IS NOT NULL GROUP BY id_usuario",
+}
+
+
+# Cada elemento es una migración: la posición + 1 es la versión que deja la base.
+# Solo se agregan migraciones nuevas al final, nunca se modifican las existentes.
+MIGRACIONES = [
+    # 1: esquema base
+    [
+        """CREATE TABLE IF NOT EXISTS categorias (
+                id_categoria INTEGER PRIMARY KEY AUTOINCREMENT,
+                nombre_categoria TEXT NOT NULL UNIQUE
+            )""",
+        """CREATE TABLE IF NOT EXISTS usuarios (
+                id_usuario INTEGER PRIMARY KEY AUTOINCREMENT,
+                nombre TEXT NOT NULL,
+                apellido TEXT NOT NULL,
+                dni TEXT NOT NULL UNIQUE,
+                email TEXT NOT NULL
+            )""",
+        """CREATE TABLE IF NOT EXISTS libros (
+                id_libro INTEGER PRIMARY KEY AUTOINCREMENT,
+                titulo TEXT NOT NULL,
+                autor TEXT NOT NULL,
+                año INTEGER,
+                id_categoria INTEGER,
+                disponible BOOLEAN DEFAULT 1,
+                link_imagen TEXT,
+                FOREIGN KEY (id_categoria) REFERENCES categorias (id_categoria)
+            )""",
+        """CREATE TABLE IF NOT EXISTS prestamos (
+                id_prestamo INTEGER PRIMARY KEY AUTOINCREMENT,
+                id_libro INTEGER,
+                id_usuario INTEGER,
+                fecha_prestamo TEXT NOT NULL,
+                devuelto BOOLEAN DEFAULT 0,
+                FOREIGN KEY (id_libro) REFERENCES libros (id_libro),
+                FOREIGN KEY (id_usuario) REFERENCES usuarios (id_usuario)
+            )""",
+    ],
+    # 2: índices de las consultas frecuentes
+    [
+        # Orden de las tablas paginadas (el id es el rowid, ya incluido en cada índice)
+        "CREATE INDEX IF NOT EXISTS idx_libros_titulo ON libros (titulo)",
+        "CREATE INDEX IF NOT EXISTS idx_usuarios_apellido ON usuarios (apellido, nombre)",
+        "CREATE INDEX IF NOT EXISTS idx_prestamos_fecha ON prestamos (fecha_prestamo)",
+        # Control de categorías en uso antes de eliminar
+        "CREATE INDEX IF NOT EXISTS idx_libros_categoria ON libros (id_categoria)",
+        # Préstamos pendientes por libro y por usuario, solo con las filas abiertas
+        "CREATE INDEX IF NOT EXISTS idx_prestamos_abiertos_libro ON prestamos (id_libro) WHERE devuelto = 0",
+        "CREATE INDEX IF NOT EXISTS idx_prestamos_abiertos_usuario ON prestamos (id_usuario) WHERE devuelto = 0",
+    ],
+    # 3: búsqueda de texto completo sobre título y autor, sincronizada con libros por triggers
+    [
+        """CREATE VIRTUAL TABLE IF NOT EXISTS libros_fts USING fts5(
+            titulo, autor,
+            content='libros', content_rowid='id_libro',
+            tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+        )""",
+        """CREATE TRIGGER IF NOT EXISTS libros_fts_ai AFTER INSERT ON libros BEGIN
+            INSERT INTO libros_fts (rowid, titulo, autor) VALUES (new.id_libro, new.titulo, new.autor);
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS libros_fts_ad AFTER DELETE ON libros BEGIN
+            INSERT INTO libros_fts (libros_fts, rowid, titulo, autor) VALUES ('delete', old.id_libro, old.titulo, old.autor);
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS libros_fts_au AFTER UPDATE OF titulo, autor ON libros BEGIN
+            INSERT INTO libros_fts (libros_fts, rowid, titulo, autor) VALUES ('delete', old.id_libro, old.titulo, old.autor);
+            INSERT INTO libros_fts (rowid, titulo, autor) VALUES (new.id_libro, new.titulo, new.autor);
+        END""",
+        "INSERT INTO libros_fts (libros_fts) VALUES ('rebuild')",
+    ],
+    # 4: índices para las claves foráneas de prestamos, que con foreign_keys=ON se verifican
+    # en cada baja de libro o usuario (incluyen devuelto para contar el historial sin ir a la tabla)
+    [
+        "CREATE INDEX IF NOT EXISTS idx_prestamos_libro ON prestamos (id_libro, devuelto)",
+        "CREATE INDEX IF NOT EXISTS idx_prestamos_usuario ON prestamos (id_usuario, devuelto)",
+    ],
+    # 5: fechas de préstamo en ISO (AAAA-MM-DD) para que ordenen bien y los rangos usen idx_prestamos_fecha;
+    # el selector de fecha guardaba DD/MM/AAAA
+    [
+        """UPDATE prestamos
+           SET fecha_prestamo = substr(fecha_prestamo, 7, 4) || '-' || substr(fecha_prestamo, 4, 2) || '-' || substr(fecha_prestamo, 1, 2)
+           WHERE fecha_prestamo GLOB '[0-3][0-9]/[01][0-9]/[0-9][0-9][0-9][0-9]'""",
+        """CREATE TRIGGER IF NOT EXISTS prestamos_fecha_iso_ai BEFORE INSERT ON prestamos
+           WHEN new.fecha_prestamo NOT GLOB '[0-9][0-9][0-9][0-9]-[01][0-9]-[0-3][0-9]' BEGIN
+            SELECT RAISE(ABORT, 'fecha_prestamo debe tener el formato AAAA-MM-DD');
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS prestamos_fecha_iso_au BEFORE UPDATE OF fecha_prestamo ON prestamos
+           WHEN new.fecha_prestamo NOT GLOB '[0-9][0-9][0-9][0-9]-[01][0-9]-[0-3][0-9]' BEGIN
+            SELECT RAISE(ABORT, 'fecha_prestamo debe tener el formato AAAA-MM-DD');
+        END""",
+    ],
+    # 6: vencimiento de cada préstamo según los días de préstamo de la categoría del libro
+    [
+        "ALTER TABLE categorias ADD COLUMN dias_prestamo INTEGER NOT NULL DEFAULT 14",
+        "ALTER TABLE prestamos ADD COLUMN fecha_vencimiento TEXT",
+        """UPDATE prestamos
+           SET fecha_vencimiento = date(fecha_prestamo, '+' || COALESCE(
+               (SELECT c.dias_prestamo FROM libros l JOIN categorias c ON l.id_categoria = c.id_categoria
+                WHERE l.id_libro = prestamos.id_libro), 14) || ' days')""",
+        # Los préstamos nuevos (desde la app o cualquier otro cliente) calculan su vencimiento al insertarse
+        """CREATE TRIGGER IF NOT EXISTS prestamos_vencimiento_ai AFTER INSERT ON prestamos
+           WHEN new.fecha_vencimiento IS NULL BEGIN
+            UPDATE prestamos
+            SET fecha_vencimiento = date(new.fecha_prestamo, '+' || COALESCE(
+                (SELECT c.dias_prestamo FROM libros l JOIN categorias c ON l.id_categoria = c.id_categoria
+                 WHERE l.id_libro = new.id_libro), 14) || ' days')
+            WHERE id_prestamo = new.id_prestamo;
+        END""",
+        # Atrasados: solo los préstamos abiertos, ya ordenados por vencimiento
+        "CREATE INDEX IF NOT EXISTS idx_prestamos_vencimiento ON prestamos (fecha_vencimiento) WHERE devuelto = 0",
+    ],
+    # 7: estadísticas de circulación para la pestaña Reportes, mantenidas por triggers en vez de
+    # recalcularse con GROUP BY sobre todo el historial
+    [
+        "CREATE TABLE IF NOT EXISTS stats_categorias (id_categoria INTEGER PRIMARY KEY, prestamos INTEGER NOT NULL)",
+        "CREATE TABLE IF NOT EXISTS stats_meses (mes TEXT PRIMARY KEY, prestamos INTEGER NOT NULL)",
+        "CREATE TABLE IF NOT EXISTS stats_libros (id_libro INTEGER PRIMARY KEY, prestamos INTEGER NOT NULL)",
+        "CREATE TABLE IF NOT EXISTS stats_autores (autor TEXT PRIMARY KEY, prestamos INTEGER NOT NULL)",
+        "CREATE TABLE IF NOT EXISTS stats_usuarios (id_usuario INTEGER PRIMARY KEY, prestamos INTEGER NOT NULL)",
+        # Los rankings leen los primeros N en orden de préstamos
+        "CREATE INDEX IF NOT EXISTS idx_stats_libros_prestamos ON stats_libros (prestamos)",
+        "CREATE INDEX IF NOT EXISTS idx_stats_autores_prestamos ON stats_autores (prestamos)",
+        "CREATE INDEX IF NOT EXISTS idx_stats_usuarios_prestamos ON stats_usuarios (prestamos)",
+        """INSERT INTO stats_categorias (id_categoria, prestamos)
+           SELECT l.id_categoria, COUNT(*) FROM prestamos p JOIN libros l ON p.id_libro = l.id_libro
+           WHERE l.id_categoria IS NOT NULL GROUP BY l.id_categoria""",
+        """INSERT INTO stats_meses (mes, prestamos)
+           SELECT substr(fecha_prestamo, 1, 7), COUNT(*) FROM prestamos GROUP BY substr(fecha_prestamo, 1, 7)""",
+        """INSERT INTO stats_libros (id_libro, prestamos)
+           SELECT id_libro, COUNT(*) FROM prestamos WHERE id_libro IS NOT NULL GROUP BY id_libro""",
+        """INSERT INTO stats_autores (autor, prestamos)
+           SELECT l.autor, COUNT(*) FROM prestamos p JOIN libros l ON p.id_libro = l.id_libro GROUP BY l.autor""",
+        """INSERT INTO stats_usuarios (id_usuario, prestamos)
+           SELECT id_usuario, COUNT(*) FROM prestamos WHERE id_usuario IS NOT NULL GROUP BY id_usuario""",
+        """CREATE TRIGGER IF NOT EXISTS stats_prestamos_ai AFTER INSERT ON prestamos BEGIN
+            INSERT INTO stats_categorias (id_categoria, prestamos)
+                SELECT id_categoria, 1 FROM libros WHERE id_libro = new.id_libro AND id_categoria IS NOT NULL
+                ON CONFLICT (id_categoria) DO UPDATE SET prestamos = prestamos + 1;
+            INSERT INTO stats_meses (mes, prestamos) VALUES (substr(new.fecha_prestamo, 1, 7), 1)
+                ON CONFLICT (mes) DO UPDATE SET prestamos = prestamos + 1;
+            INSERT INTO stats_libros (id_libro, prestamos) VALUES (new.id_libro, 1)
+                ON CONFLICT (id_libro) DO UPDATE SET prestamos = prestamos + 1;
+            INSERT INTO stats_autores (autor, prestamos)
+                SELECT autor, 1 FROM libros WHERE id_libro = new.id_libro
+                ON CONFLICT (autor) DO UPDATE SET prestamos = prestamos + 1;
+            INSERT INTO stats_usuarios (id_usuario, prestamos) VALUES (new.id_usuario, 1)
+                ON CONFLICT (id_usuario) DO UPDATE SET prestamos = prestamos + 1;
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS stats_prestamos_ad AFTER DELETE ON prestamos BEGIN
+            UPDATE stats_categorias SET prestamos = prestamos - 1
+                WHERE id_categoria = (SELECT id_categoria FROM libros WHERE id_libro = old.id_libro);
+            UPDATE stats_meses SET prestamos = prestamos - 1 WHERE mes = substr(old.fecha_prestamo, 1, 7);
+            UPDATE stats_libros SET prestamos = prestamos - 1 WHERE id_libro = old.id_libro;
+            UPDATE stats_autores SET prestamos = prestamos - 1
+                WHERE autor = (SELECT autor FROM libros WHERE id_libro = old.id_libro);
+            UPDATE stats_usuarios SET prestamos = prestamos - 1 WHERE id_usuario = old.id_usuario;
+        END""",
+        # Devolver un préstamo no cambia las estadísticas; solo cuentan los cambios de libro, usuario o fecha
+        """CREATE TRIGGER IF NOT EXISTS stats_prestamos_au AFTER UPDATE OF id_libro, id_usuario, fecha_prestamo ON prestamos BEGIN
+            UPDATE stats_categorias SET prestamos = prestamos - 1
+                WHERE id_categoria = (SELECT id_categoria FROM libros WHERE id_libro = old.id_libro);
+            UPDATE stats_meses SET prestamos = prestamos - 1 WHERE mes = substr(old.fecha_prestamo, 1, 7);
+            UPDATE stats_libros SET prestamos = prestamos - 1 WHERE id_libro = old.id_libro;
+            UPDATE stats_autores SET prestamos = prestamos - 1
+                WHERE autor = (SELECT autor FROM libros WHERE id_libro = old.id_libro);
+            UPDATE stats_usuarios SET prestamos = prestamos - 1 WHERE id_usuario = old.id_usuario;
+            INSERT INTO stats_categorias (id_categoria, prestamos)
+                SELECT id_categoria, 1 FROM libros WHERE id_libro = new.id_libro AND id_categoria IS NOT NULL
+                ON CONFLICT (id_categoria) DO UPDATE SET prestamos = prestamos + 1;
+            INSERT INTO stats_meses (mes, prestamos) VALUES (substr(new.fecha_prestamo, 1, 7), 1)
+                ON CONFLICT (mes) DO UPDATE SET prestamos = prestamos + 1;
+            INSERT INTO stats_libros (id_libro, prestamos) VALUES (new.id_libro, 1)
+                ON CONFLICT (id_libro) DO UPDATE SET prestamos = prestamos + 1;
+            INSERT INTO stats_autores (autor, prestamos)
+                SELECT autor, 1 FROM libros WHERE id_libro = new.id_libro
+                ON CONFLICT (autor) DO UPDATE SET prestamos = prestamos + 1;
+            INSERT INTO stats_usuarios (id_usuario, prestamos) VALUES (new.id_usuario, 1)
+                ON CONFLICT (id_usuario) DO UPDATE SET prestamos = prestamos + 1;
+        END""",
+        # Si un libro cambia de categoría o de autor, sus préstamos pasan al nuevo grupo
+        """CREATE TRIGGER IF NOT EXISTS stats_libros_categoria_au AFTER UPDATE OF id_categoria ON libros
+           WHEN old.id_categoria IS NOT new.id_categoria BEGIN
+            UPDATE stats_categorias SET prestamos = prestamos - (SELECT prestamos FROM stats_libros WHERE id_libro = new.id_libro)
+                WHERE id_categoria = old.id_categoria;
+            INSERT INTO stats_categorias (id_categoria, prestamos)
+                SELECT new.id_categoria, prestamos FROM stats_libros WHERE id_libro = new.id_libro AND new.id_categoria IS NOT NULL
+                ON CONFLICT (id_categoria) DO UPDATE SET prestamos = prestamos + excluded.prestamos;
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS stats_libros_autor_au AFTER UPDATE OF autor ON libros
+           WHEN old.autor IS NOT new.autor BEGIN
+            UPDATE stats_autores SET prestamos = prestamos - (SELECT prestamos FROM stats_libros WHERE id_libro = new.id_libro)
+                WHERE autor = old.autor;
+            INSERT INTO stats_autores (autor, prestamos)
+                SELECT new.autor, prestamos FROM stats_libros WHERE id_libro = new.id_libro
+                ON CONFLICT (autor) DO UPDATE SET prestamos = prestamos + excluded.prestamos;
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS stats_libros_ad AFTER DELETE ON libros BEGIN
+            DELETE FROM stats_libros WHERE id_libro = old.id_libro;
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS stats_usuarios_ad AFTER DELETE ON usuarios BEGIN
+            DELETE FROM stats_usuarios WHERE id_usuario = old.id_usuario;
+        END""",
+    ],
+    # 8: registro de cambios para sincronizar las sesiones abiertas, aunque escriba otro proceso
+    # (la API, la importación u otra instancia de la aplicación)
+    [
+        """CREATE TABLE IF NOT EXISTS cambios (
+                id_cambio INTEGER PRIMARY KEY AUTOINCREMENT,
+                entidad TEXT NOT NULL,
+                id_registro INTEGER NOT NULL
+            )""",
+        *triggers_cambios("categorias", "id_categoria"),
+        *triggers_cambios("usuarios", "id_usuario"),
+        *triggers_cambios("libros", "id_libro"),
+        *triggers_cambios("prestamos", "id_prestamo"),
+    ],
+    # 9: varios ejemplares por título. disponibles es la cantidad que no está prestada y se mueve
+    # en la misma transacción que el préstamo; disponible queda como disponibles > 0 para quien lo lea
+    [
+        "ALTER TABLE libros ADD COLUMN ejemplares INTEGER NOT NULL DEFAULT 1 CHECK (ejemplares >= 1)",
+        "ALTER TABLE libros ADD COLUMN disponibles INTEGER NOT NULL DEFAULT 1 CHECK (disponibles >= 0)",
+        """UPDATE libros SET disponibles = MAX(0, 1 - (SELECT COUNT(*) FROM prestamos
+               WHERE prestamos.id_libro = libros.id_libro AND devuelto = 0)),
+           disponible = NOT EXISTS (SELECT 1 FROM prestamos
+               WHERE prestamos.id_libro = libros.id_libro AND devuelto = 0)""",
+        """CREATE TRIGGER IF NOT EXISTS libros_disponibles_bu BEFORE UPDATE OF ejemplares, disponibles ON libros
+           WHEN new.disponibles > new.ejemplares BEGIN
+            SELECT RAISE(ABORT, 'disponibles no puede superar a ejemplares');
+        END""",
+        # El selector de préstamos recorre solo los títulos con ejemplares libres, en orden de título
+        "CREATE INDEX IF NOT EXISTS idx_libros_prestables ON libros (titulo, id_libro) WHERE disponibles > 0",
+    ],
+    # 10: los triggers de cambio de categoría o autor de la migración 7 restaban NULL (y fallaban por
+    # NOT NULL) al editar un libro que nunca se prestó
+    [
+        "DROP TRIGGER IF EXISTS stats_libros_categoria_au",
+        "DROP TRIGGER IF EXISTS stats_libros_autor_au",
+        *triggers_stats_libros(),
+    ],
+    # 11: los índices parciales de préstamos abiertos de la migración 2 quedaron cubiertos por
+    # idx_prestamos_libro e idx_prestamos_usuario (migración 4), que el planificador prefiere;
+    # sin usarse, igual se mantenían en cada préstamo y devolución
+    [
+        "DROP INDEX IF EXISTS idx_prestamos_abiertos_libro",
+        "DROP INDEX IF EXISTS idx_prestamos_abiertos_usuario",
+    ],
+]
+
+
+def version_actual(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def diferencias_stats(conn):
+    """Claves de cada tabla stats_* cuyo valor no coincide con el recuento desde cero: {tabla: [(clave, guardado, recuento)]}
+
+    Los grupos que quedaron en 0 (todos sus préstamos se borraron o se movieron) cuentan como ausentes.
+    """
+    diferencias = {}
+    for tabla, recuento in RECUENTOS_STATS.items():
+        clave = conn.execute(f"SELECT name FROM pragma_table_info('{tabla}') WHERE pk = 1").fetchone()[0]
+        guardado = dict(conn.execute(f"SELECT {clave}, prestamos FROM {tabla} WHERE prestamos != 0"))
+        esperado = dict(conn.execute(recuento))
+        distintas = [(valor, guardado.get(valor), esperado.get(valor))
+                     for valor in guardado.keys() | esperado.keys() if guardado.get(valor) != esperado.get(valor)]
+        if distintas:
+            diferencias[tabla] = distintas
+    return diferencias
+
+
+def migrar(conn):
+    """Aplica las migraciones pendientes, cada una en su propia transacción, y devuelve la versión final"""
+    inicial = version = version_actual(conn)
+    for numero in range(version + 1, len(MIGRACIONES) + 1):
+        conn.execute("BEGIN")
+        try:
+            for sentencia in MIGRACIONES[numero - 1]:
+                conn.execute(sentencia)
+            conn.execute(f"PRAGMA user_version = {numero}")
+            conn.commit()
+        except sqlite3.Error:
+            conn.rollback()
+            raise
+        version = numero
+    if version != inicial:
+        # Estadísticas para que el planificador elija los índices nuevos
+        conn.execute("ANALYZE")
+    return version
+
+
+if __name__ == "__main__":
+    # La misma base y el mismo perfil de PRAGMAs que abre la aplicación
+    ruta = sys.argv[1] if len(sys.argv) > 1 else base_datos.ruta_base_datos()
+    conexion = base_datos.conectar(ruta)
+    antes = version_actual(conexion)
+    despues = migrar(conexion)
+    print(f"{ruta}: versión {antes} -> {despues}")
+    conexion.close()
@@ -0,0 +1,85 @@
+"""Registros de dominio de la aplicación, uno por fila de las consultas de consultas.py
+
+Son dataclasses con __slots__: ocupan menos que un dict por instancia y se leen por nombre
+en lugar de por posición. Los campos siguen el orden de las columnas de cada consulta, así
+que el cursor los construye directamente con fabrica(Modelo) como row_factory.
+"""
+from dataclasses import dataclass
+
+
+@dataclass(slots=True)
+class Categoria:
+    id_categoria: int
+    nombre_categoria: str
+    dias_prestamo: int
+
+    @property
+    def id(self):
+        return self.id_categoria
+
+
+@dataclass(slots=True)
+class Usuario:
+    id_usuario: int
+    nombre: str
+    apellido: str
+    dni: str
+    email: str
+
+    @property
+    def id(self):
+        return self.id_usuario
+
+    @property
+    def descripcion(self):
+        return f"{self.nombre} {self.apellido} - {self.dni}"
+
+
+@dataclass(slots=True)
+class Libro:
+    id_libro: int
+    titulo: str
+    autor: str
+    año: int
+    id_categoria: int
+    nombre_categoria: str
+    disponible: bool
+    link_imagen: str
+    ejemplares: int
+    disponibles: int
+
+    @property
+    def id(self):
+        return self.id_libro
+
+    @property
+    def descripcion(self):
+        return f"{self.titulo} - {self.autor}"
+
+
+@dataclass(slots=True)
+class Prestamo:
+    id_prestamo: int
+    id_libro: int
+    titulo: str
+    autor: str
+    id_usuario: int
+    usuario: str
+    fecha_prestamo: str
+    devuelto: bool
+    fecha_vencimiento: str
+
+    @property
+    def id(self):
+        return self.id_prestamo
+
+    @property
+    def libro(self):
+        return f"{self.titulo} - {self.autor}"
+
+
+def fabrica(modelo):
+    """row_factory de sqlite3 que arma un modelo por fila"""
+    def construir(cursor, fila):
+        return modelo(*fila)
+    return construir
@@ -0,0 +1,244 @@
+"""Caché local de portadas: cada imagen se descarga una vez y se guarda en miniatura (80 px) y grande (500 px)
+
+Los archivos quedan en assets/portadas, que Flet publica como /portadas/..., con nombre según
+el hash de la URL. El total en disco se limita con BIBLIOTECA_PORTADAS_MB, desalojando las
+portadas usadas hace más tiempo. Si Pillow no está instalado se guarda la imagen original.
+Todas las sesiones del proceso comparten una caché por directorio (obtener_cache), así el límite
+y el orden LRU valen para el directorio entero. Solo se descargan URLs http/https: link_imagen lo
+escribe el usuario o llega en una importación, y un file:// terminaría publicado en /portadas.
+ServidorImagenesPrueba reemplaza a los sitios de portadas en pruebas y benchmarks.
+"""
+import hashlib
+import io
+import os
+import queue
+import threading
+import time
+import urllib.request
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+DIRECTORIO_ASSETS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "assets")
+SUBDIRECTORIO = "portadas"
+
+TAMANOS = {"miniatura": 80, "grande": 500}
+
+LIMITE_MB_POR_DEFECTO = 200
+MAXIMO_DESCARGA = 10 * 1024 * 1024
+ESPERA_DESCARGA = 10
+# Una URL que falló se vuelve a intentar pasados estos segundos; se recuerdan a lo sumo MAXIMO_FALLIDAS
+REINTENTO_FALLIDAS = 600
+MAXIMO_FALLIDAS = 1000
+ESQUEMAS_PERMITIDOS = ("http", "https")
+
+_caches = {}
+_lock_caches = threading.Lock()
+
+
+def clave_url(url):
+    return hashlib.sha256(url.encode("utf-8")).hexdigest()[:32]
+
+
+def url_permitida(url):
+    """True si la portada se puede descargar: http o https con un host"""
+    partes = urlparse(url or "")
+    return partes.scheme.lower() in ESQUEMAS_PERMITIDOS and bool(partes.netloc)
+
+
+class CachePortadas:
+    """Miniaturas en disco con desalojo LRU por tamaño total y descargas en hilos de fondo"""
+    def __init__(self, directorio=None, limite_bytes=None, trabajadores=2):
+        self.directorio = directorio or os.path.join(DIRECTORIO_ASSETS, SUBDIRECTORIO)
+        if limite_bytes is None:
+            limite_bytes = int(os.environ.get("BIBLIOTECA_PORTADAS_MB", LIMITE_MB_POR_DEFECTO)) * 1024 * 1024
+        self.limite_bytes = limite_bytes
+        # Se les avisa la URL de cada portada nueva (una por sesión abierta)
+        self.suscriptores = []
+        self.lock = threading.Lock()
+        # clave -> (bytes ocupados, archivos), de la usada hace más tiempo a la más reciente
+        self.uso = OrderedDict()
+        self.total_bytes = 0
+        self.pendientes = set()
+        # clave -> momento del fallo, de la más vieja a la más reciente
+        self.fallidas = OrderedDict()
+        self.cola = queue.Queue()
+        os.makedirs(self.directorio, exist_ok=True)
+        self.cargar_indice()
+        for _ in range(trabajadores):
+            threading.Thread(target=self.trabajar, daemon=True).start()
+
+    def suscribir(self, callback):
+        with self.lock:
+            self.suscriptores.append(callback)
+
+    def desuscribir(self, callback):
+        with self.lock:
+            if callback in self.suscriptores:
+                self.suscriptores.remove(callback)
+
+    def cargar_indice(self):
+        """Reconstruye el orden LRU con las fechas de modificación de los archivos ya guardados"""
+        archivos = {}
+        for nombre in os.listdir(self.directorio):
+            clave = nombre.split("_", 1)[0]
+            stat = os.stat(os.path.join(self.directorio, nombre))
+            tamano, ultimo_uso, nombres = archivos.get(clave, (0, 0, []))
+            archivos[clave] = (tamano + stat.st_size, max(ultimo_uso, stat.st_mtime), nombres + [nombre])
+        for clave, (tamano, _, nombres) in sorted(archivos.items(), key=lambda item: item[1][1]):
+            self.uso[clave] = (tamano, nombres)
+            self.total_bytes += tamano
+
+    def extension(self, url):
+        if Image is not None:
+            return ".jpg"
+        return os.path.splitext(urlparse(url).path)[1].lower() or ".img"
+
+    def nombre_archivo(self, url, tamano):
+        return f"{clave_url(url)}_{TAMANOS[tamano]}{self.extension(url)}"
+
+    def obtener(self, url, tamano="miniatura"):
+        """Ruta pública (/portadas/...) si la portada ya está en caché; si no, encola la descarga y devuelve None.
+        Las URLs que no son http/https devuelven siempre None (el ícono en lugar de la portada)."""
+        if not url_permitida(url):
+            return None
+        clave = clave_url(url)
+        with self.lock:
+            if clave in self.uso:
+                self.uso.move_to_end(clave)
+                nombre = self.nombre_archivo(url, tamano)
+                try:
+                    os.utime(os.path.join(self.directorio, nombre))
+                except OSError:
+                    pass
+                return f"/{SUBDIRECTORIO}/{nombre}"
+            if clave in self.fallidas and time.monotonic() - self.fallidas[clave] >= REINTENTO_FALLIDAS:
+                del self.fallidas[clave]
+            if clave not in self.pendientes and clave not in self.fallidas:
+                self.pendientes.add(clave)
+                self.cola.put(url)
+        return None
+
+    def descargar(self, url):
+        if not url_permitida(url):
+            raise ValueError("Solo se descargan portadas http o https")
+        with urllib.request.urlopen(url, timeout=ESPERA_DESCARGA) as respuesta:
+            # urllib sigue redirecciones, también a ftp://
+            if not url_permitida(respuesta.geturl()):
+                raise ValueError("La portada redirige a una URL que no es http ni https")
+            datos = respuesta.read(MAXIMO_DESCARGA + 1)
+        if len(datos) > MAXIMO_DESCARGA:
+            raise ValueError("La imagen supera el tamaño máximo permitido")
+        return datos
+
+    def reducir(self, datos, lado):
+        if Image is None:
+            return datos
+        with Image.open(io.BytesIO(datos)) as imagen:
+            imagen = imagen.convert("RGB")
+            imagen.thumbnail((lado, lado))
+            salida = io.BytesIO()
+            imagen.save(salida, "JPEG", quality=85)
+            return salida.getvalue()
+
+    def generar(self, url):
+        clave = clave_url(url)
+        try:
+            datos = self.descargar(url)
+            tamano = 0
+            nombres = []
+            for nombre_tamano, lado in TAMANOS.items():
+                contenido = self.reducir(datos, lado)
+                nombres.append(self.nombre_archivo(url, nombre_tamano))
+                with open(os.path.join(self.directorio, nombres[-1]), "wb") as archivo:
+                    archivo.write(contenido)
+                tamano += len(contenido)
+        except Exception as e:
+            print(f"No se pudo guardar la portada {url}: {e}")
+            with self.lock:
+                self.pendientes.discard(clave)
+                self.fallidas[clave] = time.monotonic()
+                while len(self.fallidas) > MAXIMO_FALLIDAS:
+                    self.fallidas.popitem(last=False)
+            return False
+        with self.lock:
+            self.pendientes.discard(clave)
+            self.uso[clave] = (tamano, nombres)
+            self.total_bytes += tamano
+            self.desalojar()
+        return True
+
+    def desalojar(self):
+        """Borra las portadas usadas hace más tiempo hasta quedar bajo el límite (se llama con el lock tomado)"""
+        while self.total_bytes > self.limite_bytes and len(self.uso) > 1:
+            _, (tamano, nombres) = self.uso.popitem(last=False)
+            self.total_bytes -= tamano
+            for nombre in nombres:
+                try:
+                    os.remove(os.path.join(self.directorio, nombre))
+                except OSError:
+                    pass
+
+    def trabajar(self):
+        while True:
+            url = self.cola.get()
+            if self.generar(url):
+                with self.lock:
+                    suscriptores = list(self.suscriptores)
+                for callback in suscriptores:
+                    try:
+                        callback(url)
+                    except Exception as e:
+                        print(f"Error al avisar la portada {url}: {e}")
+            self.cola.task_done()
+
+    def esperar(self):
+        """Bloquea hasta que no queden descargas encoladas"""
+        self.cola.join()
+
+
+def obtener_cache(directorio=None):
+    """La caché del directorio (por defecto assets/portadas), creada la primera vez que se pide"""
+    directorio = os.path.abspath(directorio or os.path.join(DIRECTORIO_ASSETS, SUBDIRECTORIO))
+    with _lock_caches:
+        if directorio not in _caches:
+            _caches[directorio] = CachePortadas(directorio)
+        return _caches[directorio]
+
+
+class ServidorImagenesPrueba:
+    """Servidor HTTP local que reemplaza a los sitios de portadas en pruebas y benchmarks"""
+    def __init__(self, imagenes):
+        self.imagenes = imagenes
+        self.pedidos = 0
+        servidor = self
+
+        class Manejador(BaseHTTPRequestHandler):
+            def do_GET(self):
+                servidor.pedidos += 1
+                datos = servidor.imagenes.get(self.path.lstrip("/"))
+                if datos is None:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header("Content-Length", str(len(datos)))
+                self.end_headers()
+                self.wfile.write(datos)
+
+            def log_message(self, *args):
+                pass
+
+        self.http = ThreadingHTTPServer(("127.0.0.1", 0), Manejador)
+        threading.Thread(target=self.http.serve_forever, daemon=True).start()
+
+    def url(self, nombre):
+        return f"http://127.0.0.1:{self.http.server_port}/{nombre}"
+
+    def cerrar(self):
+        self.http.shutdown()
+        self.http.server_close()
@@ -0,0 +1,90 @@
+"""Mapas en memoria de categorías y usuarios para los dropdowns y las validaciones de los formularios
+
+Cada entidad guarda id -> texto de la opción y una clave única -> id (nombre de la categoría en
+minúsculas, DNI del usuario), más un contador de versión que sube con cada cambio. Los altas,
+ediciones y bajas conocidos (propios o avisados por el bus) se parchean en el mapa; solo cuando
+el cambio es desconocido (invalidar) se vuelve a leer la tabla, y recién en la próxima consulta.
+"""
+import threading
+
+
+class MapaReferencia:
+    __slots__ = ("textos", "claves", "clave_de", "version", "vigente")
+
+    def __init__(self):
+        self.textos = {}
+        self.claves = {}
+        # id -> clave única, para sacar la clave vieja al editar sin recorrer el mapa
+        self.clave_de = {}
+        self.version = 0
+        self.vigente = False
+
+
+class Referencias:
+    # entidad -> (método del repositorio que trae la tabla entera, texto de la opción, clave única)
+    ENTIDADES = {
+        'categorias': ("todas", lambda cat: cat.nombre_categoria, lambda cat: cat.nombre_categoria.lower()),
+        'usuarios': ("todos", lambda user: user.descripcion, lambda user: user.dni),
+    }
+
+    def __init__(self, repos):
+        self.repos = repos
+        self.lock = threading.RLock()
+        self.mapas = {entidad: MapaReferencia() for entidad in self.ENTIDADES}
+
+    def cargar(self, entidad, registros):
+        """Reemplaza el mapa con la tabla entera ya leída (por ejemplo, la de la pestaña Categorías)"""
+        _, texto, clave = self.ENTIDADES[entidad]
+        with self.lock:
+            mapa = self.mapas[entidad]
+            mapa.textos = {registro.id: texto(registro) for registro in registros}
+            mapa.clave_de = {registro.id: clave(registro) for registro in registros}
+            mapa.claves = {valor: registro_id for registro_id, valor in mapa.clave_de.items()}
+            mapa.version += 1
+            mapa.vigente = True
+
+    def mapa(self, entidad):
+        """El mapa al día; lee la tabla solo si nunca se cargó o se invalidó"""
+        with self.lock:
+            mapa = self.mapas[entidad]
+            if not mapa.vigente:
+                self.cargar(entidad, getattr(self.repos[entidad], self.ENTIDADES[entidad][0])())
+            return mapa
+
+    def version(self, entidad):
+        return self.mapas[entidad].version
+
+    def textos(self, entidad):
+        """Copia de id -> texto de la opción, en el orden de la tabla (los altas nuevos al final)"""
+        with self.lock:
+            return dict(self.mapa(entidad).textos)
+
+    def buscar(self, entidad, clave):
+        """Id del registro con esa clave única, o None"""
+        with self.lock:
+            return self.mapa(entidad).claves.get(clave)
+
+    def actualizar(self, entidad, registro_id, registro=None):
+        """Parchea un registro (None si se borró); si el mapa no está cargado solo sube la versión"""
+        _, texto, clave = self.ENTIDADES[entidad]
+        with self.lock:
+            mapa = self.mapas[entidad]
+            mapa.version += 1
+            if not mapa.vigente:
+                return
+            clave_vieja = mapa.clave_de.pop(registro_id, None)
+            if mapa.claves.get(clave_vieja) == registro_id:
+                del mapa.claves[clave_vieja]
+            if registro is None:
+                mapa.textos.pop(registro_id, None)
+            else:
+                # Una edición conserva la posición de la opción; un alta queda al final
+                mapa.textos[registro_id] = texto(registro)
+                mapa.clave_de[registro_id] = clave(registro)
+                mapa.claves[mapa.clave_de[registro_id]] = registro_id
+
+    def invalidar(self, entidad):
+        with self.lock:
+            mapa = self.mapas[entidad]
+            mapa.version += 1
+            mapa.vigente = False
@@ -0,0 +1,167 @@
+"""Acceso a datos por entidad: cada repositorio conoce su consulta y devuelve modelos
+
+Las consultas paginadas usan paginación por clave (keyset): reciben la clave de la última
+fila de la página anterior (o None para la primera) y piden tamano + 1 filas, de modo que
+el Paginador sepa si hay una página siguiente.
+"""
+import modelos
+from consultas import (BUSQUEDA_LIBROS, BUSQUEDA_LIBROS_CORTA, BUSQUEDA_PRESTABLES, BUSQUEDA_PRESTABLES_CORTA,
+                       CONSULTA_ATRASADOS, CONSULTA_CATEGORIAS, CONSULTA_LIBROS, CONSULTA_PRESTABLES,
+                       CONSULTA_PRESTAMOS, CONSULTA_USUARIOS, SENTENCIAS, busqueda_corta, consulta_fts)
+
+
+class ConflictoEstado(ValueError):
+    """La operación no corresponde al estado actual del libro o del préstamo"""
+
+
+class Repositorio:
+    modelo = None
+    consulta = None
+    # Columna (con el alias de la consulta) de la clave primaria
+    clave = None
+
+    def __init__(self, pool):
+        self.pool = pool
+        self.fabrica = modelos.fabrica(self.modelo)
+
+    def consultar(self, sufijo="", params=()):
+        return self.pool.consultar(self.consulta + sufijo, params, self.fabrica)
+
+    def por_id(self, registro_id):
+        filas = self.consultar(f" WHERE {self.clave} = ?", (registro_id,))
+        return filas[0] if filas else None
+
+
+class RepositorioCategorias(Repositorio):
+    modelo = modelos.Categoria
+    consulta = CONSULTA_CATEGORIAS
+    clave = "id_categoria"
+
+    def todas(self):
+        return self.consultar(" ORDER BY nombre_categoria")
+
+
+class RepositorioUsuarios(Repositorio):
+    modelo = modelos.Usuario
+    consulta = CONSULTA_USUARIOS
+    clave = "id_usuario"
+
+    def todos(self):
+        return self.consultar(" ORDER BY apellido, nombre")
+
+    def pagina(self, clave, tamano):
+        sufijo = ""
+        params = []
+        if clave:
+            sufijo += " WHERE (apellido, nombre, id_usuario) > (?, ?, ?)"
+            params.extend(clave)
+        sufijo += " ORDER BY apellido, nombre, id_usuario LIMIT ?"
+        params.append(tamano + 1)
+        return self.consultar(sufijo, params)
+
+
+class RepositorioLibros(Repositorio):
+    modelo = modelos.Libro
+    consulta = CONSULTA_LIBROS
+    clave = "l.id_libro"
+
+    def pagina(self, clave, tamano):
+        sufijo = ""
+        params = []
+        if clave:
+            sufijo += " WHERE (l.titulo, l.id_libro) > (?, ?)"
+            params.extend(clave)
+        sufijo += " ORDER BY l.titulo, l.id_libro LIMIT ?"
+        params.append(tamano + 1)
+        return self.consultar(sufijo, params)
+
+    def existencias(self, id_libro):
+        """(disponibles, ejemplares) del libro, o None si no existe"""
+        filas = self.pool.consultar(SENTENCIAS["libro_existencias"], (id_libro,))
+        return tuple(filas[0]) if filas else None
+
+    def disponible(self, id_libro):
+        """True si queda algún ejemplar sin prestar, False si no, o None si el libro no existe"""
+        existencias = self.existencias(id_libro)
+        return existencias[0] > 0 if existencias else None
+
+    def buscar(self, texto, limite):
+        """Libros por prefijos de título o autor, ordenados por relevancia (o en orden del índice si son cortos)"""
+        return self.buscar_fts(texto, limite, BUSQUEDA_LIBROS, BUSQUEDA_LIBROS_CORTA)
+
+    def buscar_fts(self, texto, limite, consulta_larga, consulta_corta):
+        consulta = consulta_fts(texto)
+        if not consulta:
+            return []
+        sql = consulta_corta if busqueda_corta(texto) else consulta_larga
+        return self.pool.consultar(sql, (consulta, limite), self.fabrica)
+
+    def prestables(self, texto, limite):
+        """Títulos con ejemplares libres: los que coinciden con el texto o, sin texto, los primeros por título"""
+        if not texto.strip():
+            return self.pool.consultar(CONSULTA_PRESTABLES, (limite,), self.fabrica)
+        return self.buscar_fts(texto, limite, BUSQUEDA_PRESTABLES, BUSQUEDA_PRESTABLES_CORTA)
+
+
+class RepositorioPrestamos(Repositorio):
+    modelo = modelos.Prestamo
+    consulta = CONSULTA_PRESTAMOS
+    clave = "p.id_prestamo"
+
+    def pagina(self, clave, tamano, rango=None):
+        """Del más reciente al más antiguo; rango (desde, hasta) filtra por fecha de préstamo"""
+        condiciones = []
+        params = []
+        if rango:
+            # Recorrido por rango sobre idx_prestamos_fecha
+            condiciones.append("p.fecha_prestamo BETWEEN ? AND ?")
+            params.extend(rango)
+        if clave:
+            condiciones.append("(p.fecha_prestamo, p.id_prestamo) < (?, ?)")
+            params.extend(clave)
+        sufijo = " WHERE " + " AND ".join(condiciones) if condiciones else ""
+        sufijo += " ORDER BY p.fecha_prestamo DESC, p.id_prestamo DESC LIMIT ?"
+        params.append(tamano + 1)
+        return self.consultar(sufijo, params)
+
+    def atrasados(self, fecha, clave, tamano):
+        """Préstamos abiertos vencidos antes de fecha, del vencimiento más antiguo al más reciente"""
+        sufijo = ""
+        params = [fecha]
+        if clave:
+            sufijo += " AND (p.fecha_vencimiento, p.id_prestamo) > (?, ?)"
+            params.extend(clave)
+        sufijo += " ORDER BY p.fecha_vencimiento, p.id_prestamo LIMIT ?"
+        params.append(tamano + 1)
+        return self.pool.consultar(CONSULTA_ATRASADOS + sufijo, params, self.fabrica)
+
+    def registrar(self, id_libro, id_usuario, fecha):
+        """Presta el libro y devuelve el id del préstamo; ValueError si el libro no está disponible"""
+        with self.pool.transaccion() as cursor:
+            cursor.execute(SENTENCIAS["libro_prestar"], (id_libro,))
+            if cursor.rowcount == 0:
+                raise ConflictoEstado("No quedan ejemplares disponibles del libro seleccionado")
+            cursor.execute(SENTENCIAS["prestamo_insertar"], (id_libro, id_usuario, fecha))
+            return cursor.lastrowid
+
+    def devolver(self, id_prestamo):
+        """Marca el préstamo como devuelto, libera el libro y devuelve su id"""
+        with self.pool.transaccion() as cursor:
+            result = cursor.execute(SENTENCIAS["prestamo_abierto"], (id_prestamo,)).fetchone()
+            if result is None:
+                raise ConflictoEstado("Préstamo no encontrado o ya devuelto")
+            cursor.execute(SENTENCIAS["prestamo_devolver"], (id_prestamo,))
+            cursor.execute(SENTENCIAS["libro_liberar"], (result[0],))
+            return result[0]
+
+    def eliminar(self, id_prestamo):
+        """Borra el préstamo (liberando el libro si seguía prestado) y devuelve el id del libro"""
+        with self.pool.transaccion() as cursor:
+            result = cursor.execute(SENTENCIAS["prestamo_estado"], (id_prestamo,)).fetchone()
+            if result is None:
+                raise ValueError("Préstamo no encontrado")
+            id_libro, devuelto = result
+            if not devuelto:
+                cursor.execute(SENTENCIAS["libro_liberar"], (id_libro,))
+            cursor.execute(SENTENCIAS["prestamo_eliminar"], (id_prestamo,))
+            return id_libro
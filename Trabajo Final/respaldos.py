@@ -0,0 +1,343 @@
+"""Respaldos en caliente de la base con la API de backup de SQLite
+
+Uso: python respaldos.py crear [--db ruta] [--directorio dir]
+     python respaldos.py listar [--db ruta] [--directorio dir]
+     python respaldos.py restaurar archivo.db|.db.gz [--db ruta] [--directorio dir]
+     python respaldos.py programar [--db ruta] [--directorio dir] [--horas N]
+
+La copia se hace de a PAGINAS_POR_PASO páginas, con una pausa entre paso y paso. Con WAL la
+conexión de origen abre una transacción de lectura antes del primer paso: todos los pasos leen
+la misma foto de la base y los commits de los demás siguen de largo (van al -wal), así que la
+copia no se reinicia ni frena a nadie. Sin WAL cada paso toma el bloqueo de lectura solo mientras
+copia esas páginas, y si otra conexión escribe en el medio SQLite vuelve a empezar la copia;
+después de REINICIOS_MAXIMOS reinicios se copia el resto en un solo paso.
+
+Cada respaldo se escribe primero como .tmp y recién completo y verificado (quick_check) toma su
+nombre definitivo, <base>-AAAAMMDD-HHMMSS.db. Se conservan los últimos BIBLIOTECA_RESPALDOS
+respaldos; de esos, los SIN_COMPRIMIR más nuevos quedan como .db y los demás se comprimen a .db.gz.
+"""
+import argparse
+import gzip
+import os
+import re
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+import base_datos
+
+PAGINAS_POR_PASO = 256
+# Segundos de pausa entre paso y paso, para que otras conexiones tomen el bloqueo
+PAUSA_PASO = 0.002
+REINICIOS_MAXIMOS = 5
+# Respaldos que se conservan (BIBLIOTECA_RESPALDOS) y cuántos de los más nuevos quedan sin comprimir
+CONSERVADOS_POR_DEFECTO = 14
+SIN_COMPRIMIR = 2
+# Horas entre respaldos programados (BIBLIOTECA_RESPALDO_HORAS); 0 los desactiva
+HORAS_POR_DEFECTO = 24
+# Segundos antes de reintentar cuando el respaldo programado falló
+ESPERA_REINTENTO = 60
+FORMATO_NOMBRE = "%Y%m%d-%H%M%S"
+# Lo que sigue al prefijo en el nombre de un respaldo: fecha, contador opcional y extensión
+PATRON_RESPALDO = re.compile(r"(\d{8}-\d{6})(?:-(\d+))?\.db(?:\.gz)?$")
+
+_programadores = {}
+_lock_programadores = threading.Lock()
+
+
+class ResultadoRespaldo:
+    __slots__ = ("ruta", "paginas", "bytes", "segundos", "pasos", "reinicios")
+
+    def __init__(self, ruta):
+        self.ruta = ruta
+        self.paginas = 0
+        self.bytes = 0
+        self.segundos = 0.0
+        self.pasos = 0
+        self.reinicios = 0
+
+    @property
+    def mb_por_segundo(self):
+        return self.bytes / (1024 * 1024) / self.segundos if self.segundos else 0.0
+
+    def resumen(self):
+        return (f"{os.path.basename(self.ruta)}: {self.bytes / (1024 * 1024):.1f} MB en {self.segundos:.2f} s "
+                f"({self.mb_por_segundo:.1f} MB/s, {self.pasos} pasos, {self.reinicios} reinicios)")
+
+
+def directorio_respaldos(ruta_db):
+    """BIBLIOTECA_RESPALDOS_DIR o la carpeta respaldos junto a la base"""
+    return (os.environ.get("BIBLIOTECA_RESPALDOS_DIR")
+            or os.path.join(os.path.dirname(os.path.abspath(ruta_db)), "respaldos"))
+
+
+def prefijo(ruta_db):
+    return os.path.splitext(os.path.basename(ruta_db))[0] + "-"
+
+
+def listar(ruta_db, directorio=None):
+    """Los respaldos de la base, del más nuevo al más viejo (el nombre lleva la fecha)"""
+    directorio = directorio or directorio_respaldos(ruta_db)
+    if not os.path.isdir(directorio):
+        return []
+    nombres = [nombre for nombre in os.listdir(directorio)
+               if nombre.startswith(prefijo(ruta_db)) and PATRON_RESPALDO.match(nombre[len(prefijo(ruta_db)):])]
+    nombres.sort(key=lambda nombre: orden_respaldo(nombre[len(prefijo(ruta_db)):]), reverse=True)
+    return [os.path.join(directorio, nombre) for nombre in nombres]
+
+
+def orden_respaldo(sufijo):
+    """(fecha, contador) de AAAAMMDD-HHMMSS[-N].db[.gz]: el contador se compara como número, así
+    un -10 queda después de un -9 y cualquier -N después del respaldo sin contador de ese segundo"""
+    coincidencia = PATRON_RESPALDO.match(sufijo)
+    return coincidencia.group(1), int(coincidencia.group(2) or 0)
+
+
+def copiar(origen, destino, paginas=PAGINAS_POR_PASO, pausa=PAUSA_PASO, resultado=None):
+    """Copia origen en destino (dos conexiones abiertas) de a paginas por paso"""
+    resultado = resultado or ResultadoRespaldo(None)
+    restantes = None
+
+    def progreso(estado, quedan, total):
+        nonlocal restantes
+        resultado.pasos += 1
+        resultado.paginas = total
+        # Si quedan más páginas que en el paso anterior, otra conexión escribió y la copia volvió a empezar
+        if restantes is not None and quedan > restantes:
+            resultado.reinicios += 1
+            if resultado.reinicios >= REINICIOS_MAXIMOS and paginas > 0:
+                raise InterruptedError
+        restantes = quedan
+        if quedan and pausa:
+            time.sleep(pausa)
+
+    if paginas <= 0:
+        # Con un solo paso no hay pausas ni reinicios que seguir
+        origen.backup(destino, pages=-1)
+        resultado.pasos = 1
+        return resultado
+    try:
+        origen.backup(destino, pages=paginas, progress=progreso)
+    except InterruptedError:
+        origen.backup(destino, pages=-1)
+        resultado.pasos += 1
+    return resultado
+
+
+def respaldar(ruta_db=None, directorio=None, paginas=PAGINAS_POR_PASO, pausa=PAUSA_PASO):
+    """Hace un respaldo completo y verificado de la base en directorio y devuelve su ResultadoRespaldo"""
+    ruta_db = ruta_db or base_datos.ruta_base_datos()
+    directorio = directorio or directorio_respaldos(ruta_db)
+    os.makedirs(directorio, exist_ok=True)
+    fecha = datetime.now().strftime(FORMATO_NOMBRE)
+    nombre = os.path.join(directorio, prefijo(ruta_db) + fecha)
+    # Un respaldo en el mismo segundo que otros lleva un contador mayor que todos ellos, aunque la
+    # rotación ya haya borrado alguno: si reusara un nombre libre quedaría ordenado como el más viejo
+    contadores = [contador for fecha_respaldo, contador in
+                  (orden_respaldo(os.path.basename(ruta)[len(prefijo(ruta_db)):]) for ruta in listar(ruta_db, directorio))
+                  if fecha_respaldo == fecha]
+    ruta = f"{nombre}-{max(contadores) + 1}.db" if contadores else nombre + ".db"
+    temporal = ruta + ".tmp"
+    resultado = ResultadoRespaldo(ruta)
+
+    inicio = time.perf_counter()
+    origen = base_datos.conectar(ruta_db, cached_statements=0)
+    origen.execute("PRAGMA query_only = ON")
+    if origen.execute("PRAGMA journal_mode").fetchone()[0] == "wal":
+        # Fija la foto que van a leer todos los pasos
+        origen.execute("BEGIN")
+        origen.execute("SELECT COUNT(*) FROM sqlite_master").fetchone()
+    destino = sqlite3.connect(temporal)
+    try:
+        copiar(origen, destino, paginas, pausa, resultado)
+        # El respaldo queda como un único archivo, sin -wal aparte
+        destino.execute("PRAGMA journal_mode = DELETE")
+        verificar(destino)
+    except BaseException:
+        destino.close()
+        os.remove(temporal)
+        raise
+    finally:
+        origen.close()
+    destino.close()
+    os.replace(temporal, ruta)
+    resultado.segundos = time.perf_counter() - inicio
+    resultado.bytes = os.path.getsize(ruta)
+    return resultado
+
+
+def verificar(conn):
+    estado = conn.execute("PRAGMA quick_check").fetchone()[0]
+    if estado != "ok":
+        raise sqlite3.DatabaseError(f"El respaldo está dañado: {estado}")
+
+
+def comprimir(ruta):
+    """Reemplaza el .db por un .db.gz; el original se borra recién con el comprimido completo"""
+    temporal = ruta + ".gz.tmp"
+    with open(ruta, "rb") as entrada, gzip.open(temporal, "wb") as salida:
+        shutil.copyfileobj(entrada, salida, 1024 * 1024)
+    os.replace(temporal, ruta + ".gz")
+    os.remove(ruta)
+    return ruta + ".gz"
+
+
+def rotar(ruta_db, directorio=None, conservar=None, sin_comprimir=SIN_COMPRIMIR):
+    """Borra los respaldos que sobran y comprime los viejos; devuelve (borrados, comprimidos)"""
+    if conservar is None:
+        conservar = int(os.environ.get("BIBLIOTECA_RESPALDOS", CONSERVADOS_POR_DEFECTO))
+    respaldos = listar(ruta_db, directorio)
+    borrados = respaldos[max(conservar, 1):]
+    for ruta in borrados:
+        os.remove(ruta)
+    comprimidos = [comprimir(ruta) for ruta in respaldos[sin_comprimir:max(conservar, 1)] if ruta.endswith(".db")]
+    return borrados, comprimidos
+
+
+def restaurar(respaldo, ruta_db=None, directorio=None):
+    """Vuelca el respaldo sobre la base; antes respalda el estado actual y devuelve ese ResultadoRespaldo
+
+    La copia pasa por la API de backup, así que la base puede tener su -wal y estar abierta; las
+    sesiones abiertas no se enteran del cambio, por eso conviene restaurar con la aplicación cerrada.
+    """
+    ruta_db = ruta_db or base_datos.ruta_base_datos()
+    temporal = None
+    if respaldo.endswith(".gz"):
+        descriptor, temporal = tempfile.mkstemp(suffix=".db")
+        with os.fdopen(descriptor, "wb") as salida, gzip.open(respaldo, "rb") as entrada:
+            shutil.copyfileobj(entrada, salida, 1024 * 1024)
+    try:
+        origen = sqlite3.connect(f"file:{temporal or respaldo}?mode=ro", uri=True)
+        try:
+            verificar(origen)
+            anterior = respaldar(ruta_db, directorio)
+            destino = base_datos.conectar(ruta_db, cached_statements=0)
+            try:
+                origen.backup(destino)
+            finally:
+                destino.close()
+        finally:
+            origen.close()
+    finally:
+        if temporal:
+            os.remove(temporal)
+    return anterior
+
+
+class ProgramadorRespaldos:
+    """Hilo que respalda la base cada tantas horas (y cuando se le pide) y rota los respaldos"""
+    def __init__(self, ruta_db, horas=None, directorio=None):
+        if horas is None:
+            horas = float(os.environ.get("BIBLIOTECA_RESPALDO_HORAS", HORAS_POR_DEFECTO))
+        self.ruta_db = ruta_db
+        self.intervalo = horas * 3600
+        self.directorio = directorio or directorio_respaldos(ruta_db)
+        self.ultimo = None
+        self.error = None
+        self.pendientes = []
+        self.lock = threading.Lock()
+        self.pedido = threading.Event()
+        self.detenido = threading.Event()
+        self.hilo = threading.Thread(target=self.trabajar, daemon=True)
+        self.hilo.start()
+
+    def proximo(self):
+        """Segundos hasta el próximo respaldo programado, contando desde el último que hay en disco"""
+        respaldos = listar(self.ruta_db, self.directorio)
+        if not respaldos:
+            return 0
+        return max(0, os.path.getmtime(respaldos[0]) + self.intervalo - time.time())
+
+    def respaldar_ahora(self, al_terminar=None):
+        """Pide un respaldo fuera de horario; al_terminar(resultado, error) se llama desde el hilo"""
+        with self.lock:
+            if al_terminar:
+                self.pendientes.append(al_terminar)
+        self.pedido.set()
+
+    def trabajar(self):
+        while not self.detenido.is_set():
+            try:
+                espera = self.proximo() if self.intervalo > 0 else None
+            except Exception as e:
+                self.error = e
+                print(f"Error al listar los respaldos: {e!r}")
+                espera = ESPERA_REINTENTO
+            self.pedido.wait(espera)
+            if self.detenido.is_set():
+                break
+            self.pedido.clear()
+            with self.lock:
+                avisar, self.pendientes = self.pendientes, []
+            try:
+                self.ultimo, self.error = respaldar(self.ruta_db, self.directorio), None
+                rotar(self.ruta_db, self.directorio)
+            except Exception as e:
+                # Cualquier error queda anotado y se avisa; si terminara el hilo, los respaldos
+                # dejarían de hacerse sin que nadie lo note
+                self.error = e
+                print(f"Error al respaldar la base: {e!r}")
+            for al_terminar in avisar:
+                try:
+                    al_terminar(self.ultimo if self.error is None else None, self.error)
+                except Exception as e:
+                    print(f"Error al avisar el respaldo: {e!r}")
+            if self.error is not None and not avisar:
+                # Sin este respiro un error permanente (disco lleno) reintentaría sin parar
+                self.detenido.wait(ESPERA_REINTENTO)
+
+    def detener(self):
+        self.detenido.set()
+        self.pedido.set()
+        self.hilo.join()
+
+
+def obtener_programador(ruta_db):
+    """El programador de la base en ruta_db, compartido por las sesiones del proceso"""
+    ruta_db = os.path.abspath(ruta_db)
+    with _lock_programadores:
+        if ruta_db not in _programadores:
+            _programadores[ruta_db] = ProgramadorRespaldos(ruta_db)
+        return _programadores[ruta_db]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Respaldos en caliente de la base")
+    parser.add_argument("comando", choices=["crear", "listar", "restaurar", "programar"])
+    parser.add_argument("archivo", nargs="?", help="respaldo a restaurar (.db o .db.gz)")
+    parser.add_argument("--db", help="ruta de la base (por defecto BIBLIOTECA_DB o Libreria.db)")
+    parser.add_argument("--directorio", help="carpeta de los respaldos (por defecto respaldos/ junto a la base)")
+    parser.add_argument("--horas", type=float, help="horas entre respaldos para programar")
+    args = parser.parse_args()
+    ruta_db = args.db or base_datos.ruta_base_datos()
+
+    if args.comando == "crear":
+        resultado = respaldar(ruta_db, args.directorio)
+        borrados, comprimidos = rotar(ruta_db, args.directorio)
+        print(resultado.resumen())
+        print(f"{len(comprimidos)} comprimidos, {len(borrados)} borrados")
+    elif args.comando == "listar":
+        for ruta in listar(ruta_db, args.directorio):
+            print(f"{ruta}\t{os.path.getsize(ruta) / (1024 * 1024):.1f} MB")
+    elif args.comando == "restaurar":
+        if not args.archivo:
+            parser.error("restaurar necesita el archivo del respaldo")
+        anterior = restaurar(args.archivo, ruta_db, args.directorio)
+        rotar(ruta_db, args.directorio)
+        print(f"Base restaurada desde {args.archivo}; el estado anterior quedó en {anterior.ruta}")
+    else:
+        if args.horas is not None and args.horas <= 0:
+            parser.error("--horas tiene que ser mayor que 0")
+        programador = ProgramadorRespaldos(ruta_db, args.horas, args.directorio)
+        print(f"Respaldando {ruta_db} cada {programador.intervalo / 3600:g} horas en {programador.directorio}")
+        try:
+            programador.hilo.join()
+        except KeyboardInterrupt:
+            programador.detener()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""Aviso de cambios entre sesiones: cada sesión recibe solo las filas que cambiaron
+
+Los triggers de la migración 8 anotan en la tabla cambios cada fila que se inserta, modifica o
+borra, escriba quien escriba. Un BusCambios por base (compartido por todas las sesiones del
+proceso) mira PRAGMA data_version, que es barato y solo cambia cuando otra conexión hace commit;
+recién entonces lee las filas nuevas de cambios y las publica a los suscriptores como
+{entidad: {id_registro: último id_cambio}}; con el id_cambio cada sesión saltea lo que escribió
+ella misma (PoolConexiones.cambio_propio). Si llegaron demasiados cambios juntos (una importación
+masiva) o se perdieron entradas, publica {entidad: None}, que significa recargar la tabla entera.
+"""
+import os
+import threading
+
+import base_datos
+
+INTERVALO = 0.25
+LIMITE_CAMBIOS = 500
+# Entradas que se conservan en cambios; las más viejas se borran
+CAMBIOS_CONSERVADOS = 10000
+ENTIDADES = ("categorias", "usuarios", "libros", "prestamos")
+
+_buses = {}
+_lock_buses = threading.Lock()
+
+
+def obtener_bus(ruta):
+    """El bus de la base en ruta, creado la primera vez que se pide"""
+    ruta = os.path.abspath(ruta)
+    with _lock_buses:
+        if ruta not in _buses:
+            _buses[ruta] = BusCambios(ruta)
+        return _buses[ruta]
+
+
+class BusCambios:
+    def __init__(self, ruta, intervalo=INTERVALO):
+        self.intervalo = intervalo
+        self.conn = base_datos.conectar(ruta, check_same_thread=False)
+        self.suscriptores = []
+        self.lock = threading.Lock()
+        self.detenido = threading.Event()
+        self.data_version = self.version()
+        self.ultimo = self.conn.execute("SELECT COALESCE(MAX(id_cambio), 0) FROM cambios").fetchone()[0]
+        self.podado = self.ultimo
+        self.hilo = threading.Thread(target=self.vigilar, daemon=True)
+        self.hilo.start()
+
+    def version(self):
+        return self.conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def suscribir(self, callback):
+        with self.lock:
+            self.suscriptores.append(callback)
+
+    def desuscribir(self, callback):
+        with self.lock:
+            if callback in self.suscriptores:
+                self.suscriptores.remove(callback)
+
+    def publicar(self, cambios):
+        with self.lock:
+            suscriptores = list(self.suscriptores)
+        for callback in suscriptores:
+            try:
+                callback(cambios)
+            except Exception as e:
+                print(f"Error al aplicar cambios en una sesión: {e}")
+
+    def leer_cambios(self):
+        """Cambios desde la última lectura, agrupados por entidad"""
+        maximo, minimo = self.conn.execute(
+            "SELECT COALESCE(MAX(id_cambio), 0), MIN(id_cambio) FROM cambios WHERE id_cambio > ?", (self.ultimo,)
+        ).fetchone()
+        if maximo <= self.ultimo:
+            return {}
+        perdidos = minimo is None or minimo > self.ultimo + 1
+        if perdidos or maximo - self.ultimo > LIMITE_CAMBIOS:
+            if perdidos:
+                cambios = dict.fromkeys(ENTIDADES)
+            else:
+                filas = self.conn.execute("SELECT DISTINCT entidad FROM cambios WHERE id_cambio > ?", (self.ultimo,))
+                cambios = {entidad: None for (entidad,) in filas}
+        else:
+            cambios = {}
+            for id_cambio, entidad, id_registro in self.conn.execute(
+                    "SELECT id_cambio, entidad, id_registro FROM cambios WHERE id_cambio > ? ORDER BY id_cambio",
+                    (self.ultimo,)):
+                cambios.setdefault(entidad, {})[id_registro] = id_cambio
+        self.ultimo = maximo
+        return cambios
+
+    def podar(self):
+        self.conn.execute("DELETE FROM cambios WHERE id_cambio <= ?", (self.ultimo - CAMBIOS_CONSERVADOS,))
+        self.conn.commit()
+        self.podado = self.ultimo
+
+    def revisar(self):
+        """Publica los cambios si alguna conexión hizo commit desde la última revisión"""
+        version = self.version()
+        if version == self.data_version:
+            return
+        self.data_version = version
+        cambios = self.leer_cambios()
+        if cambios:
+            self.publicar(cambios)
+        # El borrado es un commit de esta misma conexión, así que no cambia su data_version
+        if self.ultimo - self.podado >= CAMBIOS_CONSERVADOS:
+            self.podar()
+
+    def vigilar(self):
+        while not self.detenido.wait(self.intervalo):
+            try:
+                self.revisar()
+            except Exception as e:
+                print(f"Error al revisar cambios: {e}")
+
+    def detener(self):
+        self.detenido.set()
+        self.hilo.join()
+        self.conn.close()
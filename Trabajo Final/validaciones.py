@@ -0,0 +1,69 @@
+"""Reglas de validación compartidas por los formularios y la importación masiva"""
+import re
+from datetime import datetime
+
+PATRON_EMAIL = re.compile(r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$')
+
+AÑO_MINIMO = 1
+AÑO_MAXIMO = 10000
+
+DIAS_PRESTAMO_POR_DEFECTO = 14
+DIAS_PRESTAMO_MAXIMO = 365
+
+EJEMPLARES_MAXIMO = 1000
+
+# Las fechas se guardan como texto ISO, que ordena igual que la fecha
+FORMATO_FECHA = "%Y-%m-%d"
+FORMATOS_FECHA_ACEPTADOS = (FORMATO_FECHA, "%d/%m/%Y")
+
+
+def validar_email(email):
+    return PATRON_EMAIL.match(email) is not None
+
+
+def convertir_año(texto):
+    """Devuelve el año como entero o lanza ValueError con el mensaje para mostrar al usuario"""
+    try:
+        año = int(texto)
+    except (TypeError, ValueError):
+        raise ValueError("El año debe ser un número válido")
+    if año < AÑO_MINIMO or año > AÑO_MAXIMO:
+        raise ValueError(f"El año debe ser un número entre {AÑO_MINIMO} y {AÑO_MAXIMO}")
+    return año
+
+
+def convertir_dias_prestamo(texto):
+    """Días de préstamo de una categoría; vacío vale el valor por defecto"""
+    if texto is None or not str(texto).strip():
+        return DIAS_PRESTAMO_POR_DEFECTO
+    try:
+        dias = int(texto)
+    except (TypeError, ValueError):
+        dias = 0
+    if dias < 1 or dias > DIAS_PRESTAMO_MAXIMO:
+        raise ValueError(f"Los días de préstamo deben ser un número entre 1 y {DIAS_PRESTAMO_MAXIMO}")
+    return dias
+
+
+def convertir_ejemplares(texto):
+    """Cantidad de ejemplares de un título; vacío vale 1"""
+    if texto is None or not str(texto).strip():
+        return 1
+    try:
+        ejemplares = int(texto)
+    except (TypeError, ValueError):
+        ejemplares = 0
+    if ejemplares < 1 or ejemplares > EJEMPLARES_MAXIMO:
+        raise ValueError(f"Los ejemplares deben ser un número entre 1 y {EJEMPLARES_MAXIMO}")
+    return ejemplares
+
+
+def convertir_fecha(texto):
+    """Devuelve la fecha en formato AAAA-MM-DD (acepta también DD/MM/AAAA) o lanza ValueError"""
+    texto = (texto or "").strip()
+    for formato in FORMATOS_FECHA_ACEPTADOS:
+        try:
+            return datetime.strptime(texto, formato).strftime(FORMATO_FECHA)
+        except ValueError:
+            pass
+    raise ValueError("La fecha debe tener el formato AAAA-MM-DD")